@@ -0,0 +1,176 @@
+import sqlite3, threading
+import db_schema
+from tanks import tank_topic
+
+# An alarm is raised when its rule (rules.py, action "alarm") matches and only cleared once
+# the reading is HYSTERESIS back inside the limit, so a value hovering there can't flap.
+# A rule can set its own "hysteresis".
+HYSTERESIS = 0.5
+
+# Alarms are published on raise/clear only; while one stays active it is re-announced
+# at most every REMIND_INTERVAL seconds (its suppression window).
+REMIND_INTERVAL = 300
+
+# Identical alarm messages from other publishers are logged once per window (seconds)
+DEDUP_WINDOW = 60
+
+# Own publishes remembered per alarm topic until their echo arrives (QoS 0 echoes can be lost)
+SENT_LIMIT = 100
+
+# rule name -> (raise message, clear message); {} is the reading that caused the transition.
+# Other alarm rules use GENERIC.
+GENERIC = ("⚠️ {name} ({value})", "✅ {name} cleared ({value})")
+ALARMS = {
+    "high_temp": ("⚠️ High Temperature! ({}°C)", "✅ Temperature back to normal ({}°C)"),
+    "low_temp": ("⚠️ Low Temperature! ({}°C)", "✅ Temperature back to normal ({}°C)"),
+    # Anomaly detectors (anomaly.py)
+    "temp_spike": ("⚠️ Temperature anomaly! ({}°C)", "✅ Temperature anomaly over ({}°C)"),
+    "temp_rate": ("⚠️ Temperature changing fast! ({}°C/min)", "✅ Temperature rate back to normal ({}°C/min)"),
+    "temp_flatline": ("⚠️ Temperature sensor stuck? ({}°C unchanged)", "✅ Temperature sensor changing again ({}°C)"),
+    "water_level_spike": ("⚠️ Water level anomaly! ({}%)", "✅ Water level anomaly over ({}%)"),
+    "water_level_rate": ("⚠️ Water level dropping fast, leak? ({}%/min)", "✅ Water level rate back to normal ({}%/min)"),
+    "water_level_flatline": ("⚠️ Water level sensor stuck? ({}% unchanged)", "✅ Water level sensor changing again ({}%)"),
+}
+
+class AlarmState:
+    """One row of the alarm state table (also mirrored to the `alarms` DB table)."""
+    __slots__ = ("tank_id", "name", "active", "since", "value", "last_sent", "raised", "suppressed")
+
+    def __init__(self, tank_id, name, active=False, since=None, value=None, last_sent=None, raised=0):
+        self.tank_id = tank_id
+        self.name = name
+        self.active = active
+        self.since = since          # ms, when the current raise started
+        self.value = value          # last reading seen while active
+        self.last_sent = last_sent  # ms, last publish for this alarm
+        self.raised = raised        # total raise transitions
+        self.suppressed = 0         # out-of-range readings that did not publish
+
+    def row(self):
+        return (self.tank_id, self.name, int(self.active), self.since, self.value, self.last_sent, self.raised)
+
+class AlarmEngine:
+    """Central alarm state: publishes transitions and reminders, drops repeats and echoes.
+
+    `log(topic, text)` stores a published alarm; `store(row)` persists a state row.
+    """
+
+    def __init__(self, log=None, store=None, remind_interval=REMIND_INTERVAL,
+                 hysteresis=HYSTERESIS, dedup_window=DEDUP_WINDOW):
+        self.log = log
+        self.store = store
+        self.remind_ms = int(remind_interval * 1000)
+        self.hysteresis = hysteresis
+        self.dedup_ms = int(dedup_window * 1000)
+        self.table = {}       # (tank_id, name) -> AlarmState
+        self.sent = {}        # topic -> {text: our publishes not yet seen echoed back}
+        self.seen = {}        # (topic, text) -> ms, last external alarm logged
+        self.lock = threading.Lock()  # send/accept run on several intake workers
+        self.published = 0
+        self.echoes = 0
+        self.deduped = 0
+
+    def load(self, db_file):
+        """Restore active alarms so a restart doesn't raise them again."""
+        try:
+            conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+            rows = conn.execute("SELECT tank, name, active, since, value, last_sent, raised FROM alarms").fetchall()
+            conn.close()
+        except sqlite3.Error:
+            return
+        for tank_id, name, active, since, value, last_sent, raised in rows:
+            self.table[tank_id, name] = AlarmState(tank_id, name, bool(active), since, value, last_sent, raised)
+
+    def state(self, tank_id, name):
+        st = self.table.get((tank_id, name))
+        if st is None:
+            st = self.table[tank_id, name] = AlarmState(tank_id, name)
+        return st
+
+    def active(self):
+        # list(): intake workers may add entries while the report thread reads
+        return [st for st in list(self.table.values()) if st.active]
+
+    # --- Sending ---
+    def send(self, client, tank_id, text):
+        topic = tank_topic(tank_id, "alarm")
+        client.publish(topic, text)
+        with self.lock:
+            # Per topic, so dropping one tank's lost echoes leaves the others' pending ones alone
+            sent = self.sent.setdefault(topic, {})
+            if len(sent) > SENT_LIMIT:
+                sent.clear()
+            sent[text] = sent.get(text, 0) + 1
+            self.published += 1
+        if self.log:
+            self.log(topic, text)
+
+    def notify(self, client, tank_id, text):
+        """One-shot event (pump switched, fish fed): always published."""
+        self.send(client, tank_id, text)
+
+    def update(self, client, tank_id, name, raise_now, clear_now, value, ts):
+        st = self.state(tank_id, name)
+        if not st.active:
+            if not raise_now:
+                return
+            st.active = True
+            st.since = st.last_sent = ts
+            st.raised += 1
+            text = self.message(name, 0, value)
+        elif clear_now:
+            st.active = False
+            st.last_sent = ts
+            text = self.message(name, 1, value)
+        elif ts - st.last_sent >= self.remind_ms:
+            st.last_sent = ts
+            text = f"{self.message(name, 0, value)} since {db_schema.format_ts(st.since)}"
+        else:
+            st.value = value
+            st.suppressed += 1
+            return
+        st.value = value
+        self.send(client, tank_id, text)
+        if self.store:
+            self.store(st.row())
+
+    def message(self, name, which, value):
+        texts = ALARMS.get(name)
+        if texts is None:
+            return GENERIC[which].format(name=name, value=value)
+        return texts[which].format(value)
+
+    def check(self, client, tank, topic, value, ts):
+        """Evaluate the tank's alarm rules for one reading on `topic` (suffix, e.g. "temp")."""
+        for rule in tank.rules.get(topic, ()):
+            if rule.action == "alarm":
+                h = self.hysteresis if rule.hysteresis is None else rule.hysteresis
+                self.update(client, tank.tank_id, rule.name, rule.test(value), rule.clear(value, h), value, ts)
+
+    # --- Receiving (aquarium/[<tank>/]alarm) ---
+    def accept(self, topic, text, ts):
+        """True if an incoming alarm should be logged: not our own echo, not a recent repeat."""
+        with self.lock:
+            sent = self.sent.get(topic)
+            n = sent.get(text) if sent else None
+            if n:
+                if n == 1:
+                    del sent[text]
+                else:
+                    sent[text] = n - 1
+                self.echoes += 1
+                return False
+            key = (topic, text)
+            last = self.seen.get(key)
+            if last is not None and ts - last < self.dedup_ms:
+                self.deduped += 1
+                return False
+            if len(self.seen) > 10000:
+                self.seen.clear()
+            self.seen[key] = ts
+            return True
+
+    def stats(self):
+        return {"active": len(self.active()), "published": self.published,
+                "suppressed": sum(st.suppressed for st in list(self.table.values())),
+                "echoes": self.echoes, "deduped": self.deduped}
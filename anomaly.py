@@ -0,0 +1,142 @@
+import math
+
+# Streaming anomaly detectors for sensor readings, next to the fixed-threshold rules.
+# Per tank and reading, O(1) work and a few floats of state per sample:
+#   spike     a jump: the change since the previous sample is far from the EWMA
+#             mean of earlier changes, in EWMA standard deviations (z-score).
+#             Changes rather than values, so a tank heating up steadily isn't one.
+#   rate      smoothed rate of change outside [min, max] units per second
+#             (a leak drains faster than the sensor's usual -1 % per 5 s tick)
+#   flatline  value unchanged for `flat` seconds (stuck or frozen sensor)
+# Outliers are clamped to the spike limit before they update the averages, so one
+# bad sample neither masks the next nor looks like a fast change.
+# Anomalies go through the alarm engine as alarms named <reading>_<detector>
+# (e.g. water_level_rate), so they are published on aquarium/[<tank>/]alarm,
+# logged, re-announced and cleared like any other alarm.
+SERIES = {
+    # alpha: EWMA weight of a new change (~2/alpha - 1 samples of memory)
+    # z: spike limit; min_std: noise floor (units/s) so a very steady signal can't alarm on a blip
+    # rate: (min, max) of the smoothed rate in units/s, None = no limit
+    # flat: seconds without any change
+    "temp": {"alpha": 0.05, "z": 6.0, "min_std": 0.02, "rate": (-0.15, 0.15), "flat": 900},
+    "water_level": {"alpha": 0.05, "z": 6.0, "min_std": 0.2, "rate": (-0.3, None), "flat": 1800},
+}
+RATE_ALPHA = 0.2   # smoothing of the rate (about 10 samples)
+WARMUP = 30        # changes before the spike detector trusts the mean/variance
+RATE_WARMUP = 5    # changes since the last gap before the rate detector
+MAX_GAP = 300      # seconds; a longer gap between samples restarts the rate and flatline state
+HOLD = 600         # seconds without the detector firing before its alarm clears
+CLEAR_FACTOR = 0.8 # ... and the rate must be back inside this fraction of its limit
+
+SPIKE, RATE, FLAT = 1, 2, 4
+KINDS = ((SPIKE, "spike"), (RATE, "rate"), (FLAT, "flatline"))
+
+class Track:
+    """Detector state for one reading of one tank."""
+    __slots__ = ("n", "samples", "ts", "last", "mean", "var", "rate", "rate_n", "flat_since", "fired", "active")
+
+    def __init__(self, active=0):
+        self.n = 0              # changes seen
+        self.samples = 0        # samples fed (counted per track: tanks run on different workers)
+        self.ts = None          # ms of the previous sample
+        self.last = 0.0         # previous value
+        self.mean = 0.0         # EWMA of the change per second
+        self.var = 0.0          # EWMA variance around it
+        self.rate = 0.0         # faster EWMA of the same: the smoothed rate
+        self.rate_n = 0         # changes since the last gap
+        self.flat_since = 0     # ms since when the value hasn't changed
+        self.fired = 0          # ms, last time any detector fired
+        self.active = active    # bitmask of raised detectors (SPIKE | RATE | FLAT)
+
+class AnomalyDetector:
+    """Runs the SERIES detectors per (tank, reading) and raises alarms through `alarms`."""
+
+    def __init__(self, alarms, series=None):
+        self.alarms = alarms
+        self.series = series or SERIES
+        self.tracks = {}  # (tank_id, reading) -> Track
+
+    def track(self, tank_id, reading):
+        tr = self.tracks.get((tank_id, reading))
+        if tr is None:
+            # Alarms restored from the DB stay active until their condition clears
+            active = 0
+            for bit, kind in KINDS:
+                st = self.alarms.table.get((tank_id, f"{reading}_{kind}"))
+                if st is not None and st.active:
+                    active |= bit
+            tr = self.tracks[tank_id, reading] = Track(active)
+        return tr
+
+    def check(self, client, tank_id, reading, x, ts):
+        """Feed one sample (ts in ms); samples older than the last one are ignored."""
+        cfg = self.series.get(reading)
+        if cfg is None:
+            return
+        tr = self.tracks.get((tank_id, reading)) or self.track(tank_id, reading)
+        tr.samples += 1
+        if tr.ts is not None and ts <= tr.ts:
+            return
+        raised = 0
+        rate = None
+
+        if tr.ts is None or ts - tr.ts > MAX_GAP * 1000:
+            # First sample or after an outage: keep the mean/variance, restart the rest
+            tr.rate_n = 0
+            tr.flat_since = ts
+        else:
+            r = (x - tr.last) * 1000 / (ts - tr.ts)
+            if x != tr.last:
+                tr.flat_since = ts
+            diff = r - tr.mean
+            limit = cfg["z"] * max(math.sqrt(tr.var), cfg["min_std"])
+            if tr.n >= WARMUP and abs(diff) > limit:
+                raised |= SPIKE
+                diff = limit if diff > 0 else -limit
+                r = tr.mean + diff
+            # Incremental EWMA mean and variance (West 1979)
+            incr = cfg["alpha"] * diff
+            tr.mean += incr
+            tr.var = (1 - cfg["alpha"]) * (tr.var + diff * incr)
+            tr.n += 1
+            tr.rate = r if tr.rate_n == 0 else tr.rate + RATE_ALPHA * (r - tr.rate)
+            tr.rate_n += 1
+            if tr.rate_n >= RATE_WARMUP:
+                rate = tr.rate
+                lo, hi = cfg["rate"]
+                if (lo is not None and rate < lo) or (hi is not None and rate > hi):
+                    raised |= RATE
+        if ts - tr.flat_since >= cfg["flat"] * 1000:
+            raised |= FLAT
+
+        tr.ts = ts
+        tr.last = x
+        if raised:
+            tr.fired = ts
+        if raised or tr.active:
+            self.update(client, tank_id, reading, tr, raised, x, rate, ts)
+
+    def update(self, client, tank_id, reading, tr, raised, x, rate, ts):
+        # Only detectors that fire now or are still raised get here (and reach the engine)
+        lo, hi = self.series[reading]["rate"]
+        quiet = ts - tr.fired >= HOLD * 1000
+        for bit, kind in KINDS:
+            if not (raised | tr.active) & bit:
+                continue
+            value = x
+            clear = quiet
+            if bit == RATE:
+                value = round(tr.rate * 60, 2)  # per minute reads better
+                clear = quiet and (rate is None or ((lo is None or rate >= lo * CLEAR_FACTOR) and
+                                                    (hi is None or rate <= hi * CLEAR_FACTOR)))
+            now = bool(raised & bit)
+            self.alarms.update(client, tank_id, f"{reading}_{kind}", now, not now and clear, value, ts)
+            if now:
+                tr.active |= bit
+            elif clear:
+                tr.active &= ~bit
+
+    def stats(self):
+        tracks = list(self.tracks.values())
+        return {"tracks": len(tracks), "samples": sum(tr.samples for tr in tracks),
+                "active": sum(bin(tr.active).count("1") for tr in tracks)}
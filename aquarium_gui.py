@@ -1,24 +1,38 @@
-import sys, json
-import paho.mqtt.client as mqtt
+import sys, os, json, threading, time, sqlite3
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QLabel, QVBoxLayout, QPushButton, QHBoxLayout
 )
-
-BROKER = "broker.hivemq.com"
-PORT = 1883
+from PyQt5.QtCore import QTimer
+from mqtt_config import BROKER, PORT, make_client
+from ring_buffer import History
+from history_chart import HistoryChart
+from state_cache import STATE_FILE
+from profiler import Profiler
+import db_schema, codec
 
 # Topics
 PUMP_CMD = "aquarium/pump"
 PUMP_STATUS = "aquarium/pump/status"
 LAMP_CMD = "aquarium/lamp"
 LAMP_STATUS = "aquarium/lamp/status"
+STATE_GET = "aquarium/state/get"
+STATE_REPLY = f"aquarium/state/gui-{os.getpid()}"  # manager replies with every last value here
+
+# UI refresh cap: queued MQTT values are applied at most this often
+FRAME_MS = 33  # ~30 fps
+
+# Chart history: fixed-size buffers, recent window backfilled from iot.db on startup
+HISTORY_WINDOW = 3600    # seconds shown in the charts
+HISTORY_CAPACITY = 4096  # raw samples kept per series (~40 s of a 100 Hz stream)...
+HISTORY_BUCKET = 1.0     # ...and min/max per this many seconds for the rest of the window
+DB_FILE = db_schema.DB_FILE
 
 class AquariumGUI(QWidget):
     def __init__(self):
         super().__init__()
 
         self.setWindowTitle("🐟 Smart Aquarium Dashboard")
-        self.resize(500, 450)
+        self.resize(700, 900)
 
         layout = QVBoxLayout()
 
@@ -68,28 +82,148 @@ class AquariumGUI(QWidget):
         layout.addLayout(lamp_btns)
         layout.addWidget(self.alarm_lbl)
 
+        # History charts
+        self.history = {topic: History(HISTORY_CAPACITY, HISTORY_WINDOW, HISTORY_BUCKET) for topic in
+                        ("aquarium/temp", "aquarium/water_level", PUMP_STATUS, LAMP_STATUS)}
+        temp_chart = HistoryChart("Temperature (°C)", 5, 40, HISTORY_WINDOW)
+        temp_chart.add_series("temp", self.history["aquarium/temp"], "darkorange")
+        water_chart = HistoryChart("Water level (%)", 0, 100, HISTORY_WINDOW)
+        water_chart.add_series("level", self.history["aquarium/water_level"], "steelblue")
+        pump_chart = HistoryChart("Pump", 0, 1, HISTORY_WINDOW, step=True, height=60)
+        pump_chart.add_series("ON/OFF", self.history[PUMP_STATUS], "green")
+        lamp_chart = HistoryChart("Lamp", 0, 1, HISTORY_WINDOW, step=True, height=60)
+        lamp_chart.add_series("ON/OFF", self.history[LAMP_STATUS], "goldenrod")
+        for chart in (temp_chart, water_chart, pump_chart, lamp_chart):
+            layout.addWidget(chart)
+
         self.setLayout(layout)
 
+        # Latest payload per topic, written by the MQTT thread and
+        # applied on the Qt thread once per frame (older values are dropped)
+        self.pending = {}
+        self.pending_lock = threading.Lock()
+        self.shown = {}  # label -> (text, style) currently displayed
+        self.handlers = {
+            "aquarium/temp": self.on_temp_msg,
+            "aquarium/water_level": self.on_water_msg,
+            "aquarium/feed": self.update_feed,
+            PUMP_STATUS: self.update_pump,
+            LAMP_STATUS: self.update_lamp,
+            "aquarium/alarm": self.update_alarm,
+        }
+        self.frame_timer = QTimer(self)
+        self.frame_timer.timeout.connect(self.apply_pending)
+        self.frame_timer.start(FRAME_MS)
+
+    # Called from the MQTT thread: never touches widgets
+    # ts: when the message arrived (epoch s); None for values that aren't new (state replies)
+    def post(self, topic, data, ts=None):
+        with self.pending_lock:
+            self.pending[topic] = data
+        # Every sample goes into the chart history, not only the latest per frame
+        buf = self.history.get(topic) if ts is not None else None
+        if buf is not None:
+            value, _ = db_schema.split_value(data)
+            if value is not None:
+                buf.append(ts, value)
+
+    # Sensor batch: every sample goes to the chart, the newest one to the label
+    def post_batch(self, topic, payload):
+        buf = self.history.get(topic)
+        if buf is None:
+            return
+        try:
+            (key, samples), = codec.decode(payload).items()
+        except Exception:
+            return
+        buf.extend([(ts / 1000, value) for ts, value in samples])
+        if samples:
+            with self.pending_lock:
+                self.pending[topic] = json.dumps({key: samples[-1][1]})
+
+    # Last values from the manager: {"topics": {topic: [ts_ms, payload]}}.
+    # Labels only; the charts get their history from iot.db.
+    def post_state(self, state):
+        for topic, (ts, payload) in state.get("topics", {}).items():
+            if topic in self.handlers:
+                self.post(topic, payload)
+
+    def load_snapshot(self, path=STATE_FILE):
+        # Same machine as the manager: fill the labels before the broker answers
+        try:
+            with open(path) as f:
+                self.post_state(json.load(f))
+        except (OSError, ValueError):
+            pass
+
+    def backfill_history(self, db_file=DB_FILE):
+        # Read-only: the GUI never creates or migrates the database
+        try:
+            conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+            since = db_schema.now_ms() - HISTORY_WINDOW * 1000
+            topics = db_schema.TopicIds(conn)
+            tables = [t for _, t in db_schema.partitions(conn, since)]
+            for topic, buf in self.history.items():
+                tid = topics.lookup(topic)
+                if tid is None:
+                    continue
+                # The whole window feeds the min/max buckets, its tail the raw samples
+                rows = []
+                for table in tables:
+                    rows += conn.execute(f"""SELECT ts / 1000.0, value FROM {table}
+                                             WHERE topic_id=? AND ts>=? AND value IS NOT NULL
+                                             ORDER BY ts""", (tid, since)).fetchall()
+                rows.sort()
+                buf.extend(rows)
+            conn.close()
+        except sqlite3.Error as e:
+            print("History backfill skipped:", e)
+
+    # Called on the Qt thread by frame_timer
+    def apply_pending(self):
+        with self.pending_lock:
+            if not self.pending:
+                return
+            batch, self.pending = self.pending, {}
+        for topic, data in batch.items():
+            handler = self.handlers.get(topic)
+            if handler:
+                handler(data)
+
+    def set_label(self, lbl, text, style=None):
+        # Skip setText / setStyleSheet when nothing changed
+        old_text, old_style = self.shown.get(lbl, (None, None))
+        if text != old_text:
+            lbl.setText(text)
+        if style is not None and style != old_style:
+            lbl.setStyleSheet(style)
+        self.shown[lbl] = (text, style if style is not None else old_style)
+
+    def on_temp_msg(self, data):
+        try: self.update_temp(json.loads(data)["temp"])
+        except: pass
+
+    def on_water_msg(self, data):
+        try: self.update_water(json.loads(data)["level"])
+        except: pass
+
     # Update methods
     def update_temp(self, temp): 
-        self.temp_lbl.setText(f"Temp: {temp} °C")
+        self.set_label(self.temp_lbl, f"Temp: {temp} °C")
 
     def update_water(self, lvl): 
-        self.water_lbl.setText(f"Water Level: {lvl} %")
+        self.set_label(self.water_lbl, f"Water Level: {lvl} %")
 
     def update_feed(self, state): 
         if state.lower() == "pressed":
-            self.feed_lbl.setText("Feeder: PRESSED")
-            self.feed_lbl.setStyleSheet("font-size: 14px; font-weight: bold; color: green;")
+            self.set_label(self.feed_lbl, "Feeder: PRESSED", "font-size: 14px; font-weight: bold; color: green;")
         elif state.lower() == "released":
-            self.feed_lbl.setText("Feeder: RELEASED")
-            self.feed_lbl.setStyleSheet("font-size: 14px; font-weight: bold; color: red;")
+            self.set_label(self.feed_lbl, "Feeder: RELEASED", "font-size: 14px; font-weight: bold; color: red;")
         else:
-            self.feed_lbl.setText(f"Feeder: {state}")
-            self.feed_lbl.setStyleSheet("font-size: 14px; color: black;")
+            self.set_label(self.feed_lbl, f"Feeder: {state}", "font-size: 14px; color: black;")
 
     def update_alarm(self, text): 
-        self.alarm_lbl.setText(f"ALARM: {text}")
+        self.set_label(self.alarm_lbl, f"ALARM: {text}")
 
     def update_pump(self, status_json):
         try:
@@ -99,17 +233,19 @@ class AquariumGUI(QWidget):
         except:
             mode, state = "AUTO", "OFF"
 
-        self.pump_lbl.setText(f"Pump: {state} ({mode})")
+        text = f"Pump: {state} ({mode})"
 
         # 4-state color coding
+        style = None
         if mode == "AUTO" and state == "ON":
-            self.pump_lbl.setStyleSheet("font-size: 16px; font-weight: bold; color: green;")
+            style = "font-size: 16px; font-weight: bold; color: green;"
         elif mode == "AUTO" and state == "OFF":
-            self.pump_lbl.setStyleSheet("font-size: 16px; font-weight: bold; color: gray;")
+            style = "font-size: 16px; font-weight: bold; color: gray;"
         elif mode == "MANUAL" and state == "ON":
-            self.pump_lbl.setStyleSheet("font-size: 16px; font-weight: bold; color: blue;")
+            style = "font-size: 16px; font-weight: bold; color: blue;"
         elif mode == "MANUAL" and state == "OFF":
-            self.pump_lbl.setStyleSheet("font-size: 16px; font-weight: bold; color: darkred;")
+            style = "font-size: 16px; font-weight: bold; color: darkred;"
+        self.set_label(self.pump_lbl, text, style)
 
     def update_lamp(self, status_json):
         try:
@@ -119,46 +255,52 @@ class AquariumGUI(QWidget):
         except:
             mode, state = "AUTO", "OFF"
 
-        self.lamp_lbl.setText(f"Lamp: {state} ({mode})")
+        text = f"Lamp: {state} ({mode})"
 
         # 4-state color coding
+        style = None
         if mode == "AUTO" and state == "ON":
-            self.lamp_lbl.setStyleSheet("font-size: 16px; font-weight: bold; color: yellow;")
+            style = "font-size: 16px; font-weight: bold; color: yellow;"
         elif mode == "AUTO" and state == "OFF":
-            self.lamp_lbl.setStyleSheet("font-size: 16px; font-weight: bold; color: gray;")
+            style = "font-size: 16px; font-weight: bold; color: gray;"
         elif mode == "MANUAL" and state == "ON":
-            self.lamp_lbl.setStyleSheet("font-size: 16px; font-weight: bold; color: orange;")
+            style = "font-size: 16px; font-weight: bold; color: orange;"
         elif mode == "MANUAL" and state == "OFF":
-            self.lamp_lbl.setStyleSheet("font-size: 16px; font-weight: bold; color: darkred;")
+            style = "font-size: 16px; font-weight: bold; color: darkred;"
+        self.set_label(self.lamp_lbl, text, style)
+
+# Wall-clock arrival time: clients stamp each message with time.monotonic() on receipt,
+# so a value that waited behind a slow frame still lands where it belongs in the chart
+def arrival_time(msg):
+    return time.time() - (time.monotonic() - msg.timestamp)
 
-# MQTT callbacks
+# MQTT callbacks (paho thread): hand the raw payload to the Qt thread
 def on_message(client, userdata, msg):
-    data = msg.payload.decode().strip()
-    if msg.topic == "aquarium/temp":
-        try: gui.update_temp(json.loads(data)["temp"])
-        except: pass
-    elif msg.topic == "aquarium/water_level":
-        try: gui.update_water(json.loads(data)["level"])
-        except: pass
-    elif msg.topic == "aquarium/feed":
-        gui.update_feed(data)
-    elif msg.topic == PUMP_STATUS:
-        gui.update_pump(data)
-    elif msg.topic == LAMP_STATUS:
-        gui.update_lamp(data)
-    elif msg.topic == "aquarium/alarm":
-        gui.update_alarm(data)
-
-client = mqtt.Client()
+    if msg.topic == STATE_REPLY:
+        try:
+            gui.post_state(json.loads(msg.payload))
+        except ValueError:
+            pass
+    elif msg.topic.endswith(codec.BATCH_SUFFIX):
+        gui.post_batch(msg.topic[:-len(codec.BATCH_SUFFIX)], msg.payload)
+    else:
+        gui.post(msg.topic, codec.to_text(msg.payload).strip(), arrival_time(msg))
+
+client = make_client()
 client.on_message = on_message
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     gui = AquariumGUI()
+    gui.load_snapshot()
+    gui.backfill_history()
     gui.show()
 
     client.connect(BROKER, PORT, 60)
     client.subscribe("aquarium/#")
+    # $profile/gui-<pid>: samples every thread, since redraws run on the Qt thread
+    Profiler(f"gui-{os.getpid()}", all_threads=True).attach(client)
+    client.publish(STATE_GET, STATE_REPLY)  # full current state in one request
     client.loop_start()
 
     sys.exit(app.exec_())
@@ -1,90 +1,327 @@
-import paho.mqtt.client as mqtt
-import sqlite3, json, time
-
-# DB Setup
-conn = sqlite3.connect("iot.db", check_same_thread=False)
-cur = conn.cursor()
-cur.execute("""CREATE TABLE IF NOT EXISTS logs (
-    timestamp TEXT,
-    sensor TEXT,
-    value TEXT
-)""")
-conn.commit()
+import os, sys, json, threading, time
+import db_schema, codec
+from mqtt_config import BROKER, PORT, make_client
+from log_writer import LogWriter
+from metrics import Metrics, METRICS_INTERVAL
+from profiler import Profiler
+from alarms import AlarmEngine
+from intake import Intake
+from anomaly import AnomalyDetector
+from state_cache import LastValues, pump_states, STATE_FILE
+from retention import Pruner
+from rules import RuleSet, RuleWatcher, RULES_FILE, rules_path
+from tanks import Fleet, tank_topic, split_topic
+
+# DB Setup (rows are batched and committed by a background writer thread)
+DB_FILE = db_schema.DB_FILE
+STATS_INTERVAL = 30  # seconds between writer queue reports
+STALE_AFTER = 60     # batch samples older than this (s) are stored only: no alarms/pump commands
+ECHO_LOGS = True     # print every logged message (turn off for large fleets)
+# Handlers run on a pool of workers, one tank per worker, behind a bounded queue (see intake.py);
+# 0 workers handles messages on the MQTT network thread as before
+INTAKE_WORKERS = int(os.environ.get("AQUARIUM_WORKERS", "2"))
+INTAKE_QUEUE = int(os.environ.get("AQUARIUM_QUEUE", "10000"))
+INTAKE_POLICY = os.environ.get("AQUARIUM_BACKPRESSURE", "block")  # block | drop_oldest | sample
+writer = None
 
 def log_data(topic, value):
-    ts = time.strftime("%Y-%m-%d %H:%M:%S")
-    cur.execute("INSERT INTO logs VALUES (?, ?, ?)", (ts, topic, value))
-    conn.commit()
-    print(f"{ts} | {topic}: {value}")
+    ts = db_schema.now_ms()
+    writer.log(ts, topic, value)
+    if ECHO_LOGS:
+        print(f"{db_schema.format_ts(ts)} | {topic}: {value}")
+
+def log_batch(topic, samples):
+    writer.log_many(topic, samples)
+    if ECHO_LOGS:
+        print(f"{db_schema.format_ts(samples[-1][0])} | {topic}: {len(samples)} samples")
+
+# Per-tank state and rule tables (see tanks.py / rules.py)
+fleet = Fleet()
+
+# Alarm state table: publishes on raise/clear (+ reminders) and logs what it publishes
+alarms = AlarmEngine(log=log_data)
+
+# Streaming anomaly detectors per tank (spikes, fast changes, stuck sensors), raised as alarms
+anomalies = AnomalyDetector(alarms)
+
+# Last value per topic, snapshotted to STATE_FILE (see state_cache.py)
+cache = LastValues(STATE_FILE)
+
+# Handler latency (and so message count) per topic suffix, DB commit timings (see metrics.py)
+metrics = Metrics("manager")
+metrics.gauge("writer_queue_depth", lambda: writer.depth())
+metrics.gauge("writer_dropped", lambda: writer.dropped)
+metrics.gauge("alarms_active", lambda: len(alarms.active()))
+metrics.gauge("anomalies_active", lambda: anomalies.stats()["active"])
+metrics.gauge("stale_skipped", lambda: stale_skipped)
+metrics.gauge("tanks", lambda: len(fleet.tanks))
+metrics.gauge("intake_queue_depth", lambda: intake.depth() if intake else 0)
+metrics.gauge("intake_dropped", lambda: intake.stats()["dropped"] if intake else 0)
+metrics.gauge("intake_sampled", lambda: intake.stats()["sampled"] if intake else 0)
+metrics.gauge("intake_blocked_s", lambda: intake.stats()["blocked_s"] if intake else 0)
+
+# --- Handlers: (client, tank, topic, payload bytes) ---
+# Sensor and status handlers return the decoded payload, which the state cache reuses
+
+# Pump and Lamp Status (JSON or binary)
+def on_status(client, tank, topic, payload):
+    try:
+        status = codec.decode(payload)
+        log_data(topic, json.dumps(status))  # store JSON string
+        if ECHO_LOGS:
+            print(f"Status update: {topic} {status}")
+        return status
+    except Exception as e:
+        print(f"Error parsing relay status on {topic}: {e}")
+
+# Temperature Sensor
+def on_temp(client, tank, topic, payload):
+    try:
+        data = codec.decode(payload)
+        t = data["temp"]
+        log_data(topic, t)
+        ts = db_schema.now_ms()
+        alarms.check(client, tank, "temp", t, ts)
+        anomalies.check(client, tank.tank_id, "temp", t, ts)
+        return data
+    except Exception as e:
+        print("Error parsing temp:", e)
+
+# Water Level Sensor
+def on_water_level(client, tank, topic, payload):
+    try:
+        data = codec.decode(payload)
+        lvl = data["level"]
+        log_data(topic, lvl)
+        check_level(client, tank, lvl, db_schema.now_ms())
+        return data
+    except Exception as e:
+        print("Error parsing water level:", e)
+
+def check_level(client, tank, lvl, ts):
+    for rule in tank.rules.get("water_level", ()):
+        if rule.action == "pump_on":
+            if not tank.pump_on and rule.test(lvl):
+                client.publish(tank_topic(tank.tank_id, "pump"), "ON")
+                tank.pump_on = True
+                alarms.notify(client, tank.tank_id, f"⚠️ Pump ON (Low water {lvl}%)")
+
+        elif rule.action == "pump_off":
+            if tank.pump_on and rule.test(lvl):
+                client.publish(tank_topic(tank.tank_id, "pump"), "OFF")
+                tank.pump_on = False
+                alarms.notify(client, tank.tank_id, f"✅ Pump OFF (Water restored {lvl}%)")
+    alarms.check(client, tank, "water_level", lvl, ts)
+    anomalies.check(client, tank.tank_id, "water_level", lvl, ts)
+
+# Sensor batches: [(ts_ms, value), ...] on "<reading topic>/batch".
+# Stored under the reading topic in one transaction; thresholds still see every sample
+# except old ones (a sensor's spool replayed after an outage), which must not raise
+# alarms or switch the pump long after the fact.
+stale_skipped = 0
+stale_lock = threading.Lock()  # batches of different tanks run on different intake workers
+
+def fresh(samples):
+    global stale_skipped
+    cutoff = db_schema.now_ms() - STALE_AFTER * 1000
+    if samples[0][0] >= cutoff:
+        return samples
+    out = [s for s in samples if s[0] >= cutoff]
+    with stale_lock:
+        stale_skipped += len(samples) - len(out)
+    return out
+
+def on_temp_batch(client, tank, topic, payload):
+    try:
+        data = codec.decode(payload)
+        samples = data["temp"]
+    except Exception as e:
+        print("Error parsing temp batch:", e)
+        return
+    if samples:
+        log_batch(topic[:-len(codec.BATCH_SUFFIX)], samples)
+        for ts, t in fresh(samples):
+            alarms.check(client, tank, "temp", t, ts)
+            anomalies.check(client, tank.tank_id, "temp", t, ts)
+    return data
+
+def on_water_level_batch(client, tank, topic, payload):
+    try:
+        data = codec.decode(payload)
+        samples = data["level"]
+    except Exception as e:
+        print("Error parsing water level batch:", e)
+        return
+    if samples:
+        log_batch(topic[:-len(codec.BATCH_SUFFIX)], samples)
+        for ts, lvl in fresh(samples):
+            check_level(client, tank, lvl, ts)
+    return data
+
+# Feeder Button
+def on_feed(client, tank, topic, payload):
+    log_data(topic, payload.decode())
+    alarms.notify(client, tank.tank_id, "✅ Fish fed!")
 
-# Thresholds
-MAX_TEMP = 30
-MIN_TEMP = 15
-MIN_WATER_LEVEL = 30
-PUMP_OFF_THRESHOLD = 80
+# Our own alarms are logged when sent; skip their echoes and repeats from other publishers
+def on_alarm(client, tank, topic, payload):
+    text = payload.decode()
+    if alarms.accept(topic, text, db_schema.now_ms()):
+        log_data(topic, text)
 
-# State tracking
-pump_state = "OFF"
+# Full current state in one reply: publish to aquarium/state/get (all tanks) or
+# aquarium/<tank_id>/state/get (one tank); the payload is the reply topic
+# (default aquarium/[<tank_id>/]state).
+def on_state_get(client, tank, topic, payload):
+    reply = payload.decode().strip() or tank_topic(tank.tank_id, "state")
+    tank_id = None if topic == tank_topic("", "state/get") else tank.tank_id
+    client.publish(reply, json.dumps(cache.state(tank_id, HANDLERS)))
+
+def restore_state():
+    # Pump state survives restarts through the snapshot
+    cache.load()
+    for tank_id, on in pump_states(cache.values).items():
+        fleet.get(tank_id).pump_on = on
+    cache.start()
+
+# Dispatch table keyed on the topic suffix after aquarium/[<tank_id>/]
+HANDLERS = {
+    "pump/status": on_status,
+    "lamp/status": on_status,
+    "temp": on_temp,
+    "water_level": on_water_level,
+    "temp/batch": on_temp_batch,
+    "water_level/batch": on_water_level_batch,
+    "feed": on_feed,
+    "alarm": on_alarm,
+    "state/get": on_state_get,
+}
+
+# Resolved topic -> (handler, tank, handler latency histogram); None for topics the manager ignores
+routes = {}
+
+def route(topic):
+    r = routes.get(topic, False)
+    if r is False:
+        parts = split_topic(topic, HANDLERS)
+        r = None if parts is None else (HANDLERS[parts[1]], fleet.get(parts[0]),
+                                        metrics.histogram("handler", parts[1]))
+        routes[topic] = r
+    return r
 
 def on_message(client, userdata, msg):
-    global pump_state
-    data = msg.payload.decode()
-
-    # --- Pump and Lamp Status (JSON) ---
-    if msg.topic in ["aquarium/pump/status", "aquarium/lamp/status"]:
-        try:
-            status = json.loads(data)
-            log_data(msg.topic, json.dumps(status))  # store JSON string
-            print(f"Status update: {msg.topic} {status}")
-        except Exception as e:
-            print(f"Error parsing relay status on {msg.topic}: {e}")
+    t0 = time.perf_counter()
+    r = routes.get(msg.topic) or route(msg.topic)
+    if r is None:
+        metrics.inc("ignored")
         return
+    handler, tank, latency = r
+    decoded = handler(client, tank, msg.topic, msg.payload)
+    if handler is not on_state_get:
+        cache.put(msg.topic, msg.payload, decoded)
+    if metrics.enabled:
+        latency.observe(time.perf_counter() - t0)
+
+def tank_of(topic):
+    # Intake shard key: a tank's messages (and its alarm echoes) stay on one worker, in order
+    r = routes.get(topic) or route(topic)
+    return None if r is None else r[1].tank_id
+
+def sampled(topic):
+    # Single readings the "sample" policy may thin out under load (batches are kept)
+    return split_topic(topic, ("temp", "water_level")) is not None
+
+intake = None
+
+last_stats = 0.0
+
+def report(client):
+    # Metrics every METRICS_INTERVAL, the console line every STATS_INTERVAL
+    global last_stats
+    metrics.report(client)
+    if time.monotonic() - last_stats >= STATS_INTERVAL:
+        last_stats = time.monotonic()
+        line = (f"📊 Log writer: {writer.stats()} | alarms: {alarms.stats()} | "
+                f"anomalies: {anomalies.stats()} | stale: {stale_skipped} | tanks: {len(fleet.tanks)}")
+        if intake:
+            line += f" | intake: {intake.stats()}"
+        print(line)
+
+class ManagerComponent:
+    """The manager as a device_host component (at most one per process)."""
+
+    topics = ["aquarium/#"]
+    interval = METRICS_INTERVAL
+
+    def __init__(self, rules_file=RULES_FILE, db_file=None, verbose=False):
+        self.rules_file = rules_file
+        self.db_file = db_file or DB_FILE
+        self.verbose = verbose
+
+    def start(self, client):
+        global writer, ECHO_LOGS
+        ECHO_LOGS = self.verbose
+        fleet.reload(RuleSet.load(self.rules_file))
+        RuleWatcher(self.rules_file, fleet.reload)
+        writer = LogWriter(self.db_file, metrics=metrics)
+        alarms.store = writer.set_alarm
+        alarms.load(self.db_file)
+        restore_state()
+        Pruner(self.db_file)  # hourly archive + prune on its own connection
+        print("🐟 Manager running... logging sensors + relay status")
+
+    def on_message(self, client, userdata, msg):
+        on_message(client, userdata, msg)
+
+    def tick(self, client):
+        report(client)
+
+    def stop(self):
+        cache.close()
+        writer.close()
+
+def main():
+    global writer, intake, ECHO_LOGS
+    args = sys.argv[1:]
+    if "--quiet" in args:
+        ECHO_LOGS = False
+        args.remove("--quiet")
+    rules_file = rules_path(args[0] if args else None)
+    fleet.reload(RuleSet.load(rules_file))
+    RuleWatcher(rules_file, fleet.reload)  # edits apply live, no restart
+
+    writer = LogWriter(DB_FILE, metrics=metrics)
+    alarms.store = writer.set_alarm
+    alarms.load(DB_FILE)
+    restore_state()
+    Pruner(DB_FILE)  # hourly archive + prune on its own connection
+    client = make_client()
+    if INTAKE_WORKERS > 0:
+        intake = Intake(on_message, tank_of, INTAKE_WORKERS, INTAKE_QUEUE, INTAKE_POLICY,
+                        sampled=sampled, metrics=metrics)
+        client.on_message = intake.on_message
+    else:
+        client.on_message = on_message
+    client.connect(BROKER, PORT, 60)
+    client.subscribe("aquarium/#")
+    # $profile/manager starts a profiling session; with intake workers the handlers run
+    # on intake-N threads, not the network thread the command arrives on
+    Profiler("manager", all_threads=intake is not None).attach(client)
+
+    print("🐟 Manager running... logging sensors + relay status")
+    client.loop_start()
+    try:
+        while True:
+            time.sleep(METRICS_INTERVAL)
+            report(client)
+    except KeyboardInterrupt:
+        print("Stopping manager, flushing logs...")
+    finally:
+        client.loop_stop()
+        if intake:
+            intake.stop()  # handle what is queued before the writer flushes
+        cache.close()
+        writer.close()
 
-    # --- Temperature Sensor ---
-    if msg.topic == "aquarium/temp":
-        try:
-            log_data(msg.topic, data)
-            t = json.loads(data)["temp"]
-
-            if t > MAX_TEMP:
-                client.publish("aquarium/alarm", f"⚠️ High Temperature! ({t}°C)")
-            elif t < MIN_TEMP:
-                client.publish("aquarium/alarm", f"⚠️ Low Temperature! ({t}°C)")
-        except Exception as e:
-            print("Error parsing temp:", e)
-
-    # --- Water Level Sensor ---
-    elif msg.topic == "aquarium/water_level":
-        try:
-            log_data(msg.topic, data)
-            lvl = json.loads(data)["level"]
-
-            if lvl < MIN_WATER_LEVEL and pump_state == "OFF":
-                client.publish("aquarium/pump", "ON")
-                pump_state = "ON"
-                client.publish("aquarium/alarm", f"⚠️ Pump ON (Low water {lvl}%)")
-
-            elif lvl > PUMP_OFF_THRESHOLD and pump_state == "ON":
-                client.publish("aquarium/pump", "OFF")
-                pump_state = "OFF"
-                client.publish("aquarium/alarm", f"✅ Pump OFF (Water restored {lvl}%)")
-
-        except Exception as e:
-            print("Error parsing water level:", e)
-
-    
-    # --- Feeder Button ---
-    elif msg.topic == "aquarium/feed":
-        log_data("aquarium/feed", data)
-        client.publish("aquarium/alarm", "✅ Fish fed!")
-
-    elif msg.topic == "aquarium/alarm":
-        log_data("aquarium/alarm", data)
-
-client = mqtt.Client()
-client.on_message = on_message
-client.connect("broker.hivemq.com", 1883, 60)
-client.subscribe("aquarium/#")
-
-print("🐟 Manager running... logging sensors + relay status")
-client.loop_forever()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import array, collections, gzip, json, os, struct, sys, zlib
+import db_schema
+
+# Archive files for expired sample partitions: archive/samples_YYYYMMDD-<set>.aqz
+# gzip stream of:
+#   b"AQZ1"
+#   per topic: name_len:H name:utf8 n:I
+#              timestamps  - first ts, then deltas (int64)
+#              value kind:B  0 = all NULL
+#                            1 = hundredths as int64 deltas (sensor readings)
+#                            2 = float64, NaN = NULL
+#              payload kind:B  0 = all NULL, 1 = len:I + JSON list
+# Readings change by a few hundredths per sample, so the deltas are tiny and
+# compress to well under a byte per value.
+ARCHIVE_DIR = "archive"
+SUFFIX = ".aqz"
+MAGIC = b"AQZ1"
+
+def _ints(values):
+    a = array.array("q", values)
+    if sys.byteorder == "big":
+        a.byteswap()
+    return a.tobytes()
+
+def _read_ints(data):
+    a = array.array("q")
+    a.frombytes(data)
+    if sys.byteorder == "big":
+        a.byteswap()
+    return a
+
+def _deltas(seq):
+    prev, out = 0, []
+    for x in seq:
+        out.append(x - prev)
+        prev = x
+    return out
+
+def _undelta(seq):
+    total, out = 0, []
+    for d in seq:
+        total += d
+        out.append(total)
+    return out
+
+def file_name(partition, topic_ids):
+    # Same partition + same expired topics -> same file; a re-run after a crash merges into it
+    tag = zlib.crc32(",".join(map(str, sorted(topic_ids))).encode())
+    return f"{partition}-{tag:08x}{SUFFIX}"
+
+def _merge(old, blocks):
+    # Rows already archived stay; rows still in the DB are only added if not in the file yet
+    old = dict(old)
+    for topic, rows in blocks:
+        have = old.pop(topic, [])
+        seen = collections.Counter(have)
+        new = []
+        for r in rows:
+            r = tuple(r)
+            if seen[r]:
+                seen[r] -= 1
+            else:
+                new.append(r)
+        yield topic, sorted(have + new, key=lambda r: r[0]) if new else have
+    yield from old.items()
+
+def _fsync_dir(path):
+    # Makes the rename durable; Windows can't open a directory (NTFS journals it anyway)
+    if os.name == "nt":
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def write(path, blocks):
+    """blocks: iterable of (topic, [(ts, value, payload), ...] in ts order). Returns rows written.
+
+    An existing file at `path` (left by a run interrupted while deleting) is merged, not
+    replaced, so rows deleted before the interruption stay archived. The file and its
+    directory entry are on disk when this returns, so the caller may delete the rows.
+    """
+    if os.path.exists(path):
+        blocks = _merge(read(path), blocks)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as f:
+            total = _write_blocks(f, blocks)
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp, path)
+    _fsync_dir(path)
+    return total
+
+def _write_blocks(f, blocks):
+    total = 0
+    f.write(MAGIC)
+    for topic, rows in blocks:
+        if not rows:
+            continue
+        name = topic.encode()
+        f.write(struct.pack("<HI", len(name), len(rows)) + name)
+        f.write(_ints(_deltas(r[0] for r in rows)))
+
+        values = [r[1] for r in rows]
+        if all(v is None for v in values):
+            f.write(b"\x00")
+        elif all(v is not None and round(v * 100) / 100 == v for v in values):
+            f.write(b"\x01" + _ints(_deltas(int(round(v * 100)) for v in values)))
+        else:
+            a = array.array("d", (float("nan") if v is None else v for v in values))
+            if sys.byteorder == "big":
+                a.byteswap()
+            f.write(b"\x02" + a.tobytes())
+
+        payloads = [r[2] for r in rows]
+        if all(p is None for p in payloads):
+            f.write(b"\x00")
+        else:
+            data = json.dumps(payloads, ensure_ascii=False).encode()
+            f.write(b"\x01" + struct.pack("<I", len(data)) + data)
+        total += len(rows)
+    return total
+
+def read(path, topics=None):
+    """Yield (topic, [(ts, value, payload), ...]) blocks; `topics` is an optional set of names."""
+    with gzip.open(path, "rb") as f:
+        if f.read(4) != MAGIC:
+            raise ValueError(f"{path}: not an archive file")
+        while True:
+            head = f.read(6)
+            if not head:
+                return
+            name_len, n = struct.unpack("<HI", head)
+            topic = f.read(name_len).decode()
+            ts = _undelta(_read_ints(f.read(8 * n)))
+
+            kind = f.read(1)
+            if kind == b"\x00":
+                values = [None] * n
+            elif kind == b"\x01":
+                values = [v / 100 for v in _undelta(_read_ints(f.read(8 * n)))]
+            else:
+                a = array.array("d")
+                a.frombytes(f.read(8 * n))
+                if sys.byteorder == "big":
+                    a.byteswap()
+                values = [None if v != v else v for v in a]
+
+            if f.read(1) == b"\x01":
+                size, = struct.unpack("<I", f.read(4))
+                payloads = json.loads(f.read(size))
+            else:
+                payloads = [None] * n
+
+            if topics is None or topic in topics:
+                yield topic, list(zip(ts, values, payloads))
+
+def files(archive_dir=ARCHIVE_DIR, since=None, until=None):
+    """[(day, path)] of archive files whose partition day overlaps [since, until), oldest first."""
+    if not os.path.isdir(archive_dir):
+        return []
+    out = []
+    for name in os.listdir(archive_dir):
+        if not (name.startswith(db_schema.PARTITION_PREFIX) and name.endswith(SUFFIX)):
+            continue
+        stamp = name[len(db_schema.PARTITION_PREFIX):].split("-", 1)[0]
+        try:
+            day = db_schema.partition_day_of(stamp)
+        except ValueError:
+            continue
+        if (since is None or (day + 1) * db_schema.DAY_MS > since) and \
+                (until is None or day * db_schema.DAY_MS < until):
+            out.append((day, os.path.join(archive_dir, name)))
+    return sorted(out)
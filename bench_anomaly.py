@@ -0,0 +1,95 @@
+import argparse, random, time, tracemalloc
+from alarms import AlarmEngine
+from anomaly import AnomalyDetector
+from replay import Capture
+
+# Cost of the anomaly detectors per sample and their state per tank, plus a check
+# that they stay quiet on the simulated sensors' normal behaviour and catch the
+# faults they are for. Readings follow temp_sensor.py / water_level_sensor.py
+# (5 s ticks, lamp and pump switched by the default rule limits).
+TICK_MS = 5000
+
+def simulate(ticks, fault=None, at=None, seed=0):
+    """[(ts, temp, level)] for one tank; `fault` starts at tick `at`."""
+    rnd = random.Random(seed)
+    temp, level, lamp, pump = 22.0, 50.0, False, False
+    out = []
+    for i in range(ticks):
+        broken = fault is not None and i >= at
+        if temp < 20:
+            lamp = True
+        elif temp > 26:
+            lamp = False
+        temp += rnd.uniform(0.2, 0.4) if lamp else -rnd.uniform(0.05, 0.15)
+        temp = max(5, min(40, temp + rnd.uniform(-0.05, 0.05)))
+        if level < 30:
+            pump = True
+        elif level > 80:
+            pump = False
+        level += 2 if pump else (-2.5 if broken and fault == "leak" else -1)
+        level = max(0, min(100, level))
+        t = round(temp, 2)
+        if broken and fault == "stuck":
+            t = out[at - 1][1]
+        if fault == "spike" and i == at:
+            t += 8
+        out.append((i * TICK_MS, t, level))
+    return out
+
+def scenario(fault, ticks, seed=0):
+    engine = AlarmEngine()
+    det = AnomalyDetector(engine)
+    client = Capture()
+    at = ticks // 2 if fault else None
+    first = None
+    for i, (ts, t, lvl) in enumerate(simulate(ticks, fault, at, seed)):
+        det.check(client, "", "temp", t, ts)
+        det.check(client, "", "water_level", lvl, ts)
+        if first is None and engine.published:
+            first = i
+    raised = [text for _, _, text in client.events if text.startswith("⚠️") and " since " not in text]
+    delay = None if first is None or at is None else (first - at) * TICK_MS / 1000
+    return raised, delay
+
+def cost(tanks, samples):
+    # Every tank replays the same normal day, so this is the common no-anomaly path
+    det = AnomalyDetector(AlarmEngine())
+    client = Capture()
+    ids = [f"t{i}" for i in range(tanks)]
+    ticks = simulate(samples // tanks + 1)
+    stream = [(ids[i % tanks], ticks[i // tanks]) for i in range(samples)]
+    t0 = time.perf_counter()
+    for tank, (ts, t, _) in stream:
+        det.check(client, tank, "temp", t, ts)
+    return (time.perf_counter() - t0) / samples * 1e9
+
+def memory(tanks):
+    tracemalloc.start()
+    det = AnomalyDetector(AlarmEngine())
+    client = Capture()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(tanks):
+        det.check(client, f"t{i}", "temp", 20.5, 0)
+        det.check(client, f"t{i}", "temp", 20.7, TICK_MS)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / tanks
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmark streaming anomaly detectors")
+    ap.add_argument("--tanks", type=int, default=10000)
+    ap.add_argument("--samples", type=int, default=1000000)
+    ap.add_argument("--ticks", type=int, default=17280, help="simulated 5 s ticks per scenario (default one day)")
+    ap.add_argument("--seeds", type=int, default=5, help="normal days checked for false alarms")
+    args = ap.parse_args()
+
+    ns = cost(args.tanks, args.samples)
+    print(f"AnomalyDetector.check: {ns:.0f} ns/sample ({args.samples} samples, {args.tanks} tanks)")
+    print(f"state: {memory(args.tanks):.0f} bytes per tank and reading (incl. dict entry and key)")
+    false = sum(len(scenario(None, args.ticks, seed)[0]) for seed in range(args.seeds))
+    print(f"normal: {false} raised in {args.seeds} simulated days")
+    for fault in ("leak", "stuck", "spike"):
+        raised, delay = scenario(fault, args.ticks)
+        kinds = sorted({text.split(" (")[0] for text in raised})
+        when = "" if delay is None else f", first after {delay:.0f} s"
+        print(f"{fault or 'normal':>6}: {len(raised)} raised{when} {kinds}")
@@ -0,0 +1,26 @@
+import sys, timeit
+import codec
+
+# Micro-benchmark: JSON vs binary payloads for the sensor and status topics.
+# Reports bytes per message and encode/decode cost per message.
+CASES = {
+    "temp": (lambda b: codec.encode_temp(22.13, binary=b)),
+    "water_level": (lambda b: codec.encode_level(57, binary=b)),
+    "status": (lambda b: codec.encode_status("AUTO", "ON", binary=b)),
+}
+
+def per_call_ns(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e9
+
+def main(number=200_000):
+    print(f"{'topic':<12} {'format':<7} {'bytes':>5} {'encode ns':>10} {'decode ns':>10}")
+    for name, encode in CASES.items():
+        for label, binary in (("json", False), ("binary", True)):
+            payload = encode(binary)
+            wire = payload if isinstance(payload, bytes) else payload.encode()
+            enc = per_call_ns(lambda: encode(binary), number)
+            dec = per_call_ns(lambda: codec.decode(wire), number)
+            print(f"{name:<12} {label:<7} {len(wire):>5} {enc:>10.0f} {dec:>10.0f}")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
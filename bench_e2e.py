@@ -0,0 +1,361 @@
+import argparse, asyncio, json, os, signal, socket, sqlite3, subprocess, sys, tempfile, threading, time
+import paho.mqtt.client as mqtt
+import codec, db_schema, mqtt_config, mqtt_bus
+from metrics import METRICS_TOPIC, METRICS_INTERVAL
+
+# End-to-end load/latency benchmark.
+# Starts local_broker.py, the manager and both relays as real processes against a
+# throwaway iot.db (in a temporary directory, removed afterwards unless --keep),
+# drives N simulated tanks and writes a JSON report:
+#   - messages the manager handled per second (from its $metrics/manager snapshots)
+#     and SQLite write rate (rows/s; includes the alarm/status rows the manager adds)
+#   - sensor -> aquarium/<tank>/pump command latency (manager)
+#   - command -> status latency for pump_relay.py and lamp_relay.py
+#   - peak RSS of every process
+# Compare against an earlier report with --baseline to catch regressions.
+# --inproc runs the manager and relays in this process instead (device_host on the
+# in-process bus, mqtt_bus.py): no sockets, so latencies are the code path alone.
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+COMPONENTS = {
+    "manager": ["aquarium_manager.py", "--quiet"],
+    "pump_relay": ["pump_relay.py"],
+    "lamp_relay": ["lamp_relay.py"],
+}
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def wait_port(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), 0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"broker did not start on port {port}")
+
+def rss_kb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+def summarize(samples, timeouts=0):
+    if not samples:
+        return {"n": 0, "timeouts": timeouts}
+    s = sorted(samples)
+    pick = lambda p: round(s[min(len(s) - 1, int(p / 100 * len(s)))] * 1000, 3)
+    return {"n": len(s), "timeouts": timeouts, "p50_ms": pick(50), "p90_ms": pick(90),
+            "p99_ms": pick(99), "max_ms": round(s[-1] * 1000, 3)}
+
+class Probe:
+    """Sends a stimulus and times the first matching response, one in flight at a time."""
+
+    def __init__(self, name, send, timeout):
+        self.name = name
+        self.send = send
+        self.timeout = timeout
+        self.sent_at = None
+        self.step = 0
+        self.samples = []
+        self.timeouts = 0
+
+    def tick(self, now):
+        if self.sent_at is not None and now - self.sent_at > self.timeout:
+            self.timeouts += 1
+            self.sent_at = None
+        if self.sent_at is None:
+            self.step += 1
+            self.sent_at = time.perf_counter()
+            self.send(self.step)
+
+    def hit(self):
+        if self.sent_at is not None:
+            self.samples.append(time.perf_counter() - self.sent_at)
+            self.sent_at = None
+
+class InProcess:
+    """The manager and both relays as device_host components on the in-process bus."""
+
+    def __init__(self, workdir):
+        mqtt_config.BROKER = mqtt_config.INPROC  # make_client() now returns bus clients
+        os.chdir(workdir)  # state.json, rules.json, archive/ like the subprocesses
+        from device_host import DeviceHost
+        import aquarium_manager
+        aquarium_manager.metrics.enabled = True  # handled_msgs_s comes from its snapshots
+        from pump_relay import PumpRelay
+        from lamp_relay import LampRelay
+        self.host = DeviceHost([aquarium_manager.ManagerComponent(db_file=os.path.join(workdir, "iot.db")),
+                                PumpRelay("", verbose=False), LampRelay("", verbose=False)])
+        self.loop = asyncio.new_event_loop()
+        self.task = self.loop.create_task(self.host.run())
+        self.thread = threading.Thread(target=self._run, name="device-host", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        try:
+            self.loop.run_until_complete(self.task)
+        except asyncio.CancelledError:
+            pass
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.task.cancel)
+        self.thread.join(10)
+
+def run(args):
+    if args.keep:
+        workdir = tempfile.mkdtemp(prefix="aquarium-bench-")
+        return dict(measure(args, workdir), workdir=workdir)
+    cwd = os.getcwd()  # --inproc runs the components in workdir
+    with tempfile.TemporaryDirectory(prefix="aquarium-bench-") as workdir:
+        try:
+            return measure(args, workdir)
+        finally:
+            os.chdir(cwd)
+
+def measure(args, workdir):
+    port = args.port or free_port()
+    # Metrics forced on: the manager's throughput is read from its $metrics snapshots
+    env = dict(os.environ, AQUARIUM_BROKER="127.0.0.1", AQUARIUM_PORT=str(port), AQUARIUM_METRICS="1",
+               PYTHONWARNINGS="ignore", PYTHONUNBUFFERED="1")
+    procs = {}
+    logs = open(os.path.join(workdir, "components.log"), "w")
+
+    def spawn(name, argv):
+        procs[name] = subprocess.Popen([sys.executable, os.path.join(HERE, argv[0]), *argv[1:]],
+                                       cwd=workdir, env=env, stdout=logs, stderr=subprocess.STDOUT)
+
+    start_spawn = time.perf_counter()
+    if args.inproc:
+        inproc = InProcess(workdir)
+        pids = {"process": os.getpid()}
+        new_client = mqtt_bus.Client
+    else:
+        spawn("broker", ["local_broker.py", str(port)])
+        wait_port(port)
+        start_spawn = time.perf_counter()
+        for name, argv in COMPONENTS.items():
+            spawn(name, argv)
+        pids = {name: p.pid for name, p in procs.items()}
+        new_client = mqtt.Client
+
+    # Observer: sees manager commands, relay status messages and the manager's metrics
+    probes = {}
+    last_state = {}
+    handled = []  # (perf_counter, messages handled so far) per manager metrics snapshot
+    def on_message(client, userdata, msg):
+        topic = msg.topic
+        if topic == metrics_topic:
+            # Every handled message is one observation in its route's handler histogram
+            snap = json.loads(msg.payload)
+            handled.append((time.perf_counter(),
+                            sum(h["n"] for h in snap["histograms"].get("handler", {}).values())))
+        elif topic.endswith("/pump") and topic.startswith("aquarium/probe"):
+            probe = probes.get(topic.split("/")[1])
+            if probe:
+                probe.hit()
+        elif topic in ("aquarium/pump/status", "aquarium/lamp/status"):
+            try:
+                state = codec.decode(msg.payload)["state"]
+            except Exception:
+                return
+            if last_state.get(topic) != state:
+                last_state[topic] = state
+                probe = probes.get(topic)
+                if probe:
+                    probe.hit()
+
+    observer = new_client()
+    observer.on_message = on_message
+    observer.connect("127.0.0.1", port, 60)
+    metrics_topic = f"{METRICS_TOPIC}/manager"
+    observer.subscribe([("aquarium/+/pump", 0), ("aquarium/pump/status", 0), ("aquarium/lamp/status", 0),
+                        (metrics_topic, 0)])
+    observer.loop_start()
+
+    load = new_client()
+    load.connect("127.0.0.1", port, 60)
+    load.loop_start()
+
+    # Give the components time to connect and subscribe
+    time.sleep(args.warmup)
+    startup_s = time.perf_counter() - start_spawn
+
+    # Probe tanks alternate low/high water so the manager toggles their pump every step
+    for i in range(args.probes):
+        tank = f"probe{i}"
+        probes[tank] = Probe("sensor_to_pump_cmd", lambda step, t=tank: load.publish(
+            f"aquarium/{t}/water_level", json.dumps({"level": 10 if step % 2 else 90})), args.probe_timeout)
+    probes["aquarium/pump/status"] = Probe("pump_cmd_to_status", lambda step: load.publish(
+        "aquarium/pump", "ON" if step % 2 else "OFF"), args.probe_timeout)
+    probes["aquarium/lamp/status"] = Probe("lamp_cmd_to_status", lambda step: load.publish(
+        "aquarium/lamp", "ON" if step % 2 else "OFF"), args.probe_timeout)
+
+    db_path = os.path.join(workdir, "iot.db")
+    def db_rows():
+        try:
+            conn = sqlite3.connect(db_path, timeout=1)
+            n = db_schema.row_estimate(conn)
+            conn.close()
+            return n
+        except sqlite3.Error:
+            return 0
+
+    rows_before = db_rows()
+    handled_before = handled[-1][1] if handled else 0
+    rss_peak = {}
+    write_rates = []
+    tanks = [f"t{i}" for i in range(args.tanks)]
+    interval = 1.0 / args.rate
+    sent = 0
+    t0 = time.perf_counter()
+    next_sample = t0 + 1
+    last_rows, last_sample_t = rows_before, t0
+    next_probe = t0
+    tick = 0
+
+    # --- Load phase ---
+    while time.perf_counter() - t0 < args.duration:
+        now = time.perf_counter()
+        due = int((now - t0) / interval) + 1
+        while tick < due:
+            for tank in tanks:
+                load.publish(f"aquarium/{tank}/temp", '{"temp": 22.5}')
+                load.publish(f"aquarium/{tank}/water_level", '{"level": 50}')
+            sent += 2 * len(tanks)
+            tick += 1
+        if now >= next_probe:
+            for p in probes.values():
+                p.tick(now)
+            next_probe = now + args.probe_interval
+        if now >= next_sample:
+            rows = db_rows()
+            write_rates.append((rows - last_rows) / (now - last_sample_t))
+            last_rows, last_sample_t = rows, now
+            for name, pid in pids.items():
+                kb = rss_kb(pid)
+                if kb:
+                    rss_peak[name] = max(rss_peak.get(name, 0), kb)
+            next_sample = now + 1
+        time.sleep(0.001)
+    send_s = time.perf_counter() - t0
+
+    # --- Drain: wait until the DB stops growing ---
+    drain_start = time.perf_counter()
+    rows, stable_since = db_rows(), time.perf_counter()
+    while time.perf_counter() - stable_since < args.settle:
+        time.sleep(0.25)
+        n = db_rows()
+        if n != rows:
+            rows, stable_since = n, time.perf_counter()
+    drain_s = max(0.0, stable_since - drain_start)
+
+    # The manager's next metrics snapshot counts everything handled up to the drain's end
+    drained = time.perf_counter()
+    while not (handled and handled[-1][0] > drained) and time.perf_counter() - drained < METRICS_INTERVAL + 2:
+        time.sleep(0.25)
+    messages = handled[-1][1] - handled_before if handled and handled[-1][0] > drained else None
+
+    observer.loop_stop()
+    load.loop_stop()
+    if args.inproc:
+        inproc.stop()
+    if procs:
+        for name in ("manager", "pump_relay", "lamp_relay", "broker"):
+            p = procs[name]
+            p.send_signal(signal.SIGINT if name == "manager" else signal.SIGTERM)
+            try:
+                p.wait(10)
+            except subprocess.TimeoutExpired:
+                p.kill()
+    logs.close()
+
+    written = rows - rows_before
+    by_name = {}
+    for p in probes.values():
+        agg = by_name.setdefault(p.name, ([], [0]))
+        agg[0].extend(p.samples)
+        agg[1][0] += p.timeouts
+
+    return {
+        "config": {"tanks": args.tanks, "rate_hz": args.rate, "duration_s": args.duration,
+                   "probes": args.probes, "inproc": args.inproc},
+        "startup_s": round(startup_s, 3),
+        "sent": sent,
+        "offered_rate": round(sent / send_s, 1),
+        "manager": {"messages_handled": messages,
+                    "handled_msgs_s": None if messages is None else round(messages / (send_s + drain_s), 1),
+                    "rows_written": written,
+                    "drain_s": round(drain_s, 3)},
+        "sqlite": {"write_rate_avg": round(written / (send_s + drain_s), 1),
+                   "write_rate_peak": round(max(write_rates, default=0), 1)},
+        "latency": {name: summarize(s, t[0]) for name, (s, t) in by_name.items()},
+        "rss_peak_kb": rss_peak,
+    }
+
+# Report keys where bigger is better / smaller is better
+HIGHER = [("manager", "handled_msgs_s"), ("sqlite", "write_rate_avg")]
+LOWER = [("latency", "sensor_to_pump_cmd", "p99_ms"), ("latency", "pump_cmd_to_status", "p99_ms"),
+         ("latency", "lamp_cmd_to_status", "p99_ms"), ("rss_peak_kb", "manager")]
+
+def dig(report, path):
+    for key in path:
+        if not isinstance(report, dict) or key not in report:
+            return None
+        report = report[key]
+    return report
+
+def compare(report, baseline, tolerance):
+    regressions = []
+    for path, worse in [(p, lambda new, old: new < old * (1 - tolerance)) for p in HIGHER] + \
+                       [(p, lambda new, old: new > old * (1 + tolerance)) for p in LOWER]:
+        new, old = dig(report, path), dig(baseline, path)
+        if new is not None and old and worse(new, old):
+            regressions.append(f"{'.'.join(path)}: {old} -> {new}")
+    return regressions
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Aquarium end-to-end load and latency benchmark")
+    ap.add_argument("--tanks", type=int, default=100, help="simulated tanks publishing temp + water level")
+    ap.add_argument("--rate", type=float, default=1.0, help="readings per second per tank and sensor")
+    ap.add_argument("--duration", type=float, default=20.0, help="load phase length in seconds")
+    ap.add_argument("--probes", type=int, default=5, help="tanks used for actuation latency probes")
+    ap.add_argument("--probe-interval", type=float, default=0.5)
+    ap.add_argument("--probe-timeout", type=float, default=5.0)
+    ap.add_argument("--warmup", type=float, default=2.0)
+    ap.add_argument("--settle", type=float, default=2.0, help="seconds without new rows that end the drain")
+    ap.add_argument("--port", type=int, default=0)
+    ap.add_argument("--inproc", action="store_true",
+                    help="manager and relays in this process on the in-process bus (no broker, no sockets)")
+    ap.add_argument("--keep", action="store_true", help="keep the work directory (iot.db, components.log)")
+    ap.add_argument("--out", default="bench_report.json")
+    ap.add_argument("--baseline", help="earlier report to compare against")
+    ap.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = ap.parse_args()
+
+    report = run(args)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+    print(f"📄 Report written to {args.out}")
+    if report["manager"]["messages_handled"] is None:
+        # No snapshot after the drain (manager died or never reported): no throughput to compare
+        print(f"❌ No {METRICS_TOPIC}/manager snapshot after the drain, manager.handled_msgs_s is missing")
+        sys.exit(1)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for r in regressions:
+            print("❌ Regression:", r)
+        if regressions:
+            sys.exit(1)
+        print("✅ No regressions against", args.baseline)
@@ -0,0 +1,79 @@
+import argparse, time
+from intake import Intake, POLICIES
+from replay import Message
+
+# What each backpressure policy does when the handlers fall behind: messages for
+# --tanks tanks are offered faster than --cost allows the workers to handle them,
+# for --duration seconds. Reports how long the producer (the MQTT network thread)
+# was held up, what was left out, queue wait percentiles, and checks that every
+# tank's messages were handled in the order they were offered.
+READINGS = ("temp", "water_level")
+
+def run(policy, tanks, workers, queue_size, rate, cost, duration):
+    handled = {}  # tank -> last sequence number handled
+    waits = []
+    out_of_order = [0]
+
+    def handle(client, userdata, msg):
+        t = time.perf_counter()
+        end = t + cost
+        while time.perf_counter() < end:
+            pass  # busy, like a handler that holds the GIL
+        tank, seq, sent = userdata_of[id(msg)]
+        if seq < handled.get(tank, -1):
+            out_of_order[0] += 1
+        handled[tank] = seq
+        waits.append(t - sent)
+
+    def key(topic):
+        return topic.split("/")[1]
+
+    def sampled(topic):
+        return topic.endswith(READINGS)
+
+    userdata_of = {}
+    intake = Intake(handle, key, workers, queue_size, policy, sampled=sampled)
+    topics = [[f"aquarium/t{i}/{r}" for r in READINGS + ("pump/status",)] for i in range(tanks)]
+    n = 0
+    t0 = time.perf_counter()
+    while True:
+        now = time.perf_counter()
+        if now - t0 >= duration:
+            break
+        due = int((now - t0) * rate)
+        while n < due:
+            tank = n % tanks
+            msg = Message(topics[tank][(n // tanks) % 3], b"1")
+            userdata_of[id(msg)] = (tank, n, time.perf_counter())
+            intake.on_message(None, None, msg)
+            n += 1
+        time.sleep(0.0005)
+    offered_s = time.perf_counter() - t0
+    intake.stop(timeout=60)
+    stats = intake.stats()
+    waits.sort()
+    pct = lambda p: waits[min(len(waits) - 1, int(p * len(waits)))] * 1000 if waits else 0
+    return {"policy": policy, "offered": n, "offered_per_s": round(n / offered_s),
+            "handled": stats["processed"], "dropped": stats["dropped"], "sampled": stats["sampled"],
+            "blocked_s": stats["blocked_s"], "max_depth": stats["max_depth"],
+            "wait_p50_ms": round(pct(0.5), 1), "wait_p99_ms": round(pct(0.99), 1),
+            "out_of_order": out_of_order[0]}
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmark the manager's intake backpressure policies")
+    ap.add_argument("--tanks", type=int, default=100)
+    ap.add_argument("--workers", type=int, default=2)
+    ap.add_argument("--queue", type=int, default=2000)
+    ap.add_argument("--rate", type=float, default=8000, help="messages offered per second")
+    ap.add_argument("--cost", type=float, default=0.0002, help="seconds of handler work per message")
+    ap.add_argument("--duration", type=float, default=5)
+    args = ap.parse_args()
+
+    print(f"{args.rate:.0f} msgs/s offered, handlers can do ~{1 / args.cost:.0f}/s (GIL-bound), "
+          f"{args.workers} workers, queue {args.queue}")
+    for policy in POLICIES:
+        r = run(policy, args.tanks, args.workers, args.queue, args.rate, args.cost, args.duration)
+        print(f"{policy:>11}: offered {r['offered_per_s']}/s, handled {r['handled']}/{r['offered']}, "
+              f"dropped {r['dropped']}, sampled out {r['sampled']}, producer blocked {r['blocked_s']} s, "
+              f"max depth {r['max_depth']}, wait p50 {r['wait_p50_ms']} ms p99 {r['wait_p99_ms']} ms, "
+              f"out of order {r['out_of_order']}")
@@ -0,0 +1,130 @@
+import json, struct
+from mqtt_config import PAYLOAD_FORMAT
+
+# Payload encodings for sensor and relay status topics.
+#
+# JSON (default):  {"temp": 22.13} / {"level": 50} / {"mode": "AUTO", "state": "ON"}
+# Binary (v1):     fixed layout, little endian, first byte is the format version
+#   temp         <B B h   version, kind=1, temperature in 1/100 °C
+#   water_level  <B B H   version, kind=2, level in 1/100 %
+#   status       <B B B   version, kind=3, flags (bit0 = ON, bit1 = MANUAL)
+#   temp batch   <B B H q version, kind=4, count, first timestamp (epoch ms),
+#                then count x <I h  (ms since first timestamp, 1/100 °C)
+#   level batch  same with kind=5 and <I H samples
+#
+# Batches go to "<reading topic>/batch"; their JSON form is
+# {"temp": [[ts_ms, value], ...]} / {"level": [[ts_ms, value], ...]}.
+#
+# JSON payloads start with '{' and binary ones with the version byte, so every
+# consumer can decode both formats. Publishers pick one with AQUARIUM_PAYLOAD, per topic
+# suffix: "binary", or "json,temp=binary,status=binary" (a batch follows its reading).
+VERSION = 1
+TEMP, LEVEL, STATUS, TEMP_BATCH, LEVEL_BATCH = 1, 2, 3, 4, 5
+BATCH_SUFFIX = "/batch"
+
+_TEMP = struct.Struct("<BBh")
+_LEVEL = struct.Struct("<BBH")
+_STATUS = struct.Struct("<BBB")
+_BATCH_HEAD = struct.Struct("<BBHq")
+_BATCH_ITEM = {TEMP_BATCH: struct.Struct("<Ih"), LEVEL_BATCH: struct.Struct("<IH")}
+_BATCH_KEY = {TEMP_BATCH: "temp", LEVEL_BATCH: "level"}
+_BATCH_KIND = {"temp": TEMP_BATCH, "level": LEVEL_BATCH}
+
+SUFFIXES = ("temp", "water_level", "status")
+FORMATS = ("json", "binary")
+_SUFFIX = {"temp": "temp", "level": "water_level"}  # batch key -> reading suffix
+
+def parse_formats(spec):
+    """AQUARIUM_PAYLOAD -> {suffix: True for binary}."""
+    default, chosen = "json", {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        suffix, eq, fmt = part.rpartition("=")
+        if fmt not in FORMATS or (eq and suffix not in SUFFIXES):
+            raise ValueError(f"bad AQUARIUM_PAYLOAD entry {part!r} "
+                             f"(format: {'|'.join(FORMATS)}, suffixes: {', '.join(SUFFIXES)})")
+        if eq:
+            chosen[suffix] = fmt
+        else:
+            default = fmt
+    return {s: chosen.get(s, default) == "binary" for s in SUFFIXES}
+
+BINARY = parse_formats(PAYLOAD_FORMAT)
+
+def encode_temp(temp, binary=None):
+    if binary if binary is not None else BINARY["temp"]:
+        return _TEMP.pack(VERSION, TEMP, round(temp * 100))
+    return json.dumps({"temp": temp})
+
+def encode_level(level, binary=None):
+    if binary if binary is not None else BINARY["water_level"]:
+        return _LEVEL.pack(VERSION, LEVEL, round(level * 100))
+    return json.dumps({"level": level})
+
+def encode_status(mode, state, binary=None):
+    if binary if binary is not None else BINARY["status"]:
+        return _STATUS.pack(VERSION, STATUS, (state == "ON") | (mode == "MANUAL") << 1)
+    return json.dumps({"mode": mode, "state": state})
+
+def encode_batch(key, samples, binary=None):
+    """Encode [(ts_ms, value), ...] for key "temp" or "level"."""
+    if binary if binary is not None else BINARY[_SUFFIX[key]]:
+        kind = _BATCH_KIND[key]
+        item = _BATCH_ITEM[kind]
+        t0 = samples[0][0] if samples else 0
+        out = bytearray(_BATCH_HEAD.pack(VERSION, kind, len(samples), t0))
+        for ts, value in samples:
+            out += item.pack(ts - t0, round(value * 100))
+        return bytes(out)
+    return json.dumps({key: [[ts, value] for ts, value in samples]})
+
+def _number(raw):
+    return raw // 100 if raw % 100 == 0 else raw / 100
+
+def decode(payload):
+    """Decode a JSON or binary payload (bytes or str) into its dict form.
+
+    Raises ValueError for anything else, including binary versions this code doesn't know.
+    """
+    if isinstance(payload, (bytes, bytearray)):
+        first = payload[:1]
+        if first == b"\x01":
+            try:
+                return _decode_v1(payload)
+            except struct.error as e:
+                raise ValueError(f"Malformed binary payload: {e}") from None
+        if first != b"{" and not first.isdigit() and not first.isspace():
+            if first and first[0] < 0x20:
+                raise ValueError(f"unsupported payload version {first[0]}")
+            raise ValueError(f"Not a JSON or binary payload: {bytes(payload[:16])!r}")
+    return json.loads(payload)
+
+def _decode_v1(payload):
+    kind = payload[1] if len(payload) > 1 else None
+    if kind == TEMP:
+        return {"temp": _number(_TEMP.unpack(payload)[2])}
+    if kind == LEVEL:
+        return {"level": _number(_LEVEL.unpack(payload)[2])}
+    if kind == STATUS:
+        flags = _STATUS.unpack(payload)[2]
+        return {"mode": "MANUAL" if flags & 2 else "AUTO", "state": "ON" if flags & 1 else "OFF"}
+    if kind in _BATCH_ITEM:
+        _, _, count, t0 = _BATCH_HEAD.unpack_from(payload)
+        samples = [(t0 + dt, _number(raw)) for dt, raw in
+                   _BATCH_ITEM[kind].iter_unpack(payload[_BATCH_HEAD.size:])]
+        if len(samples) != count:
+            raise ValueError("Truncated batch payload")
+        return {_BATCH_KEY[kind]: samples}
+    raise ValueError(f"Unknown binary payload kind {kind}")
+
+def to_text(payload, decoded=None):
+    """Payload as text: binary payloads become their JSON equivalent (from `decoded`, the
+    caller's decode() result, if it has one). Never raises: bytes that are neither a valid
+    binary payload nor UTF-8 come back with backslash escapes."""
+    if not isinstance(payload, (bytes, bytearray)):
+        return payload
+    if payload[:1] == b"\x01":
+        try:
+            return json.dumps(decode(payload) if decoded is None else decoded)
+        except ValueError:
+            pass
+    return payload.decode(errors="backslashreplace")
@@ -0,0 +1,207 @@
+import sqlite3, json, time, calendar
+
+DB_FILE = "iot.db"
+
+# Typed time-series schema:
+#   topics  - interned topic names (one small integer id per topic)
+#   samples_YYYYMMDD - one partition per UTC day: integer epoch-ms timestamp, numeric
+#             value and optional raw/JSON payload (expired days are archived and dropped,
+#             see retention.py)
+#   rollup_minute / rollup_hour - count/min/max/sum per topic per bucket (see rollups.py)
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS topics (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS rollup_minute (
+    topic_id INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    min REAL,
+    max REAL,
+    sum REAL,
+    PRIMARY KEY (topic_id, bucket)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_hour (
+    topic_id INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    min REAL,
+    max REAL,
+    sum REAL,
+    PRIMARY KEY (topic_id, bucket)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS alarms (
+    tank TEXT NOT NULL,
+    name TEXT NOT NULL,
+    active INTEGER NOT NULL,
+    since INTEGER,
+    value REAL,
+    last_sent INTEGER,
+    raised INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (tank, name)
+) WITHOUT ROWID;
+"""
+
+# Daily sample partitions
+DAY_MS = 86_400_000
+PARTITION_PREFIX = "samples_"
+LEGACY_SAMPLES = "samples"  # single table used before partitioning (moved by migrate_db.py)
+PARTITION_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS {name} (
+        ts INTEGER NOT NULL,
+        topic_id INTEGER NOT NULL REFERENCES topics(id),
+        value REAL,
+        payload TEXT
+    )""",
+    "CREATE INDEX IF NOT EXISTS {name}_topic_ts ON {name}(topic_id, ts)",
+    "CREATE INDEX IF NOT EXISTS {name}_ts ON {name}(ts)",
+)
+
+# JSON keys that carry the numeric reading of a sensor payload
+VALUE_KEYS = ("temp", "level")
+
+def connect(db_file=DB_FILE):
+    conn = sqlite3.connect(db_file)
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")  # only takes effect on a new database
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    init_db(conn)
+    return conn
+
+def init_db(conn):
+    conn.executescript(SCHEMA)
+    conn.commit()
+
+def partition_day(ts_ms):
+    return ts_ms // DAY_MS
+
+def partition_name(day):
+    return PARTITION_PREFIX + time.strftime("%Y%m%d", time.gmtime(day * 86400))
+
+def partition_day_of(stamp):
+    """Day number from the YYYYMMDD part of a partition name (ValueError if malformed)."""
+    return calendar.timegm(time.strptime(stamp, "%Y%m%d")) // 86400
+
+def partitions(conn, since=None, until=None):
+    """[(day, table)] oldest first, overlapping [since, until) in ms.
+
+    A legacy unpartitioned `samples` table, if still present, comes first with day None.
+    """
+    out = []
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name LIKE 'samples%'"):
+        if name == LEGACY_SAMPLES:
+            out.append((-1, None, name))
+            continue
+        try:
+            day = partition_day_of(name[len(PARTITION_PREFIX):])
+        except ValueError:
+            continue
+        if (since is None or (day + 1) * DAY_MS > since) and (until is None or day * DAY_MS < until):
+            out.append((day, day, name))
+    return [(day, name) for _, day, name in sorted(out)]
+
+def row_estimate(conn):
+    """Rows written so far (sum of max rowid per partition; cheap, ignores deletes)."""
+    return sum(conn.execute(f"SELECT max(rowid) FROM {name}").fetchone()[0] or 0
+               for _, name in partitions(conn))
+
+class PartitionWriter:
+    """Inserts (ts, topic_id, value, payload) rows into their daily partition, creating it on first use."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created = set()
+
+    def table(self, day):
+        name = partition_name(day)
+        if day not in self.created:
+            for stmt in PARTITION_SCHEMA:  # plain execute: stays inside the caller's transaction
+                self.conn.execute(stmt.format(name=name))
+            self.created.add(day)
+        return name
+
+    def insert(self, rows):
+        by_day = {}
+        for row in rows:
+            by_day.setdefault(row[0] // DAY_MS, []).append(row)
+        for day, day_rows in by_day.items():
+            sql = "INSERT INTO {} (ts, topic_id, value, payload) VALUES (?, ?, ?, ?)"
+            try:
+                self.conn.executemany(sql.format(self.table(day)), day_rows)
+            except sqlite3.OperationalError:
+                # Partition dropped by retention since we created it (late data): recreate
+                self.created.discard(day)
+                self.conn.executemany(sql.format(self.table(day)), day_rows)
+
+# Wall clock by default; replay.py swaps in a virtual clock (seconds, like time.time)
+clock = time.time
+
+def now_ms():
+    return int(clock() * 1000)
+
+def format_ts(ts_ms):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts_ms / 1000))
+
+def parse_ts(text):
+    # Legacy TEXT timestamps were written with local-time strftime
+    return int(time.mktime(time.strptime(text, "%Y-%m-%d %H:%M:%S")) * 1000)
+
+def split_value(payload):
+    """Split a raw message payload into (numeric value, payload to keep)."""
+    if isinstance(payload, (int, float)) and not isinstance(payload, bool):
+        return float(payload), None  # already decoded by the caller
+    try:
+        data = json.loads(payload)
+    except (TypeError, ValueError):
+        return None, payload
+
+    if isinstance(data, bool):
+        return None, payload
+    if isinstance(data, (int, float)):
+        return float(data), None
+    if isinstance(data, dict):
+        for key in VALUE_KEYS:
+            v = data.get(key)
+            if isinstance(v, (int, float)) and len(data) == 1:
+                return float(v), None
+        # Relay status: keep the JSON, index ON/OFF as 1/0
+        if "state" in data:
+            return (1.0 if data["state"] == "ON" else 0.0), payload
+    return None, payload
+
+def join_value(value, payload):
+    """Inverse of split_value for display: prefer the original payload."""
+    if payload is not None:
+        return payload
+    if value is None:
+        return ""
+    return repr(int(value)) if value.is_integer() else repr(value)
+
+class TopicIds:
+    """Cache of topic name -> id, inserting unknown topics on first use."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.ids = dict(conn.execute("SELECT name, id FROM topics"))
+
+    def get(self, name):
+        tid = self.ids.get(name)
+        if tid is None:
+            self.conn.execute("INSERT OR IGNORE INTO topics (name) VALUES (?)", (name,))
+            tid = self.conn.execute("SELECT id FROM topics WHERE name=?", (name,)).fetchone()[0]
+            self.ids[name] = tid
+        return tid
+
+    def lookup(self, name):
+        """Id of an existing topic, or None (never inserts)."""
+        tid = self.ids.get(name)
+        if tid is None:
+            row = self.conn.execute("SELECT id FROM topics WHERE name=?", (name,)).fetchone()
+            if row:
+                tid = self.ids[name] = row[0]
+        return tid
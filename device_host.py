@@ -0,0 +1,217 @@
+import argparse, asyncio, random, socket, sys, time
+import paho.mqtt.client as mqtt
+from mqtt_config import BROKER, PORT, make_client
+from local_broker import topic_matches
+from temp_sensor import TempSensor
+from water_level_sensor import WaterLevelSensor
+from lamp_relay import LampRelay
+from pump_relay import PumpRelay
+from aquarium_manager import ManagerComponent
+from rules import RuleSet, RuleWatcher, RULES_FILE, rules_path
+from metrics import Metrics
+from profiler import Profiler
+
+# Runs any number of sensors/relays (and optionally the manager) as coroutines
+# on one asyncio event loop sharing a single broker connection.
+#
+# A component is any object with:
+#   topics                          - MQTT filters it wants
+#   interval                        - seconds between tick() calls
+#   start(client) / tick(client)    - called on the event loop
+#   on_message(client, userdata, msg)
+#   stop()                          - optional, called on shutdown
+PROCESS_START = time.perf_counter()
+
+DEVICES = {
+    "temp": TempSensor,
+    "water": WaterLevelSensor,
+    "lamp": LampRelay,
+    "pump": PumpRelay,
+}
+
+def rss_kb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+class AsyncioMqtt:
+    """Drives a paho client from the event loop's socket callbacks (no network thread)."""
+
+    def __init__(self, loop, client):
+        self.loop = loop
+        self.client = client
+        self.misc = None
+        client.on_socket_open = self.on_socket_open
+        client.on_socket_close = self.on_socket_close
+        client.on_socket_register_write = self.on_socket_register_write
+        client.on_socket_unregister_write = self.on_socket_unregister_write
+
+    def on_socket_open(self, client, userdata, sock):
+        self.loop.add_reader(sock, lambda: client.loop_read(64))
+        self.misc = self.loop.create_task(self.misc_loop())
+
+    def on_socket_close(self, client, userdata, sock):
+        self.loop.remove_reader(sock)
+        if self.misc:
+            self.misc.cancel()
+
+    def on_socket_register_write(self, client, userdata, sock):
+        self.loop.add_writer(sock, client.loop_write)
+
+    def on_socket_unregister_write(self, client, userdata, sock):
+        self.loop.remove_writer(sock)
+
+    async def misc_loop(self):
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(1)
+
+class DeviceHost:
+    def __init__(self, components):
+        self.components = components
+        self.exact = {}       # topic -> [component]
+        self.wildcard = []    # (filter, component)
+        for comp in components:
+            for f in comp.topics:
+                if "#" in f or "+" in f:
+                    self.wildcard.append((f, comp))
+                else:
+                    self.exact.setdefault(f, []).append(comp)
+        self.routes = {}      # topic -> tuple of components (cached)
+
+    def filters(self):
+        # Skip exact topics already covered by a wildcard subscription
+        wild = {f for f, _ in self.wildcard}
+        exact = [t for t in self.exact if not any(topic_matches(w, t) for w in wild)]
+        return sorted(wild) + exact
+
+    def route(self, topic):
+        comps = self.routes.get(topic)
+        if comps is None:
+            comps = list(self.exact.get(topic, ()))
+            comps += [c for f, c in self.wildcard if topic_matches(f, topic) and c not in comps]
+            comps = self.routes[topic] = tuple(comps)
+        return comps
+
+    def on_message(self, client, userdata, msg):
+        for comp in self.routes.get(msg.topic) or self.route(msg.topic):
+            comp.on_message(client, userdata, msg)
+
+    async def run_component(self, client, comp):
+        # Spread the first tick over one interval so devices don't publish in lockstep
+        await asyncio.sleep(random.uniform(0, comp.interval))
+        next_tick = time.monotonic()
+        while True:
+            comp.tick(client)
+            next_tick += comp.interval
+            await asyncio.sleep(max(0, next_tick - time.monotonic()))
+
+    async def run(self, duration=None):
+        loop = asyncio.get_running_loop()
+        connected = loop.create_future()
+        subscribed = set()
+        all_subscribed = loop.create_future()
+
+        client = make_client()
+        tcp = isinstance(client, mqtt.Client)
+        if tcp:
+            AsyncioMqtt(loop, client)
+        else:
+            # In-process bus (AQUARIUM_BROKER=inproc): its callbacks run on this loop too
+            client.wakeup = lambda: loop.call_soon_threadsafe(client.loop, 0)
+        client.on_message = self.on_message
+        client.on_connect = lambda c, u, flags, rc: connected.done() or connected.set_result(rc)
+
+        def on_subscribe(c, u, mid, granted):
+            subscribed.discard(mid)
+            if not subscribed and not all_subscribed.done():
+                all_subscribed.set_result(True)
+        client.on_subscribe = on_subscribe
+
+        client.connect(BROKER, PORT, 60)
+        if tcp:
+            client.socket().setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 20)
+        await connected
+
+        filters = self.filters()
+        for i in range(0, len(filters), 100):
+            _, mid = client.subscribe([(f, 0) for f in filters[i:i + 100]])
+            subscribed.add(mid)
+        if filters:
+            await all_subscribed
+
+        for comp in self.components:
+            comp.start(client)
+        startup_s = time.perf_counter() - PROCESS_START
+        tasks = [asyncio.create_task(self.run_component(client, c)) for c in self.components]
+        print(f"🚀 {len(self.components)} components on one connection, started in {startup_s:.3f}s")
+
+        try:
+            if duration:
+                await asyncio.sleep(duration)
+            else:
+                await asyncio.gather(*tasks)
+        finally:
+            for t in tasks:
+                t.cancel()
+            for comp in self.components:
+                stop = getattr(comp, "stop", None)
+                if stop:
+                    stop()
+            client.disconnect()
+        return startup_s
+
+def build(tanks, devices, interval, batch, with_manager, verbose, rules_file=RULES_FILE):
+    components = []
+    rules = RuleSet.load(rules_file)  # compiled once, shared by every relay
+    host = f"device_host-{socket.gethostname()}"
+    metrics = Metrics(host)  # one report for all relays, not one each
+    components.append(Profiler(host))  # $profile/<host> profiles the whole event loop
+    for i in range(tanks):
+        tank_id = "" if tanks == 1 else f"t{i}"
+        for name in devices:
+            cls = DEVICES[name]
+            if name in ("temp", "water"):
+                components.append(cls(tank_id, interval, batch, verbose=verbose))
+            else:
+                components.append(cls(tank_id, verbose=verbose, rules=rules, metrics=metrics))
+    if with_manager:
+        components.append(ManagerComponent(rules_file, verbose=verbose))
+    return components
+
+def reload_rules(components, rules):
+    for comp in components:
+        set_rules = getattr(comp, "set_rules", None)
+        if set_rules:
+            set_rules(rules)
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Run many simulated aquarium devices in one process")
+    ap.add_argument("--tanks", type=int, default=1, help="tanks to simulate (1 = default aquarium/... topics)")
+    ap.add_argument("--devices", default="temp,water,lamp,pump", help=f"comma list of {','.join(DEVICES)}")
+    ap.add_argument("--interval", type=float, default=5, help="sensor sample interval in seconds")
+    ap.add_argument("--batch", type=int, default=0, help="sensor batch size (0 = no batching)")
+    ap.add_argument("--manager", action="store_true", help="also host aquarium_manager")
+    ap.add_argument("--duration", type=float, help="stop after this many seconds")
+    ap.add_argument("--verbose", action="store_true", help="per-message prints from every device")
+    ap.add_argument("--rules", help=f"rules file (reloaded when it changes; default {RULES_FILE})")
+    args = ap.parse_args()
+    args.rules = rules_path(args.rules)
+
+    devices = [d.strip() for d in args.devices.split(",") if d.strip()]
+    rss_before = rss_kb()
+    components = build(args.tanks, devices, args.interval, args.batch, args.manager, args.verbose, args.rules)
+    RuleWatcher(args.rules, lambda rules: reload_rules(components, rules))
+    host = DeviceHost(components)
+    try:
+        startup_s = asyncio.run(host.run(args.duration))
+    except KeyboardInterrupt:
+        sys.exit(0)
+    n = len(components)
+    rss_after = rss_kb()
+    print(f"📏 startup {startup_s:.3f}s | RSS {rss_before} → {rss_after} KB | "
+          f"{(rss_after - rss_before) / max(1, n):.2f} KB per device ({n} devices)")
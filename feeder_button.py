@@ -1,11 +1,11 @@
 import sys
-import paho.mqtt.client as mqtt
 from PyQt5.QtWidgets import QApplication, QWidget, QPushButton, QVBoxLayout, QLabel, QProgressBar
 from PyQt5.QtCore import QTimer
+from mqtt_config import BROKER, PORT, make_client
 
 # MQTT Setup
-client = mqtt.Client()
-client.connect("broker.hivemq.com", 1883, 60)
+client = make_client()
+client.connect(BROKER, PORT, 60)
 
 class FeederApp(QWidget):
     def __init__(self):
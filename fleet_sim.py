@@ -0,0 +1,203 @@
+import argparse, time
+import numpy as np
+import codec
+from mqtt_config import BROKER, PORT, make_client
+from tanks import tank_topic, split_topic
+
+# Load-test fleet: the temp_sensor / water_level_sensor physics for N tanks at once.
+# Temperature, level, lamp and pump state live in NumPy arrays and every tank
+# advances in one vectorized step per tick; only the MQTT publishes are per tank.
+# Tanks are t0 .. t<N-1>, the same ids device_host.py uses.
+SAMPLE_INTERVAL = 5   # seconds per tick (the physics steps below are per 5 s tick)
+BATCH_SIZE = 0        # ticks per published batch (0 = one message per reading)
+STATS_INTERVAL = 10   # wall seconds between progress lines
+
+class FleetSim:
+    """N simulated tanks. Also a device_host component (topics/interval/start/tick/on_message)."""
+
+    def __init__(self, tanks, interval=SAMPLE_INTERVAL, batch=BATCH_SIZE, seed=None, prefix="t"):
+        self.n = tanks
+        self.interval = interval
+        self.scale = interval / SAMPLE_INTERVAL
+        self.batch_size = batch
+        self.rng = np.random.default_rng(seed)
+        self.topics = [tank_topic("+", "pump/status"), tank_topic("+", "lamp/status")]
+
+        ids = [f"{prefix}{i}" for i in range(tanks)]
+        self.temp_topics = [tank_topic(t, "temp") for t in ids]
+        self.level_topics = [tank_topic(t, "water_level") for t in ids]
+        self.pump_cmd_topics = [tank_topic(t, "pump") for t in ids]
+        self.temp_batch_topics = [t + codec.BATCH_SUFFIX for t in self.temp_topics]
+        self.level_batch_topics = [t + codec.BATCH_SUFFIX for t in self.level_topics]
+        self.index = {t: i for i, t in enumerate(ids)}
+
+        # Same starting point as the single sensors, spread a little so tanks don't move in lockstep
+        self.temp = 22.0 + self.rng.uniform(-1, 1, tanks)
+        self.level = np.round(50 + self.rng.uniform(-10, 10, tanks))
+        self.lamp_on = np.zeros(tanks, bool)
+        self.pump_on = np.zeros(tanks, bool)
+        self.stop_sent = np.zeros(tanks, bool)
+
+        self.ts = []          # timestamps of the buffered ticks
+        self.temps = np.empty((max(batch, 1), tanks))
+        self.levels = np.empty((max(batch, 1), tanks))
+        self.ticks = 0
+        self.sent = 0
+        self.step_s = 0.0
+        self.publish_s = 0.0
+        self.last = None      # last publish of a tick (for flow control)
+
+    def start(self, client):
+        pass
+
+    def on_message(self, client, userdata, msg):
+        parts = split_topic(msg.topic, ("pump/status", "lamp/status"))
+        i = self.index.get(parts[0]) if parts else None
+        if i is None:
+            return
+        try:
+            on = codec.decode(msg.payload).get("state", "OFF") == "ON"
+        except Exception as e:
+            print("Error parsing status:", e)
+            return
+        if parts[1] == "pump/status":
+            self.pump_on[i] = on
+            if not on:
+                self.stop_sent[i] = False
+        else:
+            self.lamp_on[i] = on
+
+    def step(self):
+        """Advance every tank one tick; returns indices of tanks that just filled up with the pump on."""
+        n, scale, rng = self.n, self.scale, self.rng
+        # Lamp ON heats, OFF cools, plus small noise; clamp to a realistic range
+        heat = np.where(self.lamp_on, rng.uniform(0.2, 0.4, n), -rng.uniform(0.05, 0.15, n))
+        self.temp += (heat + rng.uniform(-0.05, 0.05, n)) * scale
+        np.clip(self.temp, 5, 40, out=self.temp)
+
+        # Pump ON fills +2, OFF drains -1
+        self.level += np.where(self.pump_on, 2.0, -1.0) * scale
+        np.clip(self.level, 0, 100, out=self.level)
+        full = np.flatnonzero((self.level >= 100) & self.pump_on & ~self.stop_sent)
+        self.stop_sent[full] = True  # ask once until the pump reports OFF
+        return full
+
+    def readings(self):
+        temps = np.round(self.temp, 2)
+        levels = self.level if self.scale == 1 else np.round(self.level, 2)
+        return temps, levels
+
+    def tick(self, client, now_ms=None):
+        t0 = time.perf_counter()
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        full = self.step()
+        temps, levels = self.readings()
+        t1 = time.perf_counter()
+
+        for i in full.tolist():
+            client.publish(self.pump_cmd_topics[i], "OFF")  # auto stop at full, like the level sensor
+
+        if not self.batch_size:
+            whole = self.scale == 1
+            for topic, t in zip(self.temp_topics, temps.tolist()):
+                client.publish(topic, codec.encode_temp(t))
+            for topic, lvl in zip(self.level_topics, levels.tolist()):
+                self.last = client.publish(topic, codec.encode_level(int(lvl) if whole else lvl))
+            self.sent += 2 * self.n
+        else:
+            k = len(self.ts)
+            self.temps[k] = temps
+            self.levels[k] = levels
+            self.ts.append(now_ms)
+            if k + 1 >= self.batch_size:
+                self.flush(client)
+        self.ticks += 1
+        self.step_s += t1 - t0
+        self.publish_s += time.perf_counter() - t1
+
+    def flush(self, client):
+        k = len(self.ts)
+        if not k:
+            return
+        ts = self.ts
+        whole = self.scale == 1
+        # One transpose, then each tank's column is a plain list
+        for topic, col in zip(self.temp_batch_topics, self.temps[:k].T.tolist()):
+            client.publish(topic, codec.encode_batch("temp", list(zip(ts, col))))
+        for topic, col in zip(self.level_batch_topics, self.levels[:k].T.tolist()):
+            samples = list(zip(ts, map(int, col) if whole else col))
+            self.last = client.publish(topic, codec.encode_batch("level", samples))
+        self.sent += 2 * self.n * k
+        self.ts = []
+
+    def stop(self):
+        pass
+
+    def stats(self):
+        ticks = max(self.ticks, 1)
+        return (f"{self.ticks} ticks, {self.sent} readings, step {self.step_s / ticks * 1000:.2f} ms/tick, "
+                f"publish {self.publish_s / ticks * 1000:.1f} ms/tick, "
+                f"pumps on {int(self.pump_on.sum())}, lamps on {int(self.lamp_on.sum())}")
+
+def run(sim, client, speed=1.0, virtual=False, duration=None):
+    """Tick until `duration` simulated seconds have passed.
+
+    speed: simulated seconds per wall second (0 = as fast as the broker takes it).
+    virtual: timestamps follow the simulated clock, starting now, instead of wall time.
+    """
+    start = time.time()
+    clock_ms = int(start * 1000)
+    wall_next = time.monotonic()
+    report = time.monotonic() + STATS_INTERVAL
+    ticks = 0
+    while duration is None or ticks * sim.interval < duration:
+        sim.tick(client, clock_ms if virtual else None)
+        ticks += 1
+        clock_ms += int(sim.interval * 1000)
+        if sim.last is not None:
+            # Don't run ahead of the network thread: the tick's last message must be out
+            sim.last.wait_for_publish(timeout=60)
+        if speed:
+            wall_next += sim.interval / speed
+            time.sleep(max(0, wall_next - time.monotonic()))
+        if time.monotonic() >= report:
+            report += STATS_INTERVAL
+            elapsed = time.time() - start
+            print(f"🐠 {sim.n} tanks | {ticks * sim.interval / elapsed:.0f}x real time | "
+                  f"{sim.sent / elapsed:.0f} readings/s | {sim.stats()}")
+    sim.flush(client)
+    if sim.last is not None:
+        sim.last.wait_for_publish(timeout=60)
+    elapsed = time.time() - start
+    print(f"✅ {ticks * sim.interval:.0f} simulated s in {elapsed:.1f} s "
+          f"({sim.sent / elapsed:.0f} readings/s) | {sim.stats()}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Vectorized simulator for a fleet of aquarium tanks")
+    ap.add_argument("--tanks", type=int, default=10000)
+    ap.add_argument("--interval", type=float, default=SAMPLE_INTERVAL, help="simulated seconds per tick")
+    ap.add_argument("--batch", type=int, default=BATCH_SIZE, help="ticks per batch message (0 = no batching)")
+    ap.add_argument("--speed", type=float, default=1.0,
+                    help="simulated seconds per wall second (0 = as fast as possible)")
+    ap.add_argument("--virtual", action="store_true",
+                    help="timestamp readings with the simulated clock (use with --speed)")
+    ap.add_argument("--duration", type=float, help="simulated seconds to run")
+    ap.add_argument("--seed", type=int)
+    args = ap.parse_args()
+
+    sim = FleetSim(args.tanks, args.interval, args.batch, args.seed)
+    client = make_client()
+    client.on_message = sim.on_message
+    client.on_connect = lambda c, userdata, flags, rc: [c.subscribe(t) for t in sim.topics]
+    client.connect(BROKER, PORT, 60)
+    client.loop_start()
+    try:
+        run(sim, client, args.speed, args.virtual, args.duration)
+    except KeyboardInterrupt:
+        print(f"\nStopped | {sim.stats()}")
+    finally:
+        client.disconnect()
+        client.loop_stop()
+
+if __name__ == "__main__":
+    main()
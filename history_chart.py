@@ -0,0 +1,81 @@
+import time
+from PyQt5.QtWidgets import QWidget
+from PyQt5.QtGui import QPainter, QPen, QColor
+from PyQt5.QtCore import QTimer
+
+class HistoryChart(QWidget):
+    """Scrolling chart over the last `window` seconds of one or more ring_buffer.History series.
+
+    Each pixel column is drawn from the min/max of the samples that fall in it,
+    so the number of draw calls depends on the widget width, not on how much
+    data is buffered.
+    """
+
+    def __init__(self, title, y_min, y_max, window=3600, step=False, height=110, refresh_ms=500):
+        super().__init__()
+        self.title = title
+        self.y_min = y_min
+        self.y_max = y_max
+        self.window = window
+        self.step = step        # hold the last value between samples (ON/OFF states)
+        self.series = []        # (label, History, QColor)
+        self.setMinimumHeight(height)
+
+        # Repaint only when new data arrived or time scrolled by a column
+        self.drawn = None
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(refresh_ms)
+
+    def add_series(self, label, buffer, color):
+        self.series.append((label, buffer, QColor(color)))
+
+    def refresh(self):
+        plot_w = max(1, self.width() - 40)
+        key = (tuple(buf.version for _, buf, _ in self.series), int(time.time() * plot_w / self.window))
+        if key != self.drawn:
+            self.drawn = key
+            self.update()
+
+    def paintEvent(self, event):
+        p = QPainter(self)
+        w, h = self.width(), self.height()
+        left, top, bottom = 36, 16, 4
+        plot_w, plot_h = max(1, w - left - 4), max(1, h - top - bottom)
+        p.fillRect(self.rect(), QColor("white"))
+
+        # Frame, title and y range
+        p.setPen(QColor("lightgray"))
+        p.drawRect(left, top, plot_w, plot_h)
+        p.setPen(QColor("black"))
+        p.drawText(left, 12, self.title)
+        p.drawText(2, top + 10, f"{self.y_max:g}")
+        p.drawText(2, top + plot_h, f"{self.y_min:g}")
+
+        span = (self.y_max - self.y_min) or 1
+        y_of = lambda v: top + plot_h - (min(max(v, self.y_min), self.y_max) - self.y_min) / span * plot_h
+        t1 = time.time()
+        t0 = t1 - self.window
+
+        for i, (label, buf, color) in enumerate(self.series):
+            p.setPen(color)
+            p.drawText(left + plot_w - 70 * (i + 1), 12, label)
+            lo, hi, before = buf.decimate(t0, t1, plot_w)
+            pen = QPen(color)
+            pen.setWidth(1)
+            p.setPen(pen)
+            prev = before if self.step else None
+            for x in range(plot_w):
+                if lo[x] is None:
+                    if self.step and prev is not None:
+                        lo[x] = hi[x] = prev
+                    else:
+                        prev = None
+                        continue
+                px = left + x
+                y_lo, y_hi = y_of(lo[x]), y_of(hi[x])
+                if prev is not None:
+                    p.drawLine(px - 1, int(y_of(prev)), px, int(y_lo if self.step else y_hi))
+                p.drawLine(px, int(y_lo), px, int(y_hi))
+                prev = hi[x]
+        p.end()
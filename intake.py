@@ -0,0 +1,149 @@
+import threading, time, traceback
+from collections import deque
+
+# Separates the manager's MQTT intake from message processing. The paho callback only
+# enqueues; a pool of worker threads runs the handlers. Messages are sharded by a key
+# (the tank id), so each tank's messages are handled in arrival order by one worker,
+# and a slow step (a stalled disk, a burst for one tank) doesn't hold up the network
+# thread and its keepalive.
+# Each shard's queue is bounded; when it is full the policy decides:
+#   block        wait for room: backpressure reaches the broker through TCP. The wait is
+#                capped at BLOCK_TIMEOUT, well inside the MQTT keepalive; if the worker
+#                hasn't made room by then it is stalled, and until it takes its next
+#                messages a full shard drops its oldest one instead of waiting again
+#   drop_oldest  discard the shard's oldest queued message
+#   sample       from SAMPLE_HIGH of capacity on, queue only every SAMPLE_EVERY-th
+#                sensor reading; everything else (status, commands, alarms) still
+#                gets in, waiting for room if the shard is full
+POLICIES = ("block", "drop_oldest", "sample")
+WORKERS = 2
+QUEUE_SIZE = 10000   # messages waiting, over all shards
+SAMPLE_HIGH = 0.75
+SAMPLE_EVERY = 4
+CHUNK = 64           # messages a worker takes per lock round trip
+BLOCK_TIMEOUT = 5.0  # seconds the network thread may wait for room (keepalive is 60 s)
+
+class Shard:
+    __slots__ = ("items", "cond", "thread", "processed", "dropped", "sampled", "blocked", "blocked_s",
+                 "seen", "stalled")
+
+    def __init__(self):
+        self.items = deque()
+        self.cond = threading.Condition()
+        self.thread = None
+        self.processed = 0
+        self.dropped = 0      # drop_oldest discards, and block's after a timeout
+        self.sampled = 0      # readings left out by sample
+        self.blocked = 0      # times the producer had to wait for room
+        self.blocked_s = 0.0
+        self.seen = 0         # readings offered while sampling
+        self.stalled = False  # a block wait timed out; cleared when the worker takes messages
+
+class Intake:
+    """Bounded, sharded queue in front of `handle(client, userdata, msg)`.
+
+    key(topic) -> shard key, or None to run the handler inline (e.g. ignored topics).
+    sampled(topic) -> True for readings the "sample" policy may leave out.
+    """
+
+    def __init__(self, handle, key, workers=WORKERS, queue_size=QUEUE_SIZE, policy="block",
+                 sampled=None, metrics=None):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown backpressure policy {policy!r} (one of {', '.join(POLICIES)})")
+        self.handle = handle
+        self.key = key
+        self.policy = policy
+        self.sampled = sampled or (lambda topic: False)
+        self.capacity = max(1, queue_size // workers)
+        self.high = int(self.capacity * SAMPLE_HIGH)
+        self.shards = [Shard() for _ in range(workers)]
+        self.routes = {}  # topic -> Shard, or None for inline
+        self.received = 0
+        self.max_depth = 0
+        self._stopping = False
+        # Time from enqueue to handling, next to the handler latencies
+        self.wait = metrics.histogram("queue_wait", "intake") if metrics else None
+        self.metrics = metrics
+        for i, shard in enumerate(self.shards):
+            shard.thread = threading.Thread(target=self._run, args=(shard,), name=f"intake-{i}", daemon=True)
+            shard.thread.start()
+
+    def route(self, topic):
+        key = self.key(topic)
+        shard = None if key is None else self.shards[hash(key) % len(self.shards)]
+        self.routes[topic] = shard
+        return shard
+
+    # --- Producer side: the paho callback ---
+    def on_message(self, client, userdata, msg):
+        shard = self.routes.get(msg.topic, False)
+        if shard is False:
+            shard = self.route(msg.topic)
+        self.received += 1
+        if shard is None:
+            self.handle(client, userdata, msg)
+            return
+        item = (time.perf_counter(), client, userdata, msg)
+        with shard.cond:
+            items = shard.items
+            n = len(items)
+            if self.policy == "sample" and n >= self.high and self.sampled(msg.topic):
+                shard.seen += 1
+                if n >= self.capacity or shard.seen % SAMPLE_EVERY:
+                    shard.sampled += 1
+                    return
+            if n >= self.capacity and self.policy != "drop_oldest" and not shard.stalled:
+                shard.blocked += 1
+                t0 = time.perf_counter()
+                shard.cond.wait_for(lambda: len(items) < self.capacity or self._stopping, BLOCK_TIMEOUT)
+                shard.blocked_s += time.perf_counter() - t0
+                shard.stalled = len(items) >= self.capacity
+            if len(items) >= self.capacity and not self._stopping:
+                items.popleft()
+                shard.dropped += 1
+            items.append(item)
+            if len(items) > self.max_depth:
+                self.max_depth = len(items)
+            shard.cond.notify_all()
+
+    # --- Workers ---
+    def _run(self, shard):
+        items, cond, wait = shard.items, shard.cond, self.wait
+        while True:
+            with cond:
+                while not items and not self._stopping:
+                    cond.wait()
+                if not items:
+                    return
+                chunk = [items.popleft() for _ in range(min(len(items), CHUNK))]
+                shard.stalled = False
+                cond.notify_all()  # room for a blocked producer
+            for t, client, userdata, msg in chunk:
+                if wait is not None and self.metrics.enabled:
+                    wait.observe(time.perf_counter() - t)
+                try:
+                    self.handle(client, userdata, msg)
+                except Exception:
+                    traceback.print_exc()  # one bad message must not stop the worker
+            shard.processed += len(chunk)
+
+    def depth(self):
+        return sum(len(s.items) for s in self.shards)
+
+    def stats(self):
+        shards = self.shards
+        return {"workers": len(shards), "policy": self.policy, "depth": self.depth(),
+                "max_depth": self.max_depth, "received": self.received,
+                "processed": sum(s.processed for s in shards),
+                "dropped": sum(s.dropped for s in shards), "sampled": sum(s.sampled for s in shards),
+                "blocked": sum(s.blocked for s in shards),
+                "blocked_s": round(sum(s.blocked_s for s in shards), 3)}
+
+    def stop(self, timeout=10):
+        """Handle what is queued, then stop the workers."""
+        self._stopping = True
+        for shard in self.shards:
+            with shard.cond:
+                shard.cond.notify_all()
+        for shard in self.shards:
+            shard.thread.join(timeout)
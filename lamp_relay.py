@@ -1,77 +1,143 @@
-import time, json
-import paho.mqtt.client as mqtt
-
-BROKER = "broker.hivemq.com"
-PORT = 1883
-CMD_TOPIC = "aquarium/lamp"          # Commands: ON / OFF / AUTO
-STATUS_TOPIC = "aquarium/lamp/status"
-TEMP_TOPIC = "aquarium/temp"
-
-lamp_on = False
-auto_mode = True
-current_temp = 22
-
-# Safety thresholds
-DANGEROUSLY_LOW_TEMP = 10
-DANGEROUSLY_HIGH_TEMP = 35
-
-def publish_status(client):
-    status_msg = json.dumps({
-        "mode": "AUTO" if auto_mode else "MANUAL",
-        "state": "ON" if lamp_on else "OFF"
-    })
-    client.publish(STATUS_TOPIC, status_msg, retain=True)
-    print("Lamp status published:", status_msg)
-
-def on_message(client, userdata, msg):
-    global lamp_on, auto_mode, current_temp
-    if msg.topic == CMD_TOPIC:
-        cmd = msg.payload.decode().strip().upper()
-        if cmd == "ON":
-            lamp_on = True
-            auto_mode = False
-            print("Lamp forced ON (manual)")
-        elif cmd == "OFF":
-            lamp_on = False
-            auto_mode = False
-            print("Lamp forced OFF (manual)")
-        elif cmd == "AUTO":
-            auto_mode = True
-            print("Lamp back to AUTO mode")
-        publish_status(client)
-
-    elif msg.topic == TEMP_TOPIC:
-        try:
-            current_temp = json.loads(msg.payload.decode())["temp"]
-        except:
-            pass
+import time, json, sys
+import codec
+from latency import LatencyStats
+from metrics import Metrics
+from profiler import Profiler
+from mqtt_config import BROKER, PORT, make_client
+from rules import RuleSet, RuleWatcher, rules_path
+from tanks import tank_topic
 
-def main():
-    global lamp_on, auto_mode, current_temp
-    client = mqtt.Client()
-    client.on_message = on_message
-    client.connect(BROKER, PORT, 60)
-    client.subscribe(CMD_TOPIC)
-    client.subscribe(TEMP_TOPIC)
+# Safety logic runs as soon as a reading arrives; the timer only re-publishes
+# the (retained) status and the actuation latency summary as a heartbeat
+HEARTBEAT_INTERVAL = 10
 
-    print("Lamp relay running")
-    publish_status(client)  # ✅ Send initial state on startup
+class LampRelay:
+    """Lamp relay for one tank ("" = the default aquarium/... topics)."""
 
-    while True:
-        client.loop(timeout=0.1)
+    def __init__(self, tank_id="", verbose=True, rules=None, metrics=None):
+        self.tank_id = tank_id
+        self.cmd_topic = tank_topic(tank_id, "lamp")          # Commands: ON / OFF / AUTO
+        self.status_topic = tank_topic(tank_id, "lamp/status")
+        self.temp_topic = tank_topic(tank_id, "temp")
+        self.latency_topic = tank_topic(tank_id, "lamp/latency")
+        self.topics = [self.cmd_topic, self.temp_topic, self.temp_topic + codec.BATCH_SUFFIX]
+        self.interval = HEARTBEAT_INTERVAL
+        self.verbose = verbose
+
+        self.lamp_on = False
+        self.auto_mode = True
+        self.current_temp = 22
+
+        # Reading received -> status published, for readings that changed the lamp
+        self.actuation = LatencyStats()
+
+        # Handler latency (and so message count) per topic suffix; shared when hosted, see device_host.py
+        self.metrics = metrics or Metrics("lamp" + (f"-{tank_id}" if tank_id else ""))
+        suffixes = {self.cmd_topic: "lamp", self.temp_topic: "temp",
+                    self.temp_topic + codec.BATCH_SUFFIX: "temp/batch"}
+        self.handler_latency = {t: self.metrics.histogram("handler", s) for t, s in suffixes.items()}
+
+        # Temperature rules (action "lamp_safety"), see rules.py
+        self.set_rules(rules or RuleSet())
+
+    def set_rules(self, rules):
+        self.rules = [r for r in rules.table(self.tank_id).get("temp", ()) if r.action == "lamp_safety"]
+
+    def log(self, *args):
+        if self.verbose:
+            print(*args)
+
+    def publish_status(self, client):
+        status_msg = codec.encode_status(
+            "AUTO" if self.auto_mode else "MANUAL",
+            "ON" if self.lamp_on else "OFF"
+        )
+        client.publish(self.status_topic, status_msg, retain=True)
+        self.log("Lamp status published:", codec.to_text(status_msg))
 
+    def start(self, client):
+        self.log("Lamp relay running")
+        self.publish_status(client)  # ✅ Send initial state on startup
+
+    def on_message(self, client, userdata, msg):
+        received = time.perf_counter()
+        self.handle(client, msg, received)
+        h = self.handler_latency.get(msg.topic)
+        if h is not None and self.metrics.enabled:
+            h.observe(time.perf_counter() - received)
+
+    def handle(self, client, msg, received):
+        if msg.topic == self.cmd_topic:
+            cmd = msg.payload.decode().strip().upper()
+            if cmd == "ON":
+                self.lamp_on = True
+                self.auto_mode = False
+                self.log("Lamp forced ON (manual)")
+            elif cmd == "OFF":
+                self.lamp_on = False
+                self.auto_mode = False
+                self.log("Lamp forced OFF (manual)")
+            elif cmd == "AUTO":
+                self.auto_mode = True
+                self.log("Lamp back to AUTO mode")
+            self.publish_status(client)
+
+        elif msg.topic == self.temp_topic:
+            try:
+                self.current_temp = codec.decode(msg.payload)["temp"]
+            except:
+                return
+            self.evaluate(client, received)
+
+        elif msg.topic == self.temp_topic + codec.BATCH_SUFFIX:
+            try:
+                self.current_temp = codec.decode(msg.payload)["temp"][-1][1]  # newest sample
+            except:
+                return
+            self.evaluate(client, received)
+
+    def evaluate(self, client, received):
         # Safety override
-        if not auto_mode and (current_temp < DANGEROUSLY_LOW_TEMP or current_temp > DANGEROUSLY_HIGH_TEMP):
-            auto_mode = True
-            print("⚠️ Safety override → Lamp back to AUTO (dangerous temp)")
-            publish_status(client)
+        if self.auto_mode:
+            return
+        for rule in self.rules:
+            if rule.test(self.current_temp):
+                break
+        else:
+            return
+        self.log(f"⚠️ Safety override → Lamp back to AUTO ({rule.name}: {self.current_temp}°C)")
+        self.auto_mode = True
+        self.publish_status(client)
+        latency = time.perf_counter() - received
+        self.actuation.record(latency)
+        self.metrics.observe("actuation", "lamp", latency)
 
-        if not auto_mode and (current_temp < 15 or current_temp > 30):
-         auto_mode = True
-         print("⚠️ Safety override → Lamp back to AUTO (out of safe range)")
-         publish_status(client)
+    def tick(self, client):
+        # Heartbeat
+        self.publish_status(client)
+        if self.actuation.count:
+            summary = self.actuation.summary()
+            client.publish(self.latency_topic, json.dumps(summary))
+            self.log("Lamp actuation latency:", summary)
+        self.metrics.report(client)
 
-        time.sleep(3)
+def main():
+    rules_file = rules_path(sys.argv[1] if len(sys.argv) > 1 else None)
+    relay = LampRelay(rules=RuleSet.load(rules_file))
+    RuleWatcher(rules_file, relay.set_rules)
+    client = make_client()
+    client.on_message = relay.on_message
+    client.connect(BROKER, PORT, 60)
+    for topic in relay.topics:
+        client.subscribe(topic)
+    Profiler(relay.metrics.component).attach(client)  # $profile/<component> starts a profiling session
+
+    relay.start(client)
+    client.loop_start()  # readings and commands are handled as they arrive
+
+    while True:
+        time.sleep(relay.interval)
+        relay.tick(client)
 
 if __name__ == "__main__":
     main()
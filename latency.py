@@ -0,0 +1,26 @@
+from collections import deque
+
+class LatencyStats:
+    """Running latency summary; percentiles come from the most recent `window` samples."""
+
+    def __init__(self, window=1000):
+        self.recent = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.recent.append(seconds)
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def summary(self):
+        if not self.count:
+            return {"n": 0}
+        s = sorted(self.recent)
+        pick = lambda p: round(s[min(len(s) - 1, int(p * len(s)))] * 1000, 3)
+        return {"n": self.count, "last_ms": round(self.recent[-1] * 1000, 3),
+                "mean_ms": round(self.total / self.count * 1000, 3),
+                "p50_ms": pick(0.5), "p99_ms": pick(0.99), "max_ms": round(self.max * 1000, 3)}
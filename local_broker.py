@@ -0,0 +1,141 @@
+import asyncio, sys
+
+# Minimal MQTT 3.1.1 broker used as a local stand-in for broker.hivemq.com in
+# tests and benchmarks. Supports what this project uses: CONNECT, SUBSCRIBE with
+# + / # wildcards, PUBLISH (QoS 0, QoS 1 is acked and delivered at QoS 0),
+# retained messages and keepalive pings. No auth, no persistence.
+HOST = "127.0.0.1"
+PORT = 1884
+
+CONNECT, CONNACK, PUBLISH, PUBACK = 1, 2, 3, 4
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK = 8, 9, 10, 11
+PINGREQ, PINGRESP, DISCONNECT = 12, 13, 14
+
+def encode_length(n):
+    out = bytearray()
+    while True:
+        byte, n = n % 128, n // 128
+        out.append(byte | 0x80 if n else byte)
+        if not n:
+            return bytes(out)
+
+def publish_packet(topic, payload, retain=False):
+    t = topic.encode()
+    body = len(t).to_bytes(2, "big") + t + payload
+    return bytes([0x30 | (1 if retain else 0)]) + encode_length(len(body)) + body
+
+def topic_matches(pattern, topic):
+    if topic[:1] == "$" and pattern[:1] in ("+", "#"):
+        return False  # $metrics etc. are never matched by a leading wildcard (MQTT 4.7.2)
+    p, t = pattern.split("/"), topic.split("/")
+    for i, part in enumerate(p):
+        if part == "#":
+            return True
+        if i >= len(t) or (part != "+" and part != t[i]):
+            return False
+    return len(p) == len(t)
+
+async def read_length(reader):
+    n, mult = 0, 1
+    while True:
+        byte = (await reader.readexactly(1))[0]
+        n += (byte & 0x7F) * mult
+        if not byte & 0x80:
+            return n
+        mult *= 128
+
+class Session:
+    def __init__(self, writer):
+        self.writer = writer
+        self.filters = set()
+        self.cache = {}   # topic -> matches any filter
+
+    def wants(self, topic):
+        hit = self.cache.get(topic)
+        if hit is None:
+            hit = self.cache[topic] = any(topic_matches(f, topic) for f in self.filters)
+        return hit
+
+class Broker:
+    def __init__(self):
+        self.sessions = set()
+        self.retained = {}
+        self.delivered = 0
+
+    def route(self, topic, payload, retain):
+        if retain:
+            if payload:
+                self.retained[topic] = payload
+            else:
+                self.retained.pop(topic, None)
+        packet = publish_packet(topic, payload)
+        for s in self.sessions:
+            if s.wants(topic):
+                s.writer.write(packet)
+                self.delivered += 1
+
+    async def handle(self, reader, writer):
+        session = Session(writer)
+        self.sessions.add(session)
+        try:
+            while True:
+                header = (await reader.readexactly(1))[0]
+                length = await read_length(reader)
+                body = await reader.readexactly(length) if length else b""
+                ptype, flags = header >> 4, header & 0x0F
+
+                if ptype == PUBLISH:
+                    tlen = int.from_bytes(body[:2], "big")
+                    topic = body[2:2 + tlen].decode()
+                    pos = 2 + tlen
+                    if (flags >> 1) & 3:
+                        writer.write(bytes([PUBACK << 4, 2]) + body[pos:pos + 2])
+                        pos += 2
+                    self.route(topic, body[pos:], bool(flags & 1))
+                elif ptype == SUBSCRIBE:
+                    pid, pos, granted = body[:2], 2, bytearray()
+                    new = []
+                    while pos < len(body):
+                        flen = int.from_bytes(body[pos:pos + 2], "big")
+                        new.append(body[pos + 2:pos + 2 + flen].decode())
+                        pos += 3 + flen
+                        granted.append(0)
+                    session.filters.update(new)
+                    session.cache.clear()
+                    writer.write(bytes([SUBACK << 4]) + encode_length(2 + len(granted)) + pid + granted)
+                    for topic, payload in self.retained.items():
+                        if any(topic_matches(f, topic) for f in new):
+                            writer.write(publish_packet(topic, payload, retain=True))
+                elif ptype == UNSUBSCRIBE:
+                    pos = 2
+                    while pos < len(body):
+                        flen = int.from_bytes(body[pos:pos + 2], "big")
+                        session.filters.discard(body[pos + 2:pos + 2 + flen].decode())
+                        pos += 2 + flen
+                    session.cache.clear()
+                    writer.write(bytes([UNSUBACK << 4, 2]) + body[:2])
+                elif ptype == CONNECT:
+                    writer.write(bytes([CONNACK << 4, 2, 0, 0]))
+                elif ptype == PINGREQ:
+                    writer.write(bytes([PINGRESP << 4, 0]))
+                elif ptype == DISCONNECT:
+                    break
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.sessions.discard(session)
+            writer.close()
+
+async def serve(host=HOST, port=PORT):
+    broker = Broker()
+    server = await asyncio.start_server(broker.handle, host, port)
+    print(f"🧪 Local broker listening on {host}:{port}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(serve(port=int(sys.argv[1]) if len(sys.argv) > 1 else PORT))
+    except KeyboardInterrupt:
+        pass
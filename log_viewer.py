@@ -1,34 +1,539 @@
 import sqlite3
 import json
+import sys, os, re, csv, time, argparse, heapq, itertools
+import db_schema, archive, migrate_db
+from alarms import ALARMS, GENERIC
+from local_broker import topic_matches
+from tanks import split_topic
 
-DB_FILE = "iot.db"
+DB_FILE = db_schema.DB_FILE
+PAGE_SIZE = 5000  # rows fetched per keyset page / written per output chunk
+
+# Analytics reports (report subcommand)
+REPORT_SUFFIXES = ("pump/status", "lamp/status", "temp", "alarm")
+TEMP_RANGE = (15.0, 30.0)     # °C counted as "in range"
+MAX_GAP = 15 * 60 * 1000      # ms a status/reading holds without a newer row (device offline after that)
+REPORT_CACHE = ".reports.json"  # appended to the database path: results for closed days
+REPORT_VERSION = 2            # bump when the stats change; older cached days are recomputed
+
+MIGRATE_HINT = "run migrate_db.py to move it to the new schema"
+
+def _has_table(conn, name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,)).fetchone() is not None
+
+def _unmigrated(conn):
+    # Legacy `logs` rows past migrate_db.py's recorded progress
+    if not _has_table(conn, "logs"):
+        return False
+    last = conn.execute("SELECT max(rowid) FROM logs").fetchone()[0] or 0
+    done = 0
+    if _has_table(conn, "meta"):
+        row = conn.execute("SELECT value FROM meta WHERE key=?", (migrate_db.PROGRESS_KEY,)).fetchone()
+        done = int(row[0]) if row else 0
+    return last > done
+
+def _legacy_rows(conn, filter_topic, limit):
+    # The TEXT `logs` table of a database migrate_db.py hasn't converted yet
+    sql = "SELECT timestamp, sensor, value FROM logs"
+    args = ()
+    if filter_topic:
+        sql += " WHERE sensor=?"
+        args = (filter_topic,)
+    rows = []
+    for ts, topic, raw in conn.execute(sql + " ORDER BY timestamp DESC LIMIT ?", args + (limit,)):
+        try:
+            ts = db_schema.parse_ts(ts)
+        except (TypeError, ValueError):
+            continue
+        value, payload = db_schema.split_value(raw)
+        rows.append((ts, topic, value, payload))
+    return rows
+
+def _check_schema(conn, db):
+    # export/report read only the samples schema
+    if not _has_table(conn, "topics"):
+        sys.exit(f"No samples in {db}" + (f"; {MIGRATE_HINT}" if _unmigrated(conn) else ""))
+    if _unmigrated(conn):
+        print(f"⚠️ {db} has legacy logs rows that are left out; {MIGRATE_HINT}", file=sys.stderr)
 
 def show_logs(filter_topic=None, limit=20):
-    conn = sqlite3.connect(DB_FILE)
+    try:
+        conn = sqlite3.connect(f"file:{DB_FILE}?mode=ro", uri=True)  # a viewer never writes
+        conn.execute("SELECT 1 FROM sqlite_master").fetchone()
+    except sqlite3.Error as e:
+        print(f"Cannot open {DB_FILE}: {e}")
+        return
     cur = conn.cursor()
+    if not _has_table(conn, "topics") or not db_schema.partitions(conn):
+        rows = _legacy_rows(conn, filter_topic, limit) if _has_table(conn, "logs") else []
+        conn.close()
+        if rows:
+            print(f"⚠️ {DB_FILE} only has the legacy logs table; {MIGRATE_HINT}")
+        _print_rows(rows)
+        return
+    tid = db_schema.TopicIds(conn).lookup(filter_topic) if filter_topic else None
 
-    if filter_topic:
-        cur.execute("SELECT timestamp, sensor, value FROM logs WHERE sensor=? ORDER BY timestamp DESC LIMIT ?", 
-                    (filter_topic, limit))
-    else:
-        cur.execute("SELECT timestamp, sensor, value FROM logs ORDER BY timestamp DESC LIMIT ?", 
-                    (limit,))
-    
-    rows = cur.fetchall()
+    # Newest partition first until `limit` rows are found; each query walks an
+    # index backwards: (topic_id, ts) or (ts)
+    rows = []
+    for _, table in reversed(db_schema.partitions(conn)):
+        if filter_topic:
+            cur.execute(f"""SELECT s.ts, t.name, s.value, s.payload FROM {table} s
+                            JOIN topics t ON t.id = s.topic_id
+                            WHERE s.topic_id=? ORDER BY s.ts DESC LIMIT ?""",
+                        (tid, limit - len(rows)))
+        else:
+            cur.execute(f"""SELECT s.ts, t.name, s.value, s.payload FROM {table} s
+                            JOIN topics t ON t.id = s.topic_id
+                            ORDER BY s.ts DESC LIMIT ?""",
+                        (limit - len(rows),))
+        rows += cur.fetchall()
+        if len(rows) >= limit:
+            break
+    rows.sort(key=lambda r: r[0], reverse=True)  # the legacy table may overlap the first partition
+    if _unmigrated(conn):
+        print(f"⚠️ {DB_FILE} has legacy logs rows that aren't migrated yet; {MIGRATE_HINT}")
     conn.close()
+    _print_rows(rows)
 
+def _print_rows(rows):
     if not rows:
         print("No logs found.")
         return
 
-    for ts, topic, val in rows:
+    for ts, topic, value, payload in rows:
+        ts = db_schema.format_ts(ts)
+        if payload is None:
+            print(f"[{ts}] {topic} → {db_schema.join_value(value, None)}")
+            continue
         try:
-            val_json = json.loads(val)
+            val_json = json.loads(payload)
             print(f"[{ts}] {topic} → {json.dumps(val_json, indent=2)}")
         except:
-            print(f"[{ts}] {topic} → {val}")
+            print(f"[{ts}] {topic} → {payload}")
 
-if __name__ == "__main__":
+# --- Streaming query / export ---
+
+def resolve_topics(conn, patterns):
+    """Topic ids for exact names or MQTT wildcard patterns (+, #)."""
+    names = dict(conn.execute("SELECT id, name FROM topics"))
+    return sorted(tid for tid, name in names.items()
+                  if any(topic_matches(p, name) for p in patterns))
+
+def parse_time(text):
+    """Epoch ms from 'YYYY-MM-DD[ HH:MM[:SS]]', epoch ms, or a relative age like 30m, 6h, 7d."""
+    if text is None:
+        return None
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    if text[-1] in units and text[:-1].replace(".", "", 1).isdigit():
+        return db_schema.now_ms() - int(float(text[:-1]) * units[text[-1]] * 1000)
+    if text.isdigit():
+        return int(text)
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d"):
+        try:
+            return int(time.mktime(time.strptime(text, fmt)) * 1000)
+        except ValueError:
+            pass
+    raise ValueError(f"Unrecognised time: {text}")
+
+def _pages(conn, table, topic_id, since, until, page):
+    # Keyset pagination on (ts, rowid): every page is an index range scan that
+    # starts where the previous one stopped, so cost per page stays flat.
+    where = "ts >= ? AND ts < ? AND (ts > ? OR rowid > ?)"
+    if topic_id is not None:
+        where = "topic_id = ? AND " + where
+    sql = f"""SELECT ts, rowid, topic_id, value, payload FROM {table}
+              WHERE {where} ORDER BY ts, rowid LIMIT {int(page)}"""
+    last_ts, last_rowid = since, -1
+    while True:
+        args = (last_ts, until, last_ts, last_rowid)
+        rows = conn.execute(sql, args if topic_id is None else (topic_id,) + args).fetchall()
+        if not rows:
+            return
+        yield rows
+        last_ts, last_rowid = rows[-1][:2]
+
+def _table_pages(conn, tables, topic_id, since, until, page):
+    # Day partitions don't overlap, so their pages simply follow each other
+    for table in tables:
+        yield from _pages(conn, table, topic_id, since, until, page)
+
+def _archive_rows(archive_dir, topics, since, until, ids):
+    """(ts, 0, topic_id, value, payload) rows from archive files, in timestamp order.
+
+    `ids` maps topic name -> id and gets negative ids for topics no longer in the DB.
+    """
+    for day, group in itertools.groupby(archive.files(archive_dir, since, until), key=lambda f: f[0]):
+        blocks = []
+        for _, path in group:
+            for topic, rows in archive.read(path):
+                if topics and not any(topic_matches(p, topic) for p in topics):
+                    continue
+                tid = ids.get(topic)
+                if tid is None:
+                    tid = ids[topic] = -len(ids) - 1
+                blocks.append([(ts, 0, tid, v, p) for ts, v, p in rows if since <= ts < until])
+        yield from heapq.merge(*blocks)
+
+def iter_rows(conn, topic_ids=None, since=None, until=None, page=PAGE_SIZE, archived=None):
+    """Yield pages of (ts, rowid, topic_id, value, payload) in timestamp order.
+
+    `archived` is an optional stream from _archive_rows merged in by timestamp.
+    """
+    since = 0 if since is None else since
+    until = (1 << 62) if until is None else until
+    parts = db_schema.partitions(conn, since, until)
+    legacy = [t for day, t in parts if day is None]
+    tables = [t for day, t in parts if day is not None]
+    ids = [None] if topic_ids is None else topic_ids
+    if len(ids) == 1 and not legacy and archived is None:
+        yield from _table_pages(conn, tables, ids[0], since, until, page)
+        return
+    # Several streams: merge one index-ordered stream per topic (and per source)
+    streams = [(row for rows in _table_pages(conn, tables, tid, since, until, page) for row in rows)
+               for tid in ids]
+    streams += [(row for rows in _pages(conn, t, tid, since, until, page) for row in rows)
+                for t in legacy for tid in ids]
+    if archived is not None:
+        streams.append(archived)
+    out = []
+    for row in heapq.merge(*streams):
+        out.append(row)
+        if len(out) >= page:
+            yield out
+            out = []
+    if out:
+        yield out
+
+def export(conn, out, fmt="csv", topics=None, since=None, until=None, page=PAGE_SIZE, archive_dir=None):
+    names = dict(conn.execute("SELECT id, name FROM topics"))
+    topic_ids = resolve_topics(conn, topics) if topics else None
+    archived = None
+    if archive_dir:
+        ids = {name: tid for tid, name in names.items()}
+        archived = _archive_rows(archive_dir, topics, 0 if since is None else since,
+                                 (1 << 62) if until is None else until, ids)
+    elif topic_ids == []:
+        return 0
+    total = 0
+    if fmt == "csv":
+        w = csv.writer(out)
+        w.writerow(["ts_ms", "time", "topic", "value", "payload"])
+    # Formatting the wall-clock time is the slowest per-row step; rows come in
+    # time order, so reuse the string while the second does not change.
+    last_sec, last_text = None, None
+    def fmt_ts(ts):
+        nonlocal last_sec, last_text
+        if ts // 1000 != last_sec:
+            last_sec, last_text = ts // 1000, db_schema.format_ts(ts)
+        return last_text
+
+    for rows in iter_rows(conn, topic_ids, since, until, page, archived):
+        if archived is not None and len(names) < len(ids):
+            names.update((tid, name) for name, tid in ids.items())  # topics only in the archive
+        if fmt == "csv":
+            w.writerows((ts, fmt_ts(ts), names[tid], value, payload)
+                        for ts, _, tid, value, payload in rows)
+        else:
+            out.write("".join(json.dumps({"ts": ts, "topic": names[tid], "value": value, "payload": payload},
+                                         ensure_ascii=False) + "\n"
+                              for ts, _, tid, value, payload in rows))
+        total += len(rows)
+    return total
+
+# --- Analytics reports ---
+# Per tank and UTC day: pump/lamp ON time (consecutive status rows paired into
+# intervals), time-weighted share of temperature readings inside TEMP_RANGE, and
+# alarm counts. Each day is one streaming pass over its rows; rows from MAX_GAP
+# before midnight only set the starting state, so days are independent of each
+# other and closed days can be cached.
+
+def _new_stats():
+    return {"pump": {"on_ms": 0, "known_ms": 0, "starts": 0},
+            "lamp": {"on_ms": 0, "known_ms": 0, "starts": 0},
+            "temp": {"in_range_ms": 0, "known_ms": 0, "min": None, "max": None},
+            "alarms": {"raised": 0, "reminders": 0, "cleared": 0, "kinds": {}, "notices": 0}}
+
+def _is_on(value, payload):
+    if value is not None:
+        return value >= 0.5
+    if payload in ("ON", "OFF"):  # relays before status JSON
+        return payload == "ON"
+    try:
+        return json.loads(payload).get("state") == "ON"
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+def alarm_kind(text):
+    """'⚠️ High Temperature! (31.2°C)' -> '⚠️ High Temperature!' (readings and times stripped)."""
+    return re.split(r"\s*\(|\s+since\s|\s*-?\d", text, 1)[0] or text
+
+# Texts of the alarm engine's alarms (alarms.ALARMS, or GENERIC for other rule names).
+# Anything else on an alarm topic is a notice (pump switched, fish fed).
+ALARM_RAISED = {alarm_kind(texts[0]) for texts in ALARMS.values()}
+ALARM_CLEARED = {alarm_kind(texts[1]) for texts in ALARMS.values()}
+GENERIC_RAISED = re.compile(re.escape(GENERIC[0].split(" {", 1)[0]) + r" \w+$")
+GENERIC_CLEARED = re.compile(re.escape(GENERIC[1].split(" {", 1)[0]) + r" \w+ cleared$")
+
+def alarm_state(kind):
+    """'raised' / 'cleared' for an alarm text's kind, None for a notice."""
+    if kind in ALARM_RAISED or GENERIC_RAISED.match(kind):
+        return "raised"
+    if kind in ALARM_CLEARED or GENERIC_CLEARED.match(kind):
+        return "cleared"
+    return None
+
+def _account(st, suffix, start, value, end, lo, hi, temp_range):
+    # The state of a row holds until the next row of its topic, at most MAX_GAP
+    d = min(end, start + MAX_GAP, hi) - max(start, lo)
+    if d <= 0:
+        return
+    if suffix == "temp":
+        st["temp"]["known_ms"] += d
+        if temp_range[0] <= value <= temp_range[1]:
+            st["temp"]["in_range_ms"] += d
+    else:
+        dev = st[suffix[:-len("/status")]]
+        dev["known_ms"] += d
+        if value:
+            dev["on_ms"] += d
+
+def analyze_day(conn, series, lo, hi, temp_range=TEMP_RANGE):
+    """{tank: stats} for [lo, hi) in one pass. `series` maps topic_id -> (tank, suffix)."""
+    tanks = {}
+    last = {}  # topic_id -> (ts, value) of its latest row
+    for rows in iter_rows(conn, None, lo - MAX_GAP, hi):
+        for ts, _, tid, value, payload in rows:
+            s = series.get(tid)
+            if s is None:
+                continue
+            tank, suffix = s
+            if suffix == "alarm":
+                if ts >= lo and payload:
+                    a = (tanks.get(tank) or tanks.setdefault(tank, _new_stats()))["alarms"]
+                    kind = alarm_kind(payload)
+                    state = alarm_state(kind)
+                    if state is None:
+                        a["notices"] += 1
+                        continue
+                    a["kinds"][kind] = a["kinds"].get(kind, 0) + 1
+                    if state == "cleared":
+                        a["cleared"] += 1
+                    elif " since " in payload:
+                        a["reminders"] += 1
+                    else:
+                        a["raised"] += 1
+                continue
+            if suffix == "temp":
+                if value is None:
+                    continue
+            else:
+                value = _is_on(value, payload)
+                if value is None:
+                    continue
+            st = tanks.get(tank) or tanks.setdefault(tank, _new_stats())
+            prev = last.get(tid)
+            if prev is not None:
+                _account(st, suffix, prev[0], prev[1], ts, lo, hi, temp_range)
+            last[tid] = (ts, value)
+            if ts < lo:
+                continue
+            if suffix == "temp":
+                t = st["temp"]
+                t["min"] = value if t["min"] is None else min(t["min"], value)
+                t["max"] = value if t["max"] is None else max(t["max"], value)
+            elif value and (prev is None or not prev[1] or ts - prev[0] > MAX_GAP):
+                st[suffix[:-len("/status")]]["starts"] += 1
+    for tid, (ts, value) in last.items():
+        tank, suffix = series[tid]
+        _account(tanks[tank], suffix, ts, value, hi, lo, hi, temp_range)
+    # Tanks seen only before midnight with nothing left to count
+    return {tank: st for tank, st in tanks.items()
+            if st["temp"]["known_ms"] or st["pump"]["known_ms"] or st["lamp"]["known_ms"]
+            or st["alarms"]["kinds"] or st["alarms"]["notices"]}
+
+def merge_stats(days):
+    """Totals over several {tank: stats} days."""
+    out = {}
+    for tanks in days:
+        for tank, st in tanks.items():
+            tot = out.setdefault(tank, _new_stats())
+            for dev in ("pump", "lamp"):
+                for key in ("on_ms", "known_ms", "starts"):
+                    tot[dev][key] += st[dev][key]
+            t, s = tot["temp"], st["temp"]
+            t["in_range_ms"] += s["in_range_ms"]
+            t["known_ms"] += s["known_ms"]
+            for key, pick in (("min", min), ("max", max)):
+                if s[key] is not None:
+                    t[key] = s[key] if t[key] is None else pick(t[key], s[key])
+            a = tot["alarms"]
+            for key in ("raised", "reminders", "cleared", "notices"):
+                a[key] += st["alarms"][key]
+            for kind, n in st["alarms"]["kinds"].items():
+                a["kinds"][kind] = a["kinds"].get(kind, 0) + n
+    return out
+
+def _fingerprint(conn, day):
+    # Changes when rows are added to the day or the previous day (whose tail seeds it),
+    # e.g. by a late spool replay. Rows removed by retention don't invalidate the
+    # cache: the report keeps what happened that day even after raw rows expire.
+    fp = []
+    for d in (day - 1, day):
+        try:
+            fp.append(conn.execute(f"SELECT max(rowid) FROM {db_schema.partition_name(d)}").fetchone()[0])
+        except sqlite3.OperationalError:  # no such partition
+            fp.append(None)
+    return fp
+
+def report(conn, since=None, until=None, tanks=None, temp_range=TEMP_RANGE, cache_file=None):
+    """[(day, {tank: stats})] for each UTC day with a partition overlapping [since, until).
+
+    Days that ended before now and lie wholly inside the range come from `cache_file`
+    when their partitions haven't changed since; the others are computed (and cached).
+    """
+    parts = db_schema.partitions(conn, since, until)
+    days = [day for day, _ in parts if day is not None]
+    if not days:
+        return []
+    legacy = len(days) < len(parts)  # an unmigrated samples table: nothing is cacheable
+    now = db_schema.now_ms()
+    since = days[0] * db_schema.DAY_MS if since is None else since
+    until = now if until is None else min(until, now)
+
+    # Every tank is computed even for a --tank report, so cached days stay complete
+    series = {}
+    for tid, name in conn.execute("SELECT id, name FROM topics"):
+        parts = split_topic(name, REPORT_SUFFIXES)
+        if parts:
+            series[tid] = parts
+
+    cache = {}
+    if cache_file and os.path.exists(cache_file):
+        try:
+            with open(cache_file) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+        version = f"v{REPORT_VERSION}:"
+        cache = {k: v for k, v in cache.items() if k.startswith(version)}
+    dirty = False
+    out = []
+    for day in days if not legacy else range(since // db_schema.DAY_MS, (until - 1) // db_schema.DAY_MS + 1):
+        lo, hi = day * db_schema.DAY_MS, (day + 1) * db_schema.DAY_MS
+        closed = cache_file and not legacy and since <= lo and hi <= until
+        lo, hi = max(lo, since), min(hi, until)
+        if closed:
+            key = f"v{REPORT_VERSION}:{day}:{temp_range[0]}-{temp_range[1]}"
+            fp = _fingerprint(conn, day)
+            hit = cache.get(key)
+            if hit and hit["fingerprint"] == fp:
+                stats = hit["tanks"]
+            else:
+                stats = analyze_day(conn, series, lo, hi, temp_range)
+                cache[key] = {"fingerprint": fp, "tanks": stats}
+                dirty = True
+        else:
+            stats = analyze_day(conn, series, lo, hi, temp_range)
+        if tanks:
+            stats = {t: st for t, st in stats.items() if t in tanks}
+        if stats:
+            out.append((day, stats))
+    if dirty:
+        with open(cache_file + ".tmp", "w") as f:
+            json.dump(cache, f)
+        os.replace(cache_file + ".tmp", cache_file)
+    return out
+
+def _hours(ms):
+    return f"{ms // 3_600_000}h{ms // 60_000 % 60:02d}"
+
+def _pct(part, whole):
+    return f"{part / whole * 100:5.1f}%" if whole else "    -"
+
+def print_report(days, temp_range=TEMP_RANGE, out=sys.stdout):
+    low, high = temp_range
+    head = (f"{'day':10} {'tank':8} {'pump on':>8} {'duty':>6} {'starts':>6} {'lamp on':>8} {'duty':>6} "
+            f"{'starts':>6} {f'{low:g}-{high:g}°C':>8} {'min':>6} {'max':>6} {'alarms':>6}  top alarm")
+    print(head, file=out)
+    def line(label, tank, st):
+        p, l, t, a = st["pump"], st["lamp"], st["temp"], st["alarms"]
+        top = max(a["kinds"].items(), key=lambda kv: kv[1], default=None)
+        print(f"{label:10} {tank or '(default)':8} {_hours(p['on_ms']):>8} {_pct(p['on_ms'], p['known_ms']):>6} "
+              f"{p['starts']:6d} {_hours(l['on_ms']):>8} {_pct(l['on_ms'], l['known_ms']):>6} {l['starts']:6d} "
+              f"{_pct(t['in_range_ms'], t['known_ms']):>8} "
+              f"{'-' if t['min'] is None else t['min']:>6} {'-' if t['max'] is None else t['max']:>6} "
+              f"{a['raised']:6d}  {f'{top[0]} x{top[1]}' if top else ''}", file=out)
+    for day, tanks in days:
+        label = time.strftime("%Y-%m-%d", time.gmtime(day * 86400))
+        for tank in sorted(tanks):
+            line(label, tank, tanks[tank])
+    if len(days) > 1:
+        totals = merge_stats(tanks for _, tanks in days)
+        for tank in sorted(totals):
+            line("total", tank, totals[tank])
+
+def cli(argv):
+    global DB_FILE
+    ap = argparse.ArgumentParser(description="Query and export aquarium logs")
+    ap.add_argument("--db", default=DB_FILE)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    exp = sub.add_parser("export", help="stream rows in time order as CSV or JSONL")
+    exp.add_argument("--topic", action="append", help="topic or MQTT pattern (repeatable)")
+    exp.add_argument("--since", help="start time: 'YYYY-MM-DD[ HH:MM[:SS]]', epoch ms or age like 7d")
+    exp.add_argument("--until", help="end time (exclusive), same formats")
+    exp.add_argument("--format", choices=("csv", "jsonl"), default="csv")
+    exp.add_argument("--out", help="output file (default: stdout)")
+    exp.add_argument("--archive", nargs="?", const=archive.ARCHIVE_DIR,
+                     help=f"also read archived (pruned) days from this directory (default {archive.ARCHIVE_DIR})")
+    last = sub.add_parser("latest", help="show the latest N rows")
+    last.add_argument("--topic")
+    last.add_argument("--limit", type=int, default=20)
+    rep = sub.add_parser("report", help="pump/lamp duty cycles, time in temperature range and alarms per tank and day")
+    rep.add_argument("--since", help="start time, same formats as export (default: first day in the DB)")
+    rep.add_argument("--until", help="end time (exclusive, default: now)")
+    rep.add_argument("--tank", action="append", help="tank id, '' for the default tank (repeatable)")
+    rep.add_argument("--range", nargs=2, type=float, default=TEMP_RANGE, metavar=("LOW", "HIGH"),
+                     help=f"temperature range in °C (default {TEMP_RANGE[0]:g} {TEMP_RANGE[1]:g})")
+    rep.add_argument("--format", choices=("text", "json"), default="text")
+    rep.add_argument("--no-cache", action="store_true", help=f"don't read or write <db>{REPORT_CACHE}")
+    args = ap.parse_args(argv)
+
+    if args.cmd == "latest":
+        DB_FILE = args.db
+        show_logs(args.topic, args.limit)
+        return
+
+    if args.cmd == "report":
+        conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+        _check_schema(conn, args.db)
+        start = time.perf_counter()
+        days = report(conn, parse_time(args.since), parse_time(args.until), args.tank, tuple(args.range),
+                      None if args.no_cache else args.db + REPORT_CACHE)
+        conn.close()
+        if args.format == "json":
+            days_out = {time.strftime("%Y-%m-%d", time.gmtime(day * 86400)): tanks for day, tanks in days}
+            print(json.dumps({"range": args.range, "days": days_out,
+                              "total": merge_stats(tanks for _, tanks in days)}, ensure_ascii=False, indent=1))
+        else:
+            print_report(days, tuple(args.range))
+        print(f"✅ Report in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+        return
+
+    conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    _check_schema(conn, args.db)
+    out = open(args.out, "w", newline="", encoding="utf-8", buffering=1 << 20) if args.out else sys.stdout
+    start = time.perf_counter()
+    try:
+        n = export(conn, out, args.format, args.topic, parse_time(args.since), parse_time(args.until),
+                   archive_dir=args.archive)
+    finally:
+        if args.out:
+            out.close()
+        conn.close()
+    print(f"✅ Exported {n} rows in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+
+def menu():
     print("🐟 Smart Aquarium Log Viewer")
     print("Options:")
     print("  1) Show last 20 logs (all)")
@@ -52,3 +557,9 @@ if __name__ == "__main__":
         show_logs("aquarium/feed")
     else:
         print("Invalid option.")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        cli(sys.argv[1:])
+    else:
+        menu()
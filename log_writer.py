@@ -0,0 +1,192 @@
+import sqlite3, threading, queue, time
+import db_schema, rollups
+
+# Group-commit settings
+QUEUE_SIZE = 10000      # max rows waiting for the writer
+BATCH_SIZE = 500        # commit when this many rows are pending...
+FLUSH_INTERVAL = 0.5    # ...or when the oldest pending row is this old (seconds)
+FLUSH_RETRIES = 3       # attempts per batch (locked DB, full disk) before its rows are dropped
+RETRY_DELAY = 1.0       # seconds before the first retry, doubling after that
+
+_STOP = object()
+
+class LogWriter:
+    """Background writer: batches log rows and commits them off the MQTT thread."""
+
+    def __init__(self, db_file, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL,
+                 queue_size=QUEUE_SIZE, metrics=None):
+        self.db_file = db_file
+        self.metrics = metrics  # optional metrics.Metrics: commit timings and rows per commit
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=queue_size)
+
+        # Latest alarm state rows, upserted with the next commit
+        self._alarms = {}
+        self._alarms_lock = threading.Lock()
+
+        # Counters (read from any thread; drops can come from several producer threads)
+        self._dropped_lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.commits = 0
+        self.errors = 0   # failed commits
+        self.failed = 0   # rows given up on after FLUSH_RETRIES
+
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    # --- Producer side (MQTT thread) ---
+    def log(self, ts, topic, value):
+        try:
+            self.queue.put_nowait((ts, topic, value))
+        except queue.Full:
+            # Never block the network thread on disk; count the loss instead
+            with self._dropped_lock:
+                self.dropped += 1
+
+    def log_many(self, topic, samples):
+        # One queue item, so the whole batch lands in the same transaction
+        try:
+            self.queue.put_nowait([(ts, topic, value) for ts, value in samples])
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += len(samples)
+
+    def set_alarm(self, row):
+        # row: (tank, name, active, since, value, last_sent, raised); only the latest per alarm is kept
+        with self._alarms_lock:
+            self._alarms[row[:2]] = row
+
+    def depth(self):
+        return self.queue.qsize()
+
+    def stats(self):
+        return {"queue_depth": self.depth(), "written": self.written,
+                "dropped": self.dropped, "commits": self.commits,
+                "errors": self.errors, "failed": self.failed}
+
+    def close(self, timeout=10):
+        self.queue.put(_STOP)
+        self._thread.join(timeout)
+
+    # --- Writer thread ---
+    def _open(self):
+        conn = db_schema.connect(self.db_file)
+        self._topics = db_schema.TopicIds(conn)
+        self._parts = db_schema.PartitionWriter(conn)
+        self._rollup_ids = {}   # topic name -> is rolled up
+        self._rollup = rollups.RollupBatch()
+        return conn
+
+    def _write(self, conn, batch):
+        """_flush with retries. Returns the connection to go on with (None: reopen next time)."""
+        delay = RETRY_DELAY
+        for attempt in range(1, FLUSH_RETRIES + 1):
+            try:
+                if conn is None:
+                    conn = self._open()
+                self._flush(conn, batch)
+                return conn
+            except sqlite3.Error as e:
+                self.errors += 1
+                print(f"⚠️ Log writer: writing {len(batch)} rows failed ({e}), attempt {attempt}/{FLUSH_RETRIES}")
+                if conn is not None:
+                    try:
+                        conn.close()  # rolls back; the topic/partition caches go with it
+                    except sqlite3.Error:
+                        pass
+                conn = None
+                if attempt < FLUSH_RETRIES:
+                    time.sleep(delay)
+                    delay *= 2
+        print(f"❌ Log writer: dropped {len(batch)} rows after {FLUSH_RETRIES} attempts")
+        self.failed += len(batch)
+        batch.clear()
+        return conn
+
+    def _flush(self, conn, batch):
+        t0 = time.perf_counter()
+        alarms = None
+        if self._alarms:
+            with self._alarms_lock:
+                alarms, self._alarms = list(self._alarms.values()), {}
+        try:
+            self._commit(conn, batch, alarms)
+        except sqlite3.Error:
+            if alarms:  # keep them for the next attempt unless a newer row came in
+                with self._alarms_lock:
+                    for row in alarms:
+                        self._alarms.setdefault(row[:2], row)
+            raise
+        if batch:
+            self.written += len(batch)
+            self.commits += 1
+            if self.metrics:
+                self.metrics.observe("db_commit", "", time.perf_counter() - t0)
+                self.metrics.inc("db_rows", "", len(batch))
+            batch.clear()
+
+    def _commit(self, conn, batch, alarms):
+        if alarms:
+            conn.executemany("INSERT OR REPLACE INTO alarms (tank, name, active, since, value, last_sent, raised) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?)", alarms)
+            if not batch:
+                conn.commit()
+        if not batch:
+            return
+        rows = []
+        for ts, topic, raw in batch:
+            value, payload = db_schema.split_value(raw)
+            tid = self._topics.get(topic)
+            rows.append((ts, tid, value, payload))
+            if value is not None and self._is_rollup(topic):
+                self._rollup.add(tid, ts, value)
+        self._parts.insert(rows)
+        self._rollup.flush(conn)  # same transaction as the raw rows
+        conn.commit()
+
+    def _is_rollup(self, topic):
+        flag = self._rollup_ids.get(topic)
+        if flag is None:
+            flag = self._rollup_ids[topic] = rollups.is_rollup_topic(topic)
+        return flag
+
+    def _run(self):
+        conn = self._write(None, [])  # opens; like any write, retried if the DB is locked
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0, deadline - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                # Drain anything queued behind the stop marker, then exit
+                while True:
+                    try:
+                        item = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if isinstance(item, list):
+                        batch.extend(item)
+                    elif item is not _STOP:
+                        batch.append(item)
+                conn = self._write(conn, batch)
+                if conn is not None:
+                    conn.close()
+                return
+
+            if item is not None:
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                if isinstance(item, list):
+                    batch.extend(item)
+                else:
+                    batch.append(item)
+
+            if len(batch) >= self.batch_size or (batch and time.monotonic() >= deadline):
+                conn = self._write(conn, batch)
+                deadline = None
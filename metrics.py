@@ -0,0 +1,163 @@
+import json, os, threading, time
+from bisect import bisect_left
+
+# Runtime metrics for the manager and relays: counters and latency histograms.
+# The message path holds on to its Histogram (cached per route), so recording is
+# one bisect; a histogram's count doubles as the message counter for its topic.
+# Reports come from the component's periodic tick (no extra thread):
+#   - JSON snapshot published to $metrics/<component>  ($ topics don't match "#")
+#   - Prometheus text file <AQUARIUM_METRICS_DIR>/<component>.prom if that env var is set
+#     (for node_exporter's textfile collector)
+METRICS_TOPIC = "$metrics"
+METRICS_INTERVAL = 10  # seconds between reports
+PROM_DIR = os.environ.get("AQUARIUM_METRICS_DIR")
+ENABLED = os.environ.get("AQUARIUM_METRICS", "1") != "0"
+
+# Histogram bucket upper bounds in seconds (Prometheus "le")
+BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+           0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+class Histogram:
+    __slots__ = ("counts", "sum", "lock")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.lock = threading.Lock()  # the manager observes from several intake workers
+
+    def observe(self, seconds):
+        i = bisect_left(BUCKETS, seconds)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += seconds
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding quantile q (None if empty)."""
+        n = self.count
+        if not n:
+            return None
+        rank, seen = q * n, 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return BUCKETS[i] if i < len(BUCKETS) else float("inf")
+        return None
+
+    def summary(self):
+        n = self.count
+        ms = lambda s: None if s is None else round(s * 1000, 3)
+        return {"n": n, "mean_ms": ms(self.sum / n) if n else None,
+                "p50_ms": ms(self.quantile(0.5)), "p99_ms": ms(self.quantile(0.99))}
+
+class Metrics:
+    """Counters and histograms for one component, keyed by (name, label).
+
+    Labels are topic suffixes ("temp", "pump/status", ...) rather than full topics,
+    so the number of series stays the same with one tank or ten thousand.
+    """
+
+    def __init__(self, component, enabled=ENABLED, prom_dir=PROM_DIR):
+        self.component = component
+        self.enabled = enabled
+        self.prom_dir = prom_dir
+        self.topic = f"{METRICS_TOPIC}/{component}"
+        self.counters = {}    # (name, label) -> int
+        self.histograms = {}  # (name, label) -> Histogram
+        self.gauges = {}      # name -> callable returning a number
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.reports = 0
+        self.next_report = 0.0
+
+    def inc(self, name, label="", n=1):
+        if self.enabled:
+            key = (name, label)
+            with self.lock:
+                self.counters[key] = self.counters.get(key, 0) + n
+
+    def histogram(self, name, label=""):
+        h = self.histograms.get((name, label))
+        if h is None:
+            with self.lock:
+                h = self.histograms.setdefault((name, label), Histogram())
+        return h
+
+    def observe(self, name, label, seconds):
+        if self.enabled:
+            self.histogram(name, label).observe(seconds)
+
+    def gauge(self, name, fn):
+        self.gauges[name] = fn
+
+    def snapshot(self):
+        counters, histograms = {}, {}
+        for (name, label), n in list(self.counters.items()):
+            counters.setdefault(name, {})[label] = n
+        for (name, label), h in list(self.histograms.items()):
+            histograms.setdefault(name, {})[label] = h.summary()
+        gauges = {}
+        for name, fn in list(self.gauges.items()):
+            try:
+                gauges[name] = fn()
+            except Exception:
+                pass
+        return {"component": self.component, "ts": int(time.time() * 1000),
+                "uptime_s": round(time.time() - self.started, 1),
+                "counters": counters, "histograms": histograms, "gauges": gauges}
+
+    def prometheus(self):
+        """Prometheus text exposition format."""
+        comp = _label_value(self.component)
+        lines = []
+        typed = set()
+        def head(metric, kind):
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} {kind}")
+        for (name, label), n in sorted(self.counters.items()):
+            metric = f"aquarium_{name}_total"
+            head(metric, "counter")
+            lines.append(f'{metric}{{component="{comp}",topic="{_label_value(label)}"}} {n}')
+        for (name, label), h in sorted(self.histograms.items()):
+            metric = f"aquarium_{name}_seconds"
+            head(metric, "histogram")
+            labels = f'component="{comp}",topic="{_label_value(label)}"'
+            seen = 0
+            for bound, n in zip(BUCKETS + ("+Inf",), h.counts):
+                seen += n
+                lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {seen}')
+            lines.append(f"{metric}_sum{{{labels}}} {h.sum}")
+            lines.append(f"{metric}_count{{{labels}}} {seen}")
+        for name, value in sorted(self.snapshot()["gauges"].items()):
+            metric = f"aquarium_{name}"
+            head(metric, "gauge")
+            lines.append(f'{metric}{{component="{comp}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def report(self, client):
+        """Publish a snapshot (and write the Prometheus file); called from the component's tick.
+
+        At most one report per interval, so components sharing one Metrics can all call it.
+        """
+        now = time.monotonic()
+        if not self.enabled or now < self.next_report:
+            return
+        self.next_report = now + METRICS_INTERVAL * 0.9
+        client.publish(self.topic, json.dumps(self.snapshot()))
+        if self.prom_dir:
+            try:
+                os.makedirs(self.prom_dir, exist_ok=True)
+                path = os.path.join(self.prom_dir, f"{self.component}.prom")
+                with open(path + ".tmp", "w") as f:
+                    f.write(self.prometheus())
+                os.replace(path + ".tmp", path)  # the collector never reads a partial file
+            except OSError as e:
+                print("Metrics file not written:", e)
+        self.reports += 1
+
+def _label_value(text):
+    return str(text).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,87 @@
+import sys, time
+import db_schema
+
+# One-shot migrations:
+#   legacy TEXT `logs` table      -> typed daily partitions (samples_YYYYMMDD)
+#   unpartitioned `samples` table -> daily partitions
+# Both stream rows in chunks and can be interrupted: `logs` records its progress
+# in `meta`, `samples` deletes each chunk in the transaction that copies it.
+CHUNK = 5000
+PROGRESS_KEY = "logs_migrated_rowid"
+
+def migrate(db_file=db_schema.DB_FILE, chunk=CHUNK, drop_legacy=False):
+    conn = db_schema.connect(db_file)
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='logs'").fetchone():
+        print("No legacy logs table, nothing to migrate.")
+        conn.close()
+        return 0
+
+    row = conn.execute("SELECT value FROM meta WHERE key=?", (PROGRESS_KEY,)).fetchone()
+    last = int(row[0]) if row else 0
+    topics = db_schema.TopicIds(conn)
+    parts = db_schema.PartitionWriter(conn)
+    read = conn.cursor()
+    read.execute("SELECT rowid, timestamp, sensor, value FROM logs WHERE rowid > ? ORDER BY rowid", (last,))
+
+    total, skipped = 0, 0
+    start = time.perf_counter()
+    while True:
+        chunk_rows = read.fetchmany(chunk)
+        if not chunk_rows:
+            break
+        out = []
+        for rowid, ts, topic, raw in chunk_rows:
+            try:
+                ts_ms = db_schema.parse_ts(ts)
+            except (TypeError, ValueError):
+                skipped += 1
+                continue
+            value, payload = db_schema.split_value(raw)
+            out.append((ts_ms, topics.get(topic), value, payload))
+        last = chunk_rows[-1][0]
+        parts.insert(out)
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (PROGRESS_KEY, str(last)))
+        conn.commit()
+        total += len(out)
+
+    if drop_legacy:
+        conn.execute("DROP TABLE logs")
+        conn.execute("DELETE FROM meta WHERE key=?", (PROGRESS_KEY,))
+        conn.commit()
+
+    conn.close()
+    print(f"✅ Migrated {total} rows ({skipped} skipped) in {time.perf_counter() - start:.2f}s")
+    return total
+
+def partition_samples(db_file=db_schema.DB_FILE, chunk=CHUNK):
+    conn = db_schema.connect(db_file)
+    legacy = db_schema.LEGACY_SAMPLES
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (legacy,)).fetchone():
+        conn.close()
+        return 0
+
+    parts = db_schema.PartitionWriter(conn)
+    total = 0
+    start = time.perf_counter()
+    while True:
+        rows = conn.execute(f"SELECT rowid, ts, topic_id, value, payload FROM {legacy} "
+                            f"ORDER BY rowid LIMIT {int(chunk)}").fetchall()
+        if not rows:
+            break
+        parts.insert([r[1:] for r in rows])
+        conn.execute(f"DELETE FROM {legacy} WHERE rowid <= ?", (rows[-1][0],))
+        conn.commit()
+        total += len(rows)
+    conn.execute(f"DROP TABLE {legacy}")
+    conn.commit()
+    conn.close()
+    print(f"✅ Partitioned {total} samples by day in {time.perf_counter() - start:.2f}s")
+    return total
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    drop = "--drop-legacy" in args
+    args = [a for a in args if a != "--drop-legacy"]
+    db_file = args[0] if args else db_schema.DB_FILE
+    migrate(db_file, drop_legacy=drop)
+    partition_samples(db_file)
@@ -0,0 +1,296 @@
+import threading, time, traceback
+from collections import deque
+from local_broker import topic_matches
+
+# In-process stand-in for the broker and paho.mqtt.client.Client: the part of the
+# paho API this project uses (connect/connect_async, subscribe with + / # wildcards,
+# publish with retain, on_connect/on_message/on_subscribe/on_disconnect,
+# message_callback_add, loop/loop_start/loop_stop/loop_forever, is_connected).
+# Every Client in a process talks to the same Bus, so the whole system can run in one
+# process with no sockets: selected with AQUARIUM_BROKER=inproc (see mqtt_config.make_client).
+#
+# Like paho, callbacks run on the client's own loop (its loop_start thread, or whoever
+# calls loop()), never on the publisher's thread; each client sees messages in the order
+# they were published. QoS is accepted and ignored. Like a broker's max_queued_messages,
+# each client queues at most MAX_QUEUED messages: a publish never waits for a slow
+# subscriber (it runs under the bus lock), so past that the subscriber loses the new
+# messages and counts them in `dropped`.
+MQTT_ERR_SUCCESS = 0
+MQTT_ERR_NO_CONN = 4
+MAX_QUEUED = 10000  # messages waiting per client
+
+class Message:
+    """paho MQTTMessage look-alike; one instance is shared by all subscribers."""
+    __slots__ = ("topic", "payload", "qos", "retain", "mid", "timestamp")
+
+    def __init__(self, topic, payload, qos=0, retain=False, mid=0):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+        self.mid = mid
+        self.timestamp = time.monotonic()
+
+class MessageInfo:
+    """Result of publish(): delivered to every subscriber's queue before it returns."""
+    __slots__ = ("mid", "rc")
+
+    def __init__(self, mid, rc=MQTT_ERR_SUCCESS):
+        self.mid = mid
+        self.rc = rc
+
+    def wait_for_publish(self, timeout=None):
+        pass
+
+    def is_published(self):
+        return self.rc == MQTT_ERR_SUCCESS
+
+class Bus:
+    """Subscriptions and retained messages shared by the clients of one process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subs = {}      # client -> {filter: qos}
+        self.routes = {}    # topic -> (client, ...) whose filters match, cached
+        self.retained = {}  # topic -> payload
+        self.published = 0
+
+    def subscribe(self, client, filters):
+        with self.lock:
+            self.subs.setdefault(client, {}).update(filters)
+            self.routes.clear()
+            return [Message(t, p, retain=True) for t, p in self.retained.items()
+                    if any(topic_matches(f, t) for f in filters)]
+
+    def unsubscribe(self, client, filters):
+        with self.lock:
+            subs = self.subs.get(client, {})
+            for f in filters:
+                subs.pop(f, None)
+            self.routes.clear()
+
+    def detach(self, client):
+        with self.lock:
+            if self.subs.pop(client, None) is not None:
+                self.routes.clear()
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        msg = Message(topic, payload, qos)
+        # Under the lock, so every subscriber queues concurrent publishes in the same order
+        with self.lock:
+            self.published += 1
+            if retain:
+                if payload:
+                    self.retained[topic] = payload
+                else:
+                    self.retained.pop(topic, None)  # empty retained payload clears it
+            clients = self.routes.get(topic)
+            if clients is None:
+                clients = self.routes[topic] = tuple(
+                    c for c, filters in self.subs.items() if any(topic_matches(f, topic) for f in filters))
+            for c in clients:
+                c._deliver(msg)
+
+BUS = Bus()
+
+def _to_bytes(payload):
+    if payload is None:
+        return b""
+    if isinstance(payload, (bytes, bytearray)):
+        return bytes(payload)
+    if isinstance(payload, str):
+        return payload.encode()
+    return str(payload).encode()  # paho sends int/float as their text
+
+class Client:
+    """paho-compatible client on the in-process bus (host/port are ignored)."""
+
+    def __init__(self, client_id="", userdata=None, bus=None, max_queued=MAX_QUEUED):
+        self.bus = bus or BUS
+        self.client_id = client_id
+        self._userdata = userdata
+        self.on_connect = None
+        self.on_disconnect = None
+        self.on_message = None
+        self.on_subscribe = None
+        self.on_publish = None
+        # Called (from the publisher's thread) when the queue goes from empty to
+        # non-empty, for an owner that dispatches with loop(0) instead of a thread
+        self.wakeup = None
+        self._callbacks = {}  # filter -> callback, from message_callback_add
+        self._cb_routes = {}  # topic -> [callback] or None, cached
+        self._queue = deque()  # ("message", Message) / ("connect",) / ...
+        self.max_queued = max_queued
+        self._queued = 0       # messages in _queue; other events don't count
+        self.dropped = 0       # messages lost to a full queue
+        self._cond = threading.Condition()
+        self._woken = False
+        self._connected = False
+        self._mid = 0
+        self._thread = None
+        self._stop = False
+
+    # --- Connection ---
+    def user_data_set(self, userdata):
+        self._userdata = userdata
+
+    def reconnect_delay_set(self, min_delay=1, max_delay=120):
+        pass
+
+    def connect(self, host=None, port=None, keepalive=60, *args, **kwargs):
+        if not self._connected:
+            self._connected = True
+            self._post(("connect",))
+        return MQTT_ERR_SUCCESS
+
+    connect_async = connect
+
+    def reconnect(self):
+        return self.connect()
+
+    def disconnect(self, *args, **kwargs):
+        if self._connected:
+            self._connected = False
+            self.bus.detach(self)
+            self._post(("disconnect",))
+        return MQTT_ERR_SUCCESS
+
+    def is_connected(self):
+        return self._connected
+
+    # --- Pub/sub ---
+    def _next_mid(self):
+        self._mid += 1
+        return self._mid
+
+    def subscribe(self, topic, qos=0, *args, **kwargs):
+        if isinstance(topic, str):
+            filters = {topic: qos}
+        elif isinstance(topic, tuple):
+            filters = {topic[0]: topic[1]}
+        else:
+            filters = dict(topic)
+        if not self._connected:
+            return MQTT_ERR_NO_CONN, None
+        mid = self._next_mid()
+        retained = self.bus.subscribe(self, filters)
+        # SUBACK first, then the retained messages, as from a broker
+        self._post(("subscribe", mid, tuple(filters.values())))
+        for msg in retained:
+            self._post(("message", msg))
+        return MQTT_ERR_SUCCESS, mid
+
+    def unsubscribe(self, topic, *args, **kwargs):
+        self.bus.unsubscribe(self, [topic] if isinstance(topic, str) else list(topic))
+        return MQTT_ERR_SUCCESS, self._next_mid()
+
+    def publish(self, topic, payload=None, qos=0, retain=False, *args, **kwargs):
+        mid = self._next_mid()
+        if not self._connected:
+            return MessageInfo(mid, MQTT_ERR_NO_CONN)
+        self.bus.publish(topic, _to_bytes(payload), qos, retain)
+        if self.on_publish:
+            self._post(("publish", mid))
+        return MessageInfo(mid)
+
+    def message_callback_add(self, sub, callback):
+        self._callbacks[sub] = callback
+        self._cb_routes.clear()
+
+    def message_callback_remove(self, sub):
+        self._callbacks.pop(sub, None)
+        self._cb_routes.clear()
+
+    # --- Delivery ---
+    def _deliver(self, msg):
+        self._post(("message", msg))
+
+    def _post(self, event):
+        with self._cond:
+            if event[0] == "message":
+                if self._queued >= self.max_queued:
+                    self.dropped += 1
+                    if self.dropped == 1:
+                        print(f"⚠️ mqtt_bus: client {self.client_id or id(self)} is {self.max_queued} "
+                              f"messages behind, dropping new ones")
+                    return
+                self._queued += 1
+            self._queue.append(event)
+            wake = self.wakeup is not None and not self._woken
+            if wake:
+                self._woken = True
+            self._cond.notify()
+        if wake:
+            self.wakeup()
+
+    def _dispatch(self, event):
+        kind = event[0]
+        if kind == "message":
+            msg = event[1]
+            cbs = self._cb_routes.get(msg.topic, False)
+            if cbs is False:
+                cbs = self._cb_routes[msg.topic] = [cb for f, cb in self._callbacks.items()
+                                                    if topic_matches(f, msg.topic)] or None
+            if cbs:
+                for cb in cbs:
+                    cb(self, self._userdata, msg)
+            elif self.on_message:
+                self.on_message(self, self._userdata, msg)
+        elif kind == "connect":
+            if self.on_connect:
+                self.on_connect(self, self._userdata, {}, 0)
+        elif kind == "subscribe":
+            if self.on_subscribe:
+                self.on_subscribe(self, self._userdata, event[1], event[2])
+        elif kind == "publish":
+            if self.on_publish:
+                self.on_publish(self, self._userdata, event[1])
+        elif kind == "disconnect":
+            if self.on_disconnect:
+                self.on_disconnect(self, self._userdata, 0)
+
+    def loop(self, timeout=1.0, *args, **kwargs):
+        """Run the callbacks for everything queued, waiting up to `timeout` for the first."""
+        with self._cond:
+            self._woken = False
+            if not self._queue and timeout:
+                self._cond.wait(timeout)
+            events = list(self._queue)
+            self._queue.clear()
+            self._queued = 0
+        for event in events:
+            try:
+                self._dispatch(event)
+            except Exception:
+                traceback.print_exc()  # a failing callback must not stop delivery
+        return MQTT_ERR_SUCCESS if self._connected or events else MQTT_ERR_NO_CONN
+
+    def loop_start(self):
+        if self._thread is not None:
+            return MQTT_ERR_SUCCESS
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="mqtt-bus-loop", daemon=True)
+        self._thread.start()
+        return MQTT_ERR_SUCCESS
+
+    def _run(self):
+        while not self._stop:
+            self.loop(1.0)
+
+    def loop_stop(self, *args, **kwargs):
+        if self._thread is None:
+            return MQTT_ERR_SUCCESS
+        self._stop = True
+        with self._cond:
+            self._cond.notify()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+        return MQTT_ERR_SUCCESS
+
+    def loop_forever(self, *args, **kwargs):
+        """Until disconnect() (its on_disconnect runs first) or loop_stop() from a callback."""
+        self._stop = False
+        while not self._stop and (self._connected or self._queue):
+            self.loop(1.0)
+        return MQTT_ERR_SUCCESS
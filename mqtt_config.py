@@ -0,0 +1,24 @@
+import os
+
+# Broker address shared by every component; override with environment variables,
+# e.g. AQUARIUM_BROKER=localhost AQUARIUM_PORT=1884 python aquarium_manager.py
+BROKER = os.environ.get("AQUARIUM_BROKER", "broker.hivemq.com")
+PORT = int(os.environ.get("AQUARIUM_PORT", "1883"))
+
+# AQUARIUM_BROKER=inproc: no network at all, every client in the process shares the
+# in-process bus (mqtt_bus.py). Only useful with everything in one process
+# (device_host.py --manager, bench_e2e.py --inproc, tests).
+INPROC = "inproc"
+
+# Payload encoding for sensor and status topics published by this process:
+# "json" (default) or "binary" for all of them, or per topic suffix on top of a default,
+# e.g. "json,temp=binary,status=binary" (see codec.py). Consumers always accept both.
+PAYLOAD_FORMAT = os.environ.get("AQUARIUM_PAYLOAD", "json").lower()
+
+def make_client():
+    """An MQTT client for BROKER: paho's, or an mqtt_bus.Client for "inproc"."""
+    if BROKER == INPROC:
+        import mqtt_bus
+        return mqtt_bus.Client()
+    import paho.mqtt.client as mqtt
+    return mqtt.Client()
@@ -0,0 +1,183 @@
+import json, os, sys, threading, time, tracemalloc
+from collections import Counter
+
+# On-demand profiling over MQTT. Every component listens on
+#   $profile/<component>   (e.g. $profile/manager, $profile/pump-t1)
+#   $profile/all
+# for {"cmd": "start", "seconds": 30, "cpu": true, "memory": true, "threads": "handler"}
+# or {"cmd": "stop"} (plain "start" / "stop" work too). A session ends by itself after
+# `seconds` and writes to PROFILE_DIR:
+#   <component>-<time>.collapsed       CPU samples as folded stacks: flamegraph.pl,
+#                                      speedscope, inferno
+#   <component>-<time>.tracemalloc     tracemalloc.Snapshot.load() / python -m tracemalloc
+#   <component>-<time>.txt             top functions and top allocators
+# and announces the files on $profile/<component>/done. A command that can't be run
+# (bad JSON, seconds not in (0, MAX_SECONDS]) gets {"error": "..."} there instead.
+# Nothing is installed until a session starts (no sampler thread, no tracemalloc), and
+# the control topics get their own paho callback, so normal messages never see them.
+PROFILE_TOPIC = "$profile"
+PROFILE_DIR = "profiles"
+DEFAULT_SECONDS = 30
+MAX_SECONDS = 600
+SAMPLE_INTERVAL = 0.005   # 200 Hz
+MIN_INTERVAL = 0.001      # fastest sampling a command may ask for
+TRACE_FRAMES = 10         # stack depth kept per allocation
+TOP = 25
+
+def _bounded(cmd, key, default, low, high):
+    # A number in (low, high]: larger ones are clamped; NaN, low or less, and non-numbers raise
+    value = float(cmd.get(key, default))
+    if not value > low:
+        raise ValueError(f"{key} must be greater than {low:g}, got {value!r}")
+    return min(value, high)
+
+class Sampler:
+    """Samples the Python stacks of one thread (or all) from a background thread."""
+
+    def __init__(self, thread_id=None, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id  # None = every thread
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for tid, frame in sys._current_frames().items():
+                if tid == me or (self.thread_id is not None and tid != self.thread_id):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(tid, str(tid)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path):
+        with open(path, "w") as f:
+            for stack, n in self.stacks.most_common():
+                f.write(f"{stack} {n}\n")
+
+    def top(self, n=TOP):
+        """Functions by samples where they were on top of the stack (self time)."""
+        leaf = Counter()
+        for stack, count in self.stacks.items():
+            leaf[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaf.values()) or 1
+        return [f"{count / total * 100:5.1f}%  {count:6d}  {name}" for name, count in leaf.most_common(n)]
+
+class Profiler:
+    """MQTT-controlled profiling session for one component."""
+
+    def __init__(self, component, out_dir=PROFILE_DIR, all_threads=False):
+        self.component = component
+        self.out_dir = out_dir
+        self.all_threads = all_threads  # e.g. the GUI's Qt thread, the manager's intake workers
+        self.topics = [f"{PROFILE_TOPIC}/{component}", f"{PROFILE_TOPIC}/all"]
+        self.done_topic = f"{PROFILE_TOPIC}/{component}/done"
+        self.interval = 3600  # device_host component protocol; tick() does nothing
+        self.sampler = None
+        self.timer = None
+        self.started = None
+        self.lock = threading.Lock()
+
+    def attach(self, client):
+        """Standalone processes: route only the control topics here (call after connect)."""
+        for topic in self.topics:
+            client.message_callback_add(topic, self.on_message)
+            client.subscribe(topic)
+
+    # device_host component protocol
+    def start(self, client):
+        pass
+
+    def tick(self, client):
+        pass
+
+    def stop(self):
+        self.finish(None)
+
+    def on_message(self, client, userdata, msg):
+        # Runs on the component's network thread: a bad command must not raise
+        text = msg.payload.decode(errors="replace").strip()
+        try:
+            cmd = json.loads(text) if text.startswith("{") else {"cmd": text or "start"}
+            if not isinstance(cmd, dict):
+                raise ValueError("not a JSON object")
+            if cmd.get("cmd") == "start":
+                seconds = _bounded(cmd, "seconds", DEFAULT_SECONDS, 0, MAX_SECONDS)
+                interval = _bounded(cmd, "interval_ms", SAMPLE_INTERVAL * 1000, 0, 1000) / 1000
+        except (ValueError, TypeError) as e:
+            print(f"Bad profiling command on {msg.topic}: {text!r} ({e})")
+            client.publish(self.done_topic, json.dumps({"error": f"bad command: {e}"}))
+            return
+        if cmd.get("cmd") == "stop":
+            self.finish(client)
+        elif cmd.get("cmd") == "start":
+            # Sample the thread this arrived on, which runs the message handlers unless the
+            # component hands them to worker threads (then it was made with all_threads)
+            thread_id = None if self.all_threads or cmd.get("threads") == "all" else threading.get_ident()
+            self.begin(client, seconds, cmd.get("cpu", True), cmd.get("memory", True), thread_id,
+                       max(interval, MIN_INTERVAL))
+
+    def begin(self, client, seconds, cpu=True, memory=True, thread_id=None, interval=SAMPLE_INTERVAL):
+        with self.lock:
+            if self.started is not None:
+                print("🔬 Profiling already running")
+                return
+            self.started = time.time()
+            if cpu:
+                self.sampler = Sampler(thread_id, interval)
+            if memory and not tracemalloc.is_tracing():
+                tracemalloc.start(TRACE_FRAMES)
+            self.timer = threading.Timer(seconds, self.finish, (client,))
+            self.timer.daemon = True
+            self.timer.start()
+        print(f"🔬 Profiling {self.component} for {seconds:.0f}s (cpu={bool(cpu)}, memory={bool(memory)})")
+
+    def finish(self, client):
+        with self.lock:
+            if self.started is None:
+                return
+            if self.timer:
+                self.timer.cancel()
+            sampler, self.sampler = self.sampler, None
+            snapshot = None
+            if tracemalloc.is_tracing():
+                snapshot = tracemalloc.take_snapshot()
+                tracemalloc.stop()
+            if sampler:
+                sampler.stop()
+            base = os.path.join(self.out_dir, f"{self.component}-{time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started))}")
+            elapsed = time.time() - self.started
+            self.started = None
+
+        os.makedirs(self.out_dir, exist_ok=True)
+        files = []
+        report = [f"{self.component}: {elapsed:.1f}s session"]
+        if sampler:
+            sampler.write(base + ".collapsed")
+            files.append(base + ".collapsed")
+            report += ["", f"CPU: {sampler.samples} samples, self time by function"] + sampler.top()
+        if snapshot:
+            snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+            snapshot.dump(base + ".tracemalloc")
+            files.append(base + ".tracemalloc")
+            report += ["", "Memory: top allocators (live at the end of the session)"]
+            report += [str(stat) for stat in snapshot.statistics("lineno")[:TOP]]
+        with open(base + ".txt", "w") as f:
+            f.write("\n".join(report) + "\n")
+        files.append(base + ".txt")
+        print(f"🔬 Profile written: {', '.join(files)}")
+        if client is not None:
+            client.publish(self.done_topic, json.dumps({"files": files, "seconds": round(elapsed, 1)}))
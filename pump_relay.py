@@ -1,78 +1,152 @@
-import time, json
-import paho.mqtt.client as mqtt
-
-BROKER = "broker.hivemq.com"
-PORT = 1883
-CMD_TOPIC = "aquarium/pump"          # Commands: ON / OFF / AUTO
-STATUS_TOPIC = "aquarium/pump/status"
-LEVEL_TOPIC = "aquarium/water_level"
-
-pump_on = False
-auto_mode = True
-current_level = 50
-
-# Safety threshold
-DANGEROUSLY_LOW = 10   # %
-
-def publish_status(client):
-    status_msg = json.dumps({
-        "mode": "AUTO" if auto_mode else "MANUAL",
-        "state": "ON" if pump_on else "OFF"
-    })
-    client.publish(STATUS_TOPIC, status_msg, retain=True)
-    print("Pump status published:", status_msg)
-
-def on_message(client, userdata, msg):
-    global pump_on, auto_mode, current_level
-    if msg.topic == CMD_TOPIC:
-        cmd = msg.payload.decode().strip().upper()
-        if cmd == "ON":
-            pump_on = True
-            auto_mode = False
-            print("Pump forced ON (manual)")
-        elif cmd == "OFF":
-            pump_on = False
-            auto_mode = False
-            print("Pump forced OFF (manual)")
-        elif cmd == "AUTO":
-            auto_mode = True
-            print("Pump back to AUTO mode")
-        publish_status(client)
-
-    elif msg.topic == LEVEL_TOPIC:
-        try:
-            current_level = json.loads(msg.payload.decode())["level"]
-        except:
-            pass
+import time, json, sys
+import codec
+from latency import LatencyStats
+from metrics import Metrics
+from profiler import Profiler
+from mqtt_config import BROKER, PORT, make_client
+from rules import RuleSet, RuleWatcher, rules_path
+from tanks import tank_topic
+
+# Safety logic runs as soon as a reading arrives; the timer only re-publishes
+# the (retained) status and the actuation latency summary as a heartbeat
+HEARTBEAT_INTERVAL = 10
+
+class PumpRelay:
+    """Pump relay for one tank ("" = the default aquarium/... topics)."""
+
+    def __init__(self, tank_id="", verbose=True, rules=None, metrics=None):
+        self.tank_id = tank_id
+        self.cmd_topic = tank_topic(tank_id, "pump")          # Commands: ON / OFF / AUTO
+        self.status_topic = tank_topic(tank_id, "pump/status")
+        self.level_topic = tank_topic(tank_id, "water_level")
+        self.latency_topic = tank_topic(tank_id, "pump/latency")
+        self.topics = [self.cmd_topic, self.level_topic, self.level_topic + codec.BATCH_SUFFIX]
+        self.interval = HEARTBEAT_INTERVAL
+        self.verbose = verbose
+
+        self.pump_on = False
+        self.auto_mode = True
+        self.current_level = 50
+
+        # Reading received -> status published, for readings that changed the pump
+        self.actuation = LatencyStats()
+
+        # Handler latency (and so message count) per topic suffix; shared when hosted, see device_host.py
+        self.metrics = metrics or Metrics("pump" + (f"-{tank_id}" if tank_id else ""))
+        suffixes = {self.cmd_topic: "pump", self.level_topic: "water_level",
+                    self.level_topic + codec.BATCH_SUFFIX: "water_level/batch"}
+        self.handler_latency = {t: self.metrics.histogram("handler", s) for t, s in suffixes.items()}
+
+        # Water level rules (actions "pump_safety" / "pump_full"), see rules.py
+        self.set_rules(rules or RuleSet())
+
+    def set_rules(self, rules):
+        self.rules = rules.table(self.tank_id).get("water_level", ())
+
+    def log(self, *args):
+        if self.verbose:
+            print(*args)
+
+    def publish_status(self, client):
+        status_msg = codec.encode_status(
+            "AUTO" if self.auto_mode else "MANUAL",
+            "ON" if self.pump_on else "OFF"
+        )
+        client.publish(self.status_topic, status_msg, retain=True)
+        self.log("Pump status published:", codec.to_text(status_msg))
+
+    def start(self, client):
+        self.log("Pump relay running")
+        self.publish_status(client)  # ✅ Send initial state on startup
+
+    def on_message(self, client, userdata, msg):
+        received = time.perf_counter()
+        self.handle(client, msg, received)
+        h = self.handler_latency.get(msg.topic)
+        if h is not None and self.metrics.enabled:
+            h.observe(time.perf_counter() - received)
+
+    def handle(self, client, msg, received):
+        if msg.topic == self.cmd_topic:
+            cmd = msg.payload.decode().strip().upper()
+            if cmd == "ON":
+                self.pump_on = True
+                self.auto_mode = False
+                self.log("Pump forced ON (manual)")
+            elif cmd == "OFF":
+                self.pump_on = False
+                self.auto_mode = False
+                self.log("Pump forced OFF (manual)")
+            elif cmd == "AUTO":
+                self.auto_mode = True
+                self.log("Pump back to AUTO mode")
+            self.publish_status(client)
+
+        elif msg.topic == self.level_topic:
+            try:
+                self.current_level = codec.decode(msg.payload)["level"]
+            except:
+                return
+            self.evaluate(client, received)
+
+        elif msg.topic == self.level_topic + codec.BATCH_SUFFIX:
+            try:
+                self.current_level = codec.decode(msg.payload)["level"][-1][1]  # newest sample
+            except:
+                return
+            self.evaluate(client, received)
+
+    def evaluate(self, client, received):
+        changed = False
+        level = self.current_level
+
+        for rule in self.rules:
+            # Safety override
+            if rule.action == "pump_safety":
+                if not self.auto_mode and rule.test(level):
+                    self.auto_mode = True
+                    self.pump_on = True
+                    self.log(f"⚠️ Safety override → Pump back to AUTO (low water, {rule.name})")
+                    changed = True
+
+            elif rule.action == "pump_full":
+                if self.auto_mode and self.pump_on and rule.test(level):
+                    self.pump_on = False
+                    self.log("💧 Water full → Pump auto OFF")
+                    changed = True
+
+        if changed:
+            self.publish_status(client)
+            latency = time.perf_counter() - received
+            self.actuation.record(latency)
+            self.metrics.observe("actuation", "pump", latency)
+
+    def tick(self, client):
+        # Heartbeat
+        self.publish_status(client)
+        if self.actuation.count:
+            summary = self.actuation.summary()
+            client.publish(self.latency_topic, json.dumps(summary))
+            self.log("Pump actuation latency:", summary)
+        self.metrics.report(client)
 
 def main():
-    global pump_on, auto_mode, current_level
-    client = mqtt.Client()
-    client.on_message = on_message
+    rules_file = rules_path(sys.argv[1] if len(sys.argv) > 1 else None)
+    relay = PumpRelay(rules=RuleSet.load(rules_file))
+    RuleWatcher(rules_file, relay.set_rules)
+    client = make_client()
+    client.on_message = relay.on_message
     client.connect(BROKER, PORT, 60)
-    client.subscribe(CMD_TOPIC)
-    client.subscribe(LEVEL_TOPIC)
+    for topic in relay.topics:
+        client.subscribe(topic)
+    Profiler(relay.metrics.component).attach(client)  # $profile/<component> starts a profiling session
 
-    print("Pump relay running")
-    publish_status(client)  # ✅ Send initial state on startup
+    relay.start(client)
+    client.loop_start()  # readings and commands are handled as they arrive
 
     while True:
-        client.loop(timeout=0.1)
-
-        # Safety override
-        if not auto_mode and current_level < DANGEROUSLY_LOW:
-            auto_mode = True
-            pump_on = True
-            print("⚠️ Safety override → Pump back to AUTO (low water)")
-            publish_status(client)
-
-        if auto_mode:
-            if pump_on and current_level >= 100:
-                pump_on = False
-                print("💧 Water full → Pump auto OFF")
-                publish_status(client)
-
-        time.sleep(3)
+        time.sleep(relay.interval)
+        relay.tick(client)
 
 if __name__ == "__main__":
     main()
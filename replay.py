@@ -0,0 +1,243 @@
+import argparse, difflib, json, os, sqlite3, sys, tempfile, threading, time
+import db_schema, codec, log_viewer
+import aquarium_manager as manager
+from mqtt_config import BROKER, PORT, make_client
+from log_writer import LogWriter, QUEUE_SIZE
+from state_cache import LastValues
+from rules import RuleSet, RULES_FILE, rules_path
+from tanks import tank_topic, split_topic
+
+# Replays recorded sensor/relay traffic from iot.db through the manager and reports
+# what it decided (pump commands, alarms), e.g. to reproduce an incident or to check
+# that a rules or code change doesn't alter behaviour on real history.
+#
+#   in-process (default): calls aquarium_manager.on_message directly, with
+#                         db_schema.clock set to each message's recorded timestamp
+#   --broker:             publishes to the broker for a separately running manager
+#                         and listens for its outputs
+#
+# --speed 1 is real time, 60 one recorded minute per second, 0 as fast as possible.
+INPUTS = ("temp", "water_level", "pump/status", "lamp/status", "feed")
+OUTPUTS = ("pump", "alarm")
+VALUE_KEYS = {"temp": "temp", "water_level": "level"}
+SETTLE = 2          # broker mode: seconds to wait for the manager's last outputs
+DIFF_LINES = 50     # changed events printed by --diff
+REPORT_FILE = "replay_report.json"
+
+class VirtualClock:
+    """db_schema.clock stand-in: the recorded time of the message being replayed."""
+
+    def __init__(self):
+        self.ms = 0
+
+    def __call__(self):
+        return self.ms / 1000
+
+class Message:
+    __slots__ = ("topic", "payload")
+
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+class Capture:
+    """Takes the place of the manager's MQTT client in-process and keeps its outputs."""
+
+    def __init__(self):
+        self.events = []
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        if split_topic(topic, OUTPUTS):
+            self.events.append([db_schema.now_ms(), topic, codec.to_text(payload)])
+
+def payload_of(suffix, value, payload):
+    # Readings are stored as bare numbers; rebuild the sensor's {"temp": ...} message
+    if payload is None and value is not None and suffix in VALUE_KEYS:
+        return json.dumps({VALUE_KEYS[suffix]: int(value) if value.is_integer() else value}).encode()
+    if suffix.endswith("status") and payload in ("ON", "OFF"):
+        return codec.encode_status("AUTO", payload, binary=False).encode()  # relays before status JSON
+    return db_schema.join_value(value, payload).encode()
+
+def messages(conn, since=None, until=None):
+    """(ts, topic, payload bytes) of recorded manager inputs, in timestamp order."""
+    names = dict(conn.execute("SELECT id, name FROM topics"))
+    suffixes = {}
+    for tid, name in names.items():
+        parts = split_topic(name, INPUTS)
+        if parts:
+            suffixes[tid] = parts[1]
+    # One stream over all topics is cheaper than merging one per topic; filter here
+    for rows in log_viewer.iter_rows(conn, None, since, until):
+        for ts, _, tid, value, payload in rows:
+            suffix = suffixes.get(tid)
+            if suffix:
+                yield ts, names[tid], payload_of(suffix, value, payload)
+
+def recorded_outputs(conn, since=None, until=None):
+    """Pump commands and alarms that were recorded in the same range, for comparison."""
+    counts = dict.fromkeys(OUTPUTS, 0)
+    for tid, name in conn.execute("SELECT id, name FROM topics"):
+        parts = split_topic(name, OUTPUTS)
+        if parts:
+            for rows in log_viewer.iter_rows(conn, [tid], since, until):
+                counts[parts[1]] += len(rows)
+    return {"pump_commands": counts["pump"], "alarms": counts["alarm"]}
+
+def pace(ts, first_ts, wall0, speed):
+    if speed:
+        delay = wall0 + (ts - first_ts) / 1000 / speed - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+def run_inprocess(conn, since, until, speed, rules_file, out_db=None):
+    workdir = tempfile.mkdtemp(prefix="aquarium-replay-")
+    clock = VirtualClock()
+    db_schema.clock = clock
+    manager.ECHO_LOGS = False
+    manager.fleet.reload(RuleSet.load(rules_file))
+    manager.writer = LogWriter(out_db or os.path.join(workdir, "replay.db"))
+    manager.alarms.store = manager.writer.set_alarm
+    manager.cache = LastValues(os.path.join(workdir, "state.json"))
+    client = Capture()
+
+    n, first, span = 0, None, 0
+    wall0 = time.monotonic()
+    try:
+        for ts, topic, payload in messages(conn, since, until):
+            if first is None:
+                first = ts
+            pace(ts, first, wall0, speed)
+            clock.ms = ts
+            manager.on_message(client, None, Message(topic, payload))
+            n += 1
+            span = ts - first
+            if n % 1000 == 0:
+                # Hold the replay back rather than let the writer drop rows
+                while manager.writer.depth() > QUEUE_SIZE // 2:
+                    time.sleep(0.001)
+        elapsed = time.monotonic() - wall0
+    finally:
+        db_schema.clock = time.time
+        manager.writer.close()
+    stats = {"alarms": manager.alarms.stats(), "writer": manager.writer.stats(),
+             "tanks": len(manager.fleet.tanks), "out_db": manager.writer.db_file}
+    return n, span, elapsed, client.events, stats
+
+def run_broker(conn, since, until, speed):
+    events = []
+    current = [0]  # recorded ts of the last message sent; outputs are stamped with it
+    ready = threading.Event()
+
+    def on_message(client, userdata, msg):
+        events.append([current[0], msg.topic, codec.to_text(msg.payload)])
+
+    client = make_client()
+    client.on_message = on_message
+    client.on_subscribe = lambda *args: ready.set()
+    client.connect(BROKER, PORT, 60)
+    client.subscribe([(tank_topic(t, s), 0) for t in ("", "+") for s in OUTPUTS])
+    client.loop_start()
+    ready.wait(5)
+
+    n, first, span, info = 0, None, 0, None
+    wall0 = time.monotonic()
+    for ts, topic, payload in messages(conn, since, until):
+        if first is None:
+            first = ts
+        pace(ts, first, wall0, speed)
+        current[0] = ts
+        info = client.publish(topic, payload)
+        n += 1
+        span = ts - first
+        if n % 1000 == 0:
+            info.wait_for_publish(timeout=10)  # don't queue the whole history in memory
+    if info:
+        info.wait_for_publish(timeout=10)
+    elapsed = time.monotonic() - wall0
+    time.sleep(SETTLE)
+    client.loop_stop()
+    client.disconnect()
+    return n, span, elapsed, events, {}
+
+def diff(report, previous):
+    """Changed pump commands / alarms against an earlier report, as '-' / '+' lines."""
+    # In-process runs are deterministic down to the timestamp; over a broker only the order is
+    timed = report["mode"] == previous.get("mode") == "inprocess"
+    key = (lambda e: f"{e[0]} {e[1]} {e[2]}") if timed else (lambda e: f"{e[1]} {e[2]}")
+    old, new = previous.get("events", []), report["events"]
+    lines = []
+    matcher = difflib.SequenceMatcher(None, [key(e) for e in old], [key(e) for e in new], autojunk=False)
+    for op, i1, i2, j1, j2 in matcher.get_opcodes():
+        if op == "equal":
+            continue
+        lines += [f"- {db_schema.format_ts(ts)} {topic}: {text}" for ts, topic, text in old[i1:i2]]
+        lines += [f"+ {db_schema.format_ts(ts)} {topic}: {text}" for ts, topic, text in new[j1:j2]]
+    return lines
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay recorded iot.db traffic through the manager")
+    ap.add_argument("--db", default=db_schema.DB_FILE, help="recorded database")
+    ap.add_argument("--since", help="start time (same formats as log_viewer.py)")
+    ap.add_argument("--until", help="end time")
+    ap.add_argument("--speed", type=float, default=0, help="x real time (1 = real time, 0 = as fast as possible)")
+    ap.add_argument("--broker", action="store_true",
+                    help="publish to the broker for a running manager instead of replaying in-process")
+    ap.add_argument("--rules", help=f"rules file for the in-process manager (default {RULES_FILE})")
+    ap.add_argument("--out-db", help="keep the in-process manager's database here (default: temp dir)")
+    ap.add_argument("--out", default=REPORT_FILE, help="report file")
+    ap.add_argument("--diff", help="earlier report to compare pump commands and alarms against")
+    args = ap.parse_args()
+
+    since, until = log_viewer.parse_time(args.since), log_viewer.parse_time(args.until)
+    conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    if not db_schema.partitions(conn):
+        sys.exit(f"No samples in {args.db} (run migrate_db.py on an older database first)")
+    mode = "broker" if args.broker else "inprocess"
+    if args.broker:
+        n, span, elapsed, events, stats = run_broker(conn, since, until, args.speed)
+    else:
+        n, span, elapsed, events, stats = run_inprocess(conn, since, until, args.speed, rules_path(args.rules),
+                                                        args.out_db)
+
+    pumps = sum(1 for e in events if split_topic(e[1], ("pump",)))
+    report = {
+        "mode": mode,
+        "db": args.db,
+        "since": since,
+        "until": until,
+        "speed": args.speed,
+        "messages": n,
+        "span_s": round(span / 1000, 1),
+        "elapsed_s": round(elapsed, 3),
+        "msgs_per_s": round(n / elapsed) if elapsed else None,
+        "x_real_time": round(span / 1000 / elapsed, 1) if elapsed else None,
+        "pump_commands": pumps,
+        "alarms": len(events) - pumps,
+        "recorded": recorded_outputs(conn, since, until),
+        "manager": stats,
+        "events": events,
+    }
+    conn.close()
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=1)
+
+    print(f"▶️ Replayed {n} messages ({report['span_s']} s recorded) in {elapsed:.2f} s: "
+          f"{report['msgs_per_s']} msgs/s, {report['x_real_time']}x real time")
+    print(f"   pump commands: {pumps} (recorded {report['recorded']['pump_commands']}) | "
+          f"alarms: {report['alarms']} (recorded {report['recorded']['alarms']})")
+    print(f"📄 Report written to {args.out}")
+
+    if args.diff:
+        with open(args.diff) as f:
+            lines = diff(report, json.load(f))
+        for line in lines[:DIFF_LINES]:
+            print(line)
+        if len(lines) > DIFF_LINES:
+            print(f"... {len(lines) - DIFF_LINES} more")
+        if lines:
+            print(f"❌ {len(lines)} changed events against {args.diff}")
+            sys.exit(1)
+        print("✅ Same pump commands and alarms as", args.diff)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import argparse, json, os, sqlite3, threading, time
+import db_schema, archive
+from local_broker import topic_matches
+
+# Retention per topic pattern (MQTT wildcards, first match wins), in days.
+# Override with a JSON file of the same shape: {"aquarium/+/alarm": 365, "#": 30}
+RETENTION_FILE = "retention.json"
+DEFAULT_RETENTION = {
+    "aquarium/alarm": 365,
+    "aquarium/+/alarm": 365,
+    "aquarium/pump/status": 90,
+    "aquarium/+/pump/status": 90,
+    "aquarium/lamp/status": 90,
+    "aquarium/+/lamp/status": 90,
+    "#": 30,
+}
+PRUNE_INTERVAL = 3600   # seconds between background prune passes in the manager
+DELETE_CHUNK = 5000     # rows per delete transaction (keeps each write lock short)
+VACUUM_PAGES = 1000     # pages released per incremental_vacuum step
+
+def load_policy(path=RETENTION_FILE):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return dict(DEFAULT_RETENTION)
+
+def retention_days(policy, topic):
+    for pattern, days in policy.items():
+        if topic_matches(pattern, topic):
+            return days
+    return None  # no match: keep forever
+
+def prune(db_file=db_schema.DB_FILE, archive_dir=archive.ARCHIVE_DIR, policy=None,
+          now_ms=None, dry_run=False, verbose=True):
+    """Archive and remove samples past their retention.
+
+    Runs on its own connection in short transactions: a whole expired day is one
+    DROP TABLE; topics that expire earlier than the rest of their day are deleted
+    together, DELETE_CHUNK rows at a time. The manager's writer only waits for one
+    step. Nothing is removed before its archive file is synced to disk, and today's
+    partition is never touched.
+    """
+    policy = load_policy() if policy is None else policy
+    today = db_schema.partition_day(db_schema.now_ms() if now_ms is None else now_ms)
+    conn = db_schema.connect(db_file)
+    names = dict(conn.execute("SELECT id, name FROM topics"))
+    keep = {tid: retention_days(policy, name) for tid, name in names.items()}
+    os.makedirs(archive_dir, exist_ok=True)
+    stats = {"partitions_dropped": 0, "rows_archived": 0, "rows_deleted": 0, "pages_freed": 0}
+
+    for day, table in db_schema.partitions(conn):
+        if day is None:
+            if verbose:
+                print(f"⚠️ Legacy '{table}' table is not pruned; run migrate_db.py to partition it")
+            continue
+        if day >= today:
+            continue
+        present = [tid for (tid,) in conn.execute(f"SELECT DISTINCT topic_id FROM {table}")]
+        expired = [tid for tid in present
+                   if keep.get(tid) is not None and day < today - keep[tid]]
+        if not expired:
+            continue
+        whole = len(expired) == len(present)
+        if verbose:
+            what = "whole partition" if whole else f"{len(expired)}/{len(present)} topics"
+            print(f"🗄️ {table}: archiving {what}")
+        if dry_run:
+            continue
+
+        # 1. Archive (reads only; the writer is never blocked by this). write() returns
+        #    once the file is fsynced, so a crash after this point loses no rows
+        blocks = ((names[tid], conn.execute(f"SELECT ts, value, payload FROM {table} "
+                                            f"WHERE topic_id=? ORDER BY ts", (tid,)).fetchall())
+                  for tid in expired)
+        path = os.path.join(archive_dir, archive.file_name(table, expired))
+        stats["rows_archived"] += archive.write(path, blocks)
+
+        # 2. Remove from the database
+        if whole:
+            conn.execute(f"DROP TABLE {table}")
+            conn.commit()
+            stats["partitions_dropped"] += 1
+        else:
+            marks = ",".join("?" * len(expired))
+            while True:
+                n = conn.execute(f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} "
+                                 f"WHERE topic_id IN ({marks}) LIMIT {DELETE_CHUNK})", expired).rowcount
+                conn.commit()
+                stats["rows_deleted"] += n
+                if n < DELETE_CHUNK:
+                    break
+                time.sleep(0)  # let the writer take the lock between chunks
+
+    # 3. Hand the freed pages back to the filesystem a step at a time
+    if not dry_run:
+        stats["pages_freed"] = incremental_vacuum(conn)
+    conn.close()
+    if verbose:
+        print(f"✅ Prune: {stats}")
+    return stats
+
+def incremental_vacuum(conn, pages=VACUUM_PAGES):
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return 0  # database created before auto_vacuum=INCREMENTAL; see `retention.py vacuum`
+    freed = 0
+    while True:
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if not free:
+            return freed
+        # executescript steps the pragma to completion (execute() frees a single page)
+        conn.executescript(f"PRAGMA incremental_vacuum({pages})")
+        freed += min(free, pages)
+        time.sleep(0)
+
+def enable_incremental_vacuum(db_file=db_schema.DB_FILE):
+    """One-off full VACUUM that switches an existing database to incremental vacuum."""
+    conn = sqlite3.connect(db_file)
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("VACUUM")
+    conn.close()
+
+class Pruner:
+    """Background prune pass every `interval` seconds (used by the manager)."""
+
+    def __init__(self, db_file, archive_dir=archive.ARCHIVE_DIR, policy_file=RETENTION_FILE,
+                 interval=PRUNE_INTERVAL):
+        self.db_file = db_file
+        self.archive_dir = archive_dir
+        self.policy_file = policy_file
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                prune(self.db_file, self.archive_dir, load_policy(self.policy_file), verbose=False)
+            except (sqlite3.Error, OSError, ValueError) as e:
+                print("Retention pass failed:", e)
+
+    def stop(self):
+        self._stop.set()
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Retention and archival for iot.db")
+    ap.add_argument("--db", default=db_schema.DB_FILE)
+    ap.add_argument("--archive", default=archive.ARCHIVE_DIR, help="archive directory")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("prune", help="archive and remove expired samples")
+    p.add_argument("--policy", default=RETENTION_FILE, help="retention JSON file")
+    p.add_argument("--dry-run", action="store_true")
+    sub.add_parser("list", help="show partitions and archive files")
+    sub.add_parser("vacuum", help="switch an existing database to incremental vacuum (one full VACUUM)")
+    args = ap.parse_args()
+
+    if args.cmd == "prune":
+        prune(args.db, args.archive, load_policy(args.policy), dry_run=args.dry_run)
+    elif args.cmd == "vacuum":
+        enable_incremental_vacuum(args.db)
+        print("✅ Incremental vacuum enabled")
+    else:
+        conn = db_schema.connect(args.db)
+        for day, table in db_schema.partitions(conn):
+            n = conn.execute(f"SELECT count(*) FROM {table}").fetchone()[0]
+            print(f"{table:20s} {n:10d} rows")
+        conn.close()
+        for day, path in archive.files(args.archive):
+            print(f"{path:40s} {os.path.getsize(path):10d} bytes")
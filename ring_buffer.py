@@ -0,0 +1,208 @@
+import math, threading
+from array import array
+from bisect import bisect_left, bisect_right
+
+class RingBuffer:
+    """Fixed-capacity (timestamp, value) history backed by preallocated arrays.
+
+    Appends may come from the MQTT thread while the GUI thread reads; both
+    sides take the same lock. Samples are kept in timestamp order: a late one
+    (a batch behind a live reading, backfill overlapping live data) is
+    inserted in place, and only dropped if it is older than everything kept.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.ts = array("d", bytes(8 * capacity))
+        self.values = array("d", bytes(8 * capacity))
+        self.start = 0      # index of the oldest sample
+        self.size = 0
+        self.version = 0    # bumped on every append, lets readers skip redraws
+        self.late = 0       # samples dropped for being older than the whole buffer
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.size
+
+    def full(self):
+        return self.size == self.capacity
+
+    def append(self, ts, value):
+        with self.lock:
+            cap = self.capacity
+            k = self.size
+            if k and ts < self.ts[(self.start + k - 1) % cap]:
+                k = bisect_right(range(self.size), ts, key=self._at)
+                if k == 0 and self.size == cap:
+                    self.late += 1
+                    return
+            if self.size == cap:
+                self.start = (self.start + 1) % cap  # overwrite the oldest
+                self.size -= 1
+                k -= 1
+            start, tss, values = self.start, self.ts, self.values
+            for j in range(self.size, k, -1):  # make room; nothing moves for in-order samples
+                dst, src = (start + j) % cap, (start + j - 1) % cap
+                tss[dst] = tss[src]
+                values[dst] = values[src]
+            i = (start + k) % cap
+            tss[i] = ts
+            values[i] = value
+            self.size += 1
+            self.version += 1
+
+    def first(self):
+        with self.lock:
+            return self.ts[self.start] if self.size else None
+
+    def last(self):
+        with self.lock:
+            if not self.size:
+                return None
+            i = (self.start + self.size - 1) % self.capacity
+            return self.ts[i], self.values[i]
+
+    def _at(self, k):
+        return self.ts[(self.start + k) % self.capacity]
+
+    def decimate(self, t0, t1, columns):
+        """Min/max per column for `columns` equal time slices of [t0, t1).
+
+        Returns (lo, hi, before): lists with None for empty columns, and the
+        value of the last sample older than t0 (or None).
+        """
+        lo = [None] * columns
+        hi = [None] * columns
+        before = None
+        if t1 <= t0 or columns <= 0:
+            return lo, hi, before
+        scale = columns / (t1 - t0)
+        with self.lock:
+            cap, start, ts, values = self.capacity, self.start, self.ts, self.values
+            first = bisect_left(range(self.size), t0, key=self._at)
+            if first:
+                before = values[(start + first - 1) % cap]
+            for k in range(first, self.size):
+                i = (start + k) % cap
+                col = int((ts[i] - t0) * scale)
+                if col >= columns:
+                    break
+                v = values[i]
+                if lo[col] is None:
+                    lo[col] = hi[col] = v
+                elif v < lo[col]:
+                    lo[col] = v
+                elif v > hi[col]:
+                    hi[col] = v
+        return lo, hi, before
+
+class MinMaxBuckets:
+    """Min, max and last value per `bucket` seconds over the last `window` seconds.
+
+    Direct-mapped (slot = bucket number % slots), so samples may arrive in any
+    order; a slot is reset when a newer bucket takes it over.
+    """
+
+    def __init__(self, window, bucket):
+        self.bucket = bucket
+        self.slots = math.ceil(window / bucket) + 1
+        self.key = array("q", [-1]) * self.slots   # bucket number in each slot, -1 = empty
+        self.lo = array("d", bytes(8 * self.slots))
+        self.hi = array("d", bytes(8 * self.slots))
+        self.last = array("d", bytes(8 * self.slots))
+        self.last_ts = array("d", bytes(8 * self.slots))
+        self.lock = threading.Lock()
+
+    def add(self, ts, value):
+        n = int(ts // self.bucket)
+        i = n % self.slots
+        with self.lock:
+            key = self.key[i]
+            if key > n:
+                return  # older than the window
+            if key < n:
+                self.key[i] = n
+                self.lo[i] = self.hi[i] = self.last[i] = value
+                self.last_ts[i] = ts
+                return
+            if value < self.lo[i]:
+                self.lo[i] = value
+            elif value > self.hi[i]:
+                self.hi[i] = value
+            if ts >= self.last_ts[i]:
+                self.last[i] = value
+                self.last_ts[i] = ts
+
+    def decimate(self, t0, t1, columns):
+        """Same as RingBuffer.decimate, at bucket resolution; a bucket that
+        starts before t0 counts as `before`."""
+        lo = [None] * columns
+        hi = [None] * columns
+        before = None
+        if t1 <= t0 or columns <= 0:
+            return lo, hi, before
+        scale = columns / (t1 - t0)
+        b, slots = self.bucket, self.slots
+        first = int(t0 // b)
+        with self.lock:
+            key, blo, bhi = self.key, self.lo, self.hi
+            for n in range(int(t1 // b) - slots + 1, first + 1):
+                if key[n % slots] == n:
+                    before = self.last[n % slots]
+            for n in range(first + 1, int(t1 // b) + 1):
+                i = n % slots
+                if key[i] != n:
+                    continue
+                col = int((n * b - t0) * scale)
+                if col >= columns:
+                    break
+                if lo[col] is None:
+                    lo[col], hi[col] = blo[i], bhi[i]
+                else:
+                    lo[col] = min(lo[col], blo[i])
+                    hi[col] = max(hi[col], bhi[i])
+        return lo, hi, before
+
+class History:
+    """Chart history in two tiers: the last `capacity` raw samples, and min/max
+    buckets for the whole `window`, used where the raw samples don't reach."""
+
+    def __init__(self, capacity, window, bucket):
+        self.recent = RingBuffer(capacity)
+        self.buckets = MinMaxBuckets(window, bucket)
+
+    @property
+    def version(self):
+        return self.recent.version
+
+    def append(self, ts, value):
+        self.buckets.add(ts, value)
+        self.recent.append(ts, value)
+
+    def extend(self, samples):
+        """Add [(ts, value), ...] in timestamp order; only the tail goes to the raw tier."""
+        for ts, value in samples:
+            self.buckets.add(ts, value)
+        for ts, value in samples[-self.recent.capacity:]:
+            self.recent.append(ts, value)
+
+    def last(self):
+        return self.recent.last()
+
+    def decimate(self, t0, t1, columns):
+        lo, hi, before = self.recent.decimate(t0, t1, columns)
+        split = self.recent.first()
+        if not self.recent.full() or split is None or split <= t0:
+            return lo, hi, before  # the raw samples cover the whole range
+        # Columns that start before the oldest raw sample: fill in from the buckets
+        b_lo, b_hi, b_before = self.buckets.decimate(t0, t1, columns)
+        scale = columns / (t1 - t0)
+        for col in range(min(columns, int((split - t0) * scale) + 1)):
+            if b_lo[col] is None:
+                continue
+            if lo[col] is None:
+                lo[col], hi[col] = b_lo[col], b_hi[col]
+            else:
+                lo[col] = min(lo[col], b_lo[col])
+                hi[col] = max(hi[col], b_hi[col])
+        return lo, hi, b_before if before is None else before
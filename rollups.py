@@ -0,0 +1,119 @@
+import sys, time
+import db_schema
+
+# Per-minute and per-hour aggregates for numeric sensor topics.
+# A bucket is the integer `ts_ms // width`; days are derived from hour buckets (UTC).
+ROLLUP_SUFFIXES = ("temp", "water_level")
+RESOLUTIONS = {"minute": 60_000, "hour": 3_600_000}
+TABLES = {"minute": "rollup_minute", "hour": "rollup_hour"}
+DAY_MS = 86_400_000
+
+UPSERT = """INSERT INTO {table} (topic_id, bucket, count, min, max, sum) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT(topic_id, bucket) DO UPDATE SET
+    count = count + excluded.count,
+    min = min(min, excluded.min),
+    max = max(max, excluded.max),
+    sum = sum + excluded.sum"""
+
+def is_rollup_topic(topic):
+    return topic.startswith("aquarium/") and topic.rsplit("/", 1)[-1] in ROLLUP_SUFFIXES
+
+class RollupBatch:
+    """Pre-aggregates one write batch in memory, then upserts one row per bucket."""
+
+    def __init__(self):
+        self.buckets = {res: {} for res in RESOLUTIONS}
+
+    def add(self, topic_id, ts, value):
+        for res, width in RESOLUTIONS.items():
+            key = (topic_id, ts // width)
+            agg = self.buckets[res].get(key)
+            if agg is None:
+                self.buckets[res][key] = [1, value, value, value]
+            else:
+                agg[0] += 1
+                if value < agg[1]: agg[1] = value
+                if value > agg[2]: agg[2] = value
+                agg[3] += value
+
+    def flush(self, conn):
+        for res, aggs in self.buckets.items():
+            if aggs:
+                conn.executemany(UPSERT.format(table=TABLES[res]),
+                                 [(tid, b, c, lo, hi, s) for (tid, b), (c, lo, hi, s) in aggs.items()])
+                aggs.clear()
+
+def query(conn, topic, resolution="hour", start_ms=None, end_ms=None):
+    """Yield (bucket_start_ms, count, min, max, avg) from the rollup tables only."""
+    tid = db_schema.TopicIds(conn).lookup(topic)
+    if tid is None:
+        return
+    width = DAY_MS if resolution == "day" else RESOLUTIONS[resolution]
+    table = TABLES["hour" if resolution == "day" else resolution]
+    src = RESOLUTIONS["hour" if resolution == "day" else resolution]
+    lo = 0 if start_ms is None else start_ms // src
+    hi = (1 << 62) if end_ms is None else end_ms // src
+
+    if resolution == "day":
+        cur = conn.execute(f"""SELECT bucket * {src} / {DAY_MS}, SUM(count), MIN(min), MAX(max), SUM(sum)
+                               FROM {table} WHERE topic_id=? AND bucket BETWEEN ? AND ?
+                               GROUP BY bucket * {src} / {DAY_MS} ORDER BY 1""", (tid, lo, hi))
+    else:
+        cur = conn.execute(f"""SELECT bucket, count, min, max, sum FROM {table}
+                               WHERE topic_id=? AND bucket BETWEEN ? AND ? ORDER BY bucket""",
+                           (tid, lo, hi))
+    for bucket, count, mn, mx, total in cur:
+        yield bucket * width, count, mn, mx, total / count
+
+def backfill(db_file=db_schema.DB_FILE, chunk=5000):
+    """Rebuild both rollup tables from the sample partitions, one ordered pass over each index."""
+    conn = db_schema.connect(db_file)
+    topics = [(tid, name) for name, tid in conn.execute("SELECT name, id FROM topics") if is_rollup_topic(name)]
+    if not topics:
+        print("No rollup topics found.")
+        conn.close()
+        return 0
+
+    start = time.perf_counter()
+    conn.execute("DELETE FROM rollup_minute")
+    conn.execute("DELETE FROM rollup_hour")
+    marks = ",".join("?" * len(topics))
+    batch = RollupBatch()
+    total = 0
+    for _, table in db_schema.partitions(conn):
+        cur = conn.execute(f"""SELECT topic_id, ts, value FROM {table}
+                               WHERE topic_id IN ({marks}) AND value IS NOT NULL
+                               ORDER BY topic_id, ts""", [tid for tid, _ in topics])
+        while True:
+            rows = cur.fetchmany(chunk)
+            if not rows:
+                break
+            for tid, ts, value in rows:
+                batch.add(tid, ts, value)
+            total += len(rows)
+            # Rows arrive in (topic, ts) order, so at most one bucket per resolution
+            # is still open when a chunk ends; upserts merge it with the next chunk
+            # (or with the same bucket from another partition).
+            batch.flush(conn)
+    conn.commit()
+    conn.close()
+    print(f"✅ Rolled up {total} readings from {len(topics)} topics in {time.perf_counter() - start:.2f}s")
+    return total
+
+if __name__ == "__main__":
+    usage = ("Usage:\n"
+             "  python rollups.py backfill [db]\n"
+             "  python rollups.py query <topic> [minute|hour|day] [days_back]")
+    args = sys.argv[1:]
+    if args and args[0] == "backfill":
+        backfill(args[1] if len(args) > 1 else db_schema.DB_FILE)
+    elif len(args) >= 2 and args[0] == "query":
+        resolution = args[2] if len(args) > 2 else "hour"
+        days = float(args[3]) if len(args) > 3 else 30
+        conn = db_schema.connect()
+        since = db_schema.now_ms() - int(days * DAY_MS)
+        for ts, count, mn, mx, avg in query(conn, args[1], resolution, since):
+            print(f"[{db_schema.format_ts(ts)}] n={count} min={mn:.2f} max={mx:.2f} avg={avg:.2f}")
+        conn.close()
+    else:
+        print(usage)
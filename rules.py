@@ -0,0 +1,193 @@
+import json, os, threading, time
+
+# Rules file: every threshold the manager, relays and alarms act on.
+#   {"rules": {"<name>": {"topic": "temp", "op": ">", "value": 30, "action": "alarm"}, ...},
+#    "tanks": {"<tank_id>": {"<name>": 28, "<other name>": {...full rule...}}}}
+# "topic" is the suffix after aquarium/[<tank_id>/]; "action" says which component acts on it.
+# Per-tank entries replace a rule's value (number) or the whole rule (object).
+RULES_FILE = "rules.json"
+LEGACY_FILE = "tanks.json"  # the per-tank config before rules.json; same threshold keys still load
+RELOAD_INTERVAL = 2  # seconds between checks of the rules file for changes
+
+DEFAULT_RULES = {
+    # Manager
+    "high_temp":      {"topic": "temp", "op": ">", "value": 30, "action": "alarm"},
+    "low_temp":       {"topic": "temp", "op": "<", "value": 15, "action": "alarm"},
+    "low_water":      {"topic": "water_level", "op": "<", "value": 30, "action": "pump_on"},
+    "water_restored": {"topic": "water_level", "op": ">", "value": 80, "action": "pump_off"},
+    # Pump relay
+    "pump_danger":    {"topic": "water_level", "op": "<", "value": 10, "action": "pump_safety"},
+    "tank_full":      {"topic": "water_level", "op": ">=", "value": 100, "action": "pump_full"},
+    # Lamp relay
+    "lamp_danger":    {"topic": "temp", "op": "outside", "value": [10, 35], "action": "lamp_safety"},
+    "lamp_unsafe":    {"topic": "temp", "op": "outside", "value": [15, 30], "action": "lamp_safety"},
+}
+
+# tanks.json threshold names (the format before rules) -> rule names
+ALIASES = {
+    "max_temp": "high_temp",
+    "min_temp": "low_temp",
+    "min_water_level": "low_water",
+    "pump_off_threshold": "water_restored",
+}
+
+# op -> value -> predicate(reading)
+OPS = {
+    ">": lambda x: lambda v: v > x,
+    ">=": lambda x: lambda v: v >= x,
+    "<": lambda x: lambda v: v < x,
+    "<=": lambda x: lambda v: v <= x,
+    "==": lambda x: lambda v: v == x,
+    "!=": lambda x: lambda v: v != x,
+    "outside": lambda b: lambda v: v < b[0] or v > b[1],
+    "inside": lambda b: lambda v: b[0] <= v <= b[1],
+}
+
+class Rule:
+    """One compiled rule; `test(reading)` is the predicate."""
+    __slots__ = ("name", "topic", "op", "value", "action", "hysteresis", "test")
+
+    def __init__(self, name, topic, op, value, action, hysteresis=None):
+        if op not in OPS:
+            raise ValueError(f"rule {name}: unknown op {op!r}")
+        self.name = name
+        self.topic = topic
+        self.op = op
+        self.value = value
+        self.action = action
+        self.hysteresis = hysteresis
+        self.test = OPS[op](value)
+
+    @classmethod
+    def from_spec(cls, name, spec):
+        return cls(name, spec["topic"], spec["op"], spec["value"], spec.get("action", "alarm"),
+                   spec.get("hysteresis"))
+
+    def clear(self, v, h):
+        """True once the reading is `h` back inside the limit (raise/clear hysteresis)."""
+        x = self.value
+        if self.op in (">", ">="):
+            return v <= x - h
+        if self.op in ("<", "<="):
+            return v >= x + h
+        if self.op == "outside":
+            return x[0] + h <= v <= x[1] - h
+        return not self.test(v)
+
+def rules_path(path=None):
+    """The rules file a component was started with, or the default one.
+
+    Without an argument, an existing deployment's tanks.json is used (with a
+    warning) until it is renamed to rules.json.
+    """
+    if path:
+        return path
+    if not os.path.exists(RULES_FILE) and os.path.exists(LEGACY_FILE):
+        print(f"⚠️ No {RULES_FILE}, loading {LEGACY_FILE} (rename it to {RULES_FILE})")
+        return LEGACY_FILE
+    return RULES_FILE
+
+class RuleSet:
+    """Rules compiled into one {topic: (Rule, ...)} table per tank.
+
+    Tanks without overrides share the default table, so a message only ever
+    evaluates the few rules for its own topic. Every override is compiled up
+    front: a bad one fails the load (ValueError) instead of a later lookup.
+    """
+
+    def __init__(self, rules=None, tanks=None):
+        self.specs = dict(DEFAULT_RULES if rules is None else rules)
+        self.overrides = tanks or {}
+        try:
+            self.default = self._compile(self.specs)
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"bad rule spec: {e!r}") from e
+        self.tables = {tank_id: self._override(tank_id, override)
+                       for tank_id, override in self.overrides.items() if override}
+
+    @classmethod
+    def load(cls, path=RULES_FILE):
+        if not path or not os.path.exists(path):
+            return cls()
+        with open(path) as f:
+            cfg = json.load(f)
+        rules = dict(DEFAULT_RULES)
+        rules.update(cfg.get("rules", {}))
+        # tanks.json style {"defaults": {"max_temp": 30, ...}}
+        for key, value in cfg.get("defaults", {}).items():
+            name = ALIASES.get(key, key)
+            rules[name] = dict(rules[name], value=value)
+        tanks = {tank_id: {ALIASES.get(k, k): v for k, v in values.items()}
+                 for tank_id, values in cfg.get("tanks", {}).items()}
+        return cls(rules, tanks)
+
+    def _compile(self, specs):
+        table = {}
+        for name, spec in specs.items():
+            rule = Rule.from_spec(name, spec)
+            table.setdefault(rule.topic, []).append(rule)
+        return {topic: tuple(rules) for topic, rules in table.items()}
+
+    def _override(self, tank_id, override):
+        # Copy the default table and recompile only the overridden rules
+        t = dict(self.default)
+        for name, value in override.items():
+            old = self.specs.get(name)
+            if old is None and not isinstance(value, dict):
+                raise ValueError(f"tank {tank_id!r}: unknown rule {name!r} "
+                                 f"(a new rule needs a full spec with topic/op/value)")
+            try:
+                spec = value if isinstance(value, dict) else dict(old, value=value)
+                rule = Rule.from_spec(name, spec)
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"tank {tank_id!r}: bad rule {name!r}: {e!r}") from e
+            if old is not None and old["topic"] == rule.topic:
+                t[rule.topic] = tuple(rule if r.name == name else r for r in t[rule.topic])
+                continue
+            if old is not None:
+                t[old["topic"]] = tuple(r for r in t[old["topic"]] if r.name != name)
+            t[rule.topic] = t.get(rule.topic, ()) + (rule,)
+        return t
+
+    def table(self, tank_id):
+        return self.tables.get(tank_id, self.default)
+
+    def __len__(self):
+        return len(self.specs) + sum(len(o) for o in self.overrides.values())
+
+class RuleWatcher:
+    """Polls the rules file and hands a freshly compiled RuleSet to `on_change`.
+
+    The new set is compiled off to the side and swapped in by the callback, so
+    messages keep being evaluated against the old rules until then. A file that
+    fails to parse is reported and the current rules stay in force.
+    """
+
+    def __init__(self, path, on_change, interval=RELOAD_INTERVAL):
+        self.path = path
+        self.on_change = on_change
+        self.interval = interval
+        self.mtime = self._mtime()
+        self._thread = threading.Thread(target=self._run, name="rules-watcher", daemon=True)
+        self._thread.start()
+
+    def _mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            mtime = self._mtime()
+            if mtime == self.mtime:
+                continue
+            self.mtime = mtime
+            try:
+                rules = RuleSet.load(self.path)
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"⚠️ Rules file {self.path} not reloaded: {e}")
+                continue
+            print(f"🔁 Rules reloaded from {self.path} ({len(rules)} rules)")
+            self.on_change(rules)
@@ -0,0 +1,194 @@
+import os, struct, threading, time
+import paho.mqtt.client as mqtt
+import codec
+
+# Store-and-forward for sensor readings while the broker is unreachable.
+# Readings are appended as fixed 16-byte records (ts_ms int64, value float64) to
+# numbered segment files under spool/<name>/; a small cursor file remembers how
+# far replay got. When the spool is full the oldest segment is dropped (counted).
+SPOOL_DIR = "spool"
+SEGMENT_RECORDS = 65536      # 1 MiB per segment
+MAX_SEGMENTS = 64            # bound: 64 MiB / ~4M readings per sensor
+REPLAY_BATCH = 500           # samples per replayed batch message
+REPLAY_RATE = 20             # batch messages per second while draining
+RECONNECT_MIN, RECONNECT_MAX = 1, 120  # exponential backoff bounds (seconds)
+
+RECORD = struct.Struct("<qd")
+
+class Spool:
+    def __init__(self, name, root=SPOOL_DIR, segment_records=SEGMENT_RECORDS, max_segments=MAX_SEGMENTS):
+        self.dir = os.path.join(root, name)
+        os.makedirs(self.dir, exist_ok=True)
+        self.segment_records = segment_records
+        self.max_segments = max_segments
+        self.lock = threading.Lock()
+        self.dropped = 0
+        self.spooled = 0
+        self.replayed = 0
+
+        self.segments = sorted(int(f[:-4]) for f in os.listdir(self.dir) if f.endswith(".seg"))
+        self.read_seg, self.read_pos = self._load_cursor()
+        self._out = None
+
+    def _path(self, seq):
+        return os.path.join(self.dir, f"{seq:08d}.seg")
+
+    def _load_cursor(self):
+        try:
+            with open(os.path.join(self.dir, "cursor")) as f:
+                seg, pos = map(int, f.read().split())
+            if seg in self.segments:
+                return seg, pos
+        except (OSError, ValueError):
+            pass
+        return (self.segments[0] if self.segments else 1), 0
+
+    def _save_cursor(self):
+        tmp = os.path.join(self.dir, "cursor.tmp")
+        with open(tmp, "w") as f:
+            f.write(f"{self.read_seg} {self.read_pos}")
+        os.replace(tmp, os.path.join(self.dir, "cursor"))
+
+    def _records(self, seq):
+        try:
+            return os.path.getsize(self._path(seq)) // RECORD.size
+        except OSError:
+            return 0
+
+    def pending(self):
+        with self.lock:
+            if not self.segments:
+                return 0
+            return sum(self._records(s) for s in self.segments) - (self.read_pos if self.read_seg in self.segments else 0)
+
+    def append(self, samples):
+        """samples: [(ts_ms, value), ...]"""
+        with self.lock:
+            n = self._records(self.segments[-1]) if self.segments else self.segment_records
+            for ts, value in samples:
+                if n >= self.segment_records:
+                    self._roll()
+                    n = 0
+                n += 1
+                if self._out is None:
+                    self._out = open(self._path(self.segments[-1]), "ab")
+                self._out.write(RECORD.pack(ts, value))
+                self.spooled += 1
+            if self._out:
+                self._out.flush()
+
+    def _roll(self):
+        if self._out:
+            self._out.close()
+            self._out = None
+        seq = self.segments[-1] + 1 if self.segments else self.read_seg
+        self.segments.append(seq)
+        open(self._path(seq), "ab").close()
+        while len(self.segments) > self.max_segments:
+            # Full: give up the oldest readings, keep the newest
+            old = self.segments.pop(0)
+            lost = self._records(old) - (self.read_pos if old == self.read_seg else 0)
+            self.dropped += max(0, lost)
+            os.remove(self._path(old))
+            if old == self.read_seg:
+                self.read_seg, self.read_pos = self.segments[0], 0
+                self._save_cursor()
+
+    def peek(self, n):
+        """Up to n oldest unreplayed samples (not removed until advance())."""
+        with self.lock:
+            out = []
+            seg, pos = self.read_seg, self.read_pos
+            for seq in self.segments:
+                if seq < seg:
+                    continue
+                if seq > seg:
+                    pos = 0
+                with open(self._path(seq), "rb") as f:
+                    f.seek(pos * RECORD.size)
+                    data = f.read((n - len(out)) * RECORD.size)
+                out += RECORD.iter_unpack(data[:len(data) - len(data) % RECORD.size])
+                if len(out) >= n:
+                    break
+            return out
+
+    def advance(self, n):
+        with self.lock:
+            self.replayed += n
+            pos = self.read_pos + n
+            while len(self.segments) > 1 and pos >= self._records(self.read_seg):
+                # Segment fully replayed (and no longer written to): delete it
+                pos -= self._records(self.read_seg)
+                os.remove(self._path(self.segments.pop(0)))
+                self.read_seg = self.segments[0]
+            self.read_pos = pos
+            self._save_cursor()
+
+    def stats(self):
+        return {"pending": self.pending(), "spooled": self.spooled, "replayed": self.replayed, "dropped": self.dropped}
+
+class SpoolingPublisher:
+    """Sends a sensor's readings, spooling them while disconnected and replaying on reconnect.
+
+    Replay goes out as "<topic>/batch" messages (original timestamps) at QoS 1,
+    `rate` messages per second, so the manager stores each in one transaction.
+    """
+
+    def __init__(self, client, spool, topic, key, rate=REPLAY_RATE, batch=REPLAY_BATCH):
+        self.client = client
+        self.spool = spool
+        self.topic = topic
+        self.key = key
+        self.rate = rate
+        self.batch = batch
+        self._replaying = threading.Lock()
+
+    def connect(self, host, port, keepalive=60):
+        # Never crashes on an unreachable broker: paho's loop retries with backoff
+        self.client.reconnect_delay_set(RECONNECT_MIN, RECONNECT_MAX)
+        prev = self.client.on_connect
+        def on_connect(client, userdata, *args):
+            if prev:
+                prev(client, userdata, *args)
+            threading.Thread(target=self.replay, name="spool-replay", daemon=True).start()
+        self.client.on_connect = on_connect
+        self.client.connect_async(host, port, keepalive)
+
+    def publish(self, topic, payload, samples):
+        """Publish, or spool `samples` [(ts_ms, value)] if the broker can't take it now.
+
+        Live readings go out straight away even while a backlog drains, so alarms
+        and pump control see current values first; stored rows keep their timestamps.
+        """
+        if self.client.is_connected():
+            if self.client.publish(topic, payload).rc == mqtt.MQTT_ERR_SUCCESS:
+                return True
+        self.spool.append(samples)
+        return False
+
+    def replay(self):
+        if not self._replaying.acquire(blocking=False):
+            return  # already draining
+        try:
+            sent = 0
+            while self.client.is_connected():
+                samples = self.spool.peek(self.batch)
+                if not samples:
+                    break
+                info = self.client.publish(self.topic + codec.BATCH_SUFFIX,
+                                           codec.encode_batch(self.key, samples), qos=1)
+                if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                    break
+                try:
+                    info.wait_for_publish(timeout=10)
+                except (RuntimeError, ValueError):
+                    break
+                if not info.is_published():
+                    break  # lost the connection again; resume on the next connect
+                self.spool.advance(len(samples))
+                sent += len(samples)
+                time.sleep(1 / self.rate)
+            if sent:
+                print(f"📤 Replayed {sent} spooled readings to {self.topic} ({self.spool.stats()})")
+        finally:
+            self._replaying.release()
@@ -0,0 +1,100 @@
+import json, os, threading, time
+import codec, db_schema
+from tanks import split_topic
+
+# Last value of every topic the manager handles, saved to a snapshot file so a
+# restarted manager (and a GUI on the same machine) has the full state at once.
+STATE_FILE = "state.json"
+SNAPSHOT_INTERVAL = 5  # seconds between snapshot writes (only when something changed)
+
+class LastValues:
+    """topic -> (ts_ms, payload text). Written from the MQTT thread, saved by a background thread."""
+
+    def __init__(self, path=STATE_FILE, interval=SNAPSHOT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.values = {}
+        self.dirty = False
+        self.saves = 0
+        self._thread = None
+        self._stop = threading.Event()
+
+    def put(self, topic, payload, decoded=None, ts=None):
+        # decoded: codec.decode(payload) if the caller already has it, so it isn't decoded twice
+        if topic.endswith(codec.BATCH_SUFFIX):
+            # Keep the newest sample under the reading topic
+            try:
+                (key, samples), = (codec.decode(payload) if decoded is None else decoded).items()
+            except Exception:
+                return
+            if not samples:
+                return
+            ts, value = samples[-1]
+            topic, payload, decoded = topic[:-len(codec.BATCH_SUFFIX)], json.dumps({key: value}), None
+        self.values[topic] = (ts or db_schema.now_ms(), codec.to_text(payload, decoded))
+        self.dirty = True
+
+    def get(self, topic):
+        entry = self.values.get(topic)
+        return entry[1] if entry else None
+
+    def state(self, tank_id=None, suffixes=None):
+        """Full state as one JSON-able dict; only tank `tank_id` if given."""
+        values = dict(self.values)
+        if tank_id is not None:
+            values = {t: v for t, v in values.items()
+                      if (split_topic(t, suffixes) or (None,))[0] == tank_id}
+        return {"ts": db_schema.now_ms(), "topics": values}
+
+    # --- Snapshot file ---
+    def load(self):
+        t0 = time.perf_counter()
+        try:
+            with open(self.path) as f:
+                values = json.load(f)["topics"]
+        except (OSError, ValueError, KeyError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"State snapshot {self.path} not loaded: {e}")
+            return 0
+        self.values = values  # [ts, payload] lists unpack like the tuples put() stores
+        print(f"📥 State snapshot: {len(values)} topics in {(time.perf_counter() - t0) * 1000:.1f} ms")
+        return len(values)
+
+    def save(self):
+        self.dirty = False
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state(), f, separators=(",", ":"))
+        os.replace(tmp, self.path)  # readers never see a half-written file
+        self.saves += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="state-snapshot", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        if self.dirty:
+            self.save()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if self.dirty:
+                try:
+                    self.save()
+                except OSError as e:
+                    print("State snapshot failed:", e)
+
+def pump_states(values, suffix="pump/status"):
+    """tank_id -> pump on? from cached relay status payloads."""
+    out = {}
+    for topic, (ts, payload) in values.items():
+        parts = split_topic(topic, (suffix,))
+        if parts:
+            try:
+                out[parts[0]] = json.loads(payload).get("state") == "ON"
+            except (ValueError, AttributeError):
+                pass
+    return out
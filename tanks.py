@@ -0,0 +1,53 @@
+from rules import RuleSet
+
+# Topic layout:
+#   aquarium/<suffix>            -> the default tank (single-tank setups)
+#   aquarium/<tank_id>/<suffix>  -> tank <tank_id>
+TOPIC_ROOT = "aquarium/"
+DEFAULT_TANK = ""
+
+def tank_topic(tank_id, suffix):
+    return f"{TOPIC_ROOT}{tank_id}/{suffix}" if tank_id else TOPIC_ROOT + suffix
+
+def split_topic(topic, suffixes):
+    """Return (tank_id, suffix) if topic ends in one of `suffixes`, else None."""
+    if not topic.startswith(TOPIC_ROOT):
+        return None
+    rest = topic[len(TOPIC_ROOT):]
+    if rest in suffixes:
+        return DEFAULT_TANK, rest
+    tank_id, sep, suffix = rest.partition("/")
+    if sep and suffix in suffixes:
+        return tank_id, suffix
+    return None
+
+class TankState:
+    """Per-tank manager state. Rule tables are shared between tanks without overrides."""
+    __slots__ = ("tank_id", "rules", "pump_on")
+
+    def __init__(self, tank_id, rules):
+        self.tank_id = tank_id
+        self.rules = rules      # {topic suffix: (Rule, ...)}, see rules.py
+        self.pump_on = False
+
+class Fleet:
+    """Tank states created on first message, keyed by tank id."""
+
+    def __init__(self, rules=None):
+        self.rules = rules or RuleSet()
+        self.tanks = {}
+
+    def get(self, tank_id):
+        tank = self.tanks.get(tank_id)
+        if tank is None:
+            rules = self.rules
+            tank = self.tanks[tank_id] = TankState(tank_id, rules.table(tank_id))
+            if self.rules is not rules:  # reloaded while this tank was being added
+                tank.rules = self.rules.table(tank_id)
+        return tank
+
+    def reload(self, rules):
+        # Each tank switches to its new table in one assignment; no message is held back
+        self.rules = rules
+        for tank in list(self.tanks.values()):
+            tank.rules = rules.table(tank.tank_id)
@@ -1,71 +1,135 @@
-import paho.mqtt.client as mqtt
-import time, random, json
+import time, random, argparse
+import codec
+from mqtt_config import BROKER, PORT, make_client
+from spool import Spool, SpoolingPublisher, SPOOL_DIR
+from profiler import Profiler
+from tanks import tank_topic
 
-BROKER = "broker.hivemq.com"
-PORT = 1883
-TEMP_TOPIC = "aquarium/temp"
-ALARM_TOPIC = "aquarium/alarm"
-LAMP_STATUS_TOPIC = "aquarium/lamp/status"
-
-# Sampling interval
+# Sampling interval (the heating/cooling steps below are per 5 s tick)
 SAMPLE_INTERVAL = 5
 
-# Thresholds
-MAX_TEMP = 30
-MIN_TEMP = 15
+# Batch mode (off by default): publish [(ts, temp), ...] to the temp topic + "/batch"
+# every BATCH_SIZE samples or BATCH_MS milliseconds, whichever comes first
+BATCH_SIZE = 0
+BATCH_MS = 1000
 
-# Initial temperature
-temperature = 22.0
+class TempSensor:
+    """Simulated temperature sensor for one tank ("" = the default aquarium/... topics)."""
 
-lamp_on = False
-lamp_mode = "AUTO"
+    def __init__(self, tank_id="", interval=SAMPLE_INTERVAL, batch=BATCH_SIZE, batch_ms=BATCH_MS, verbose=True):
+        self.temp_topic = tank_topic(tank_id, "temp")
+        self.lamp_status_topic = tank_topic(tank_id, "lamp/status")
+        self.topics = [self.lamp_status_topic]
+        self.interval = interval
+        self.scale = interval / SAMPLE_INTERVAL  # keep the same drift per second at any rate
+        self.batch_size = batch
+        self.batch_ms = batch_ms
+        self.verbose = verbose
 
-def on_message(client, userdata, msg):
-    global lamp_on, lamp_mode
-    if msg.topic == LAMP_STATUS_TOPIC:
-        try:
-            status = json.loads(msg.payload.decode())
-            lamp_on = status.get("state", "OFF") == "ON"
-            lamp_mode = status.get("mode", "AUTO")
-            print(f"Lamp status received: state={status.get('state')} mode={status.get('mode')}")
-        except Exception as e:
-            print("Error parsing lamp status:", e)
+        # Initial temperature
+        self.temperature = 22.0
+        self.lamp_on = False
+        self.lamp_mode = "AUTO"
+        self.batch = []
+        self.batch_start = None
+        self.out = None  # SpoolingPublisher when readings should survive broker outages
 
-def main():
-    global temperature
+    def send(self, client, topic, payload, samples):
+        if self.out:
+            return self.out.publish(topic, payload, samples)
+        client.publish(topic, payload)
+        return True
 
-    client = mqtt.Client()
-    client.on_message = on_message
-    client.connect(BROKER, PORT, 60)
-    client.subscribe(LAMP_STATUS_TOPIC)
-    client.loop_start()
+    def log(self, *args):
+        if self.verbose:
+            print(*args)
 
-    while True:
+    def start(self, client):
+        pass
+
+    def on_message(self, client, userdata, msg):
+        if msg.topic == self.lamp_status_topic:
+            try:
+                status = codec.decode(msg.payload)
+                self.lamp_on = status.get("state", "OFF") == "ON"
+                self.lamp_mode = status.get("mode", "AUTO")
+                self.log(f"Lamp status received: state={status.get('state')} mode={status.get('mode')}")
+            except Exception as e:
+                print("Error parsing lamp status:", e)
+
+    def step(self):
+        scale = self.scale
         # Cooling when lamp OFF
-        if not lamp_on:
-            temperature -= random.uniform(0.05, 0.15)
+        if not self.lamp_on:
+            self.temperature -= random.uniform(0.05, 0.15) * scale
         # Heating when lamp ON
         else:
-            temperature += random.uniform(0.2, 0.4)
+            self.temperature += random.uniform(0.2, 0.4) * scale
 
         # Small noise
-        temperature += random.uniform(-0.05, 0.05)
+        self.temperature += random.uniform(-0.05, 0.05) * scale
 
         # Clamp realistic range
-        temperature = max(5, min(40, temperature))
+        self.temperature = max(5, min(40, self.temperature))
+        return round(self.temperature, 2)
+
+    def tick(self, client):
+        temp = self.step()
 
-        # Publish temperature
-        payload = json.dumps({"temp": round(temperature, 2)})
-        client.publish(TEMP_TOPIC, payload)
-        print("Sent temp:", payload)
+        now_ms = int(time.time() * 1000)
+        if not self.batch_size:
+            # Publish temperature
+            payload = codec.encode_temp(temp)
+            if self.send(client, self.temp_topic, payload, [(now_ms, temp)]):
+                self.log("Sent temp:", codec.to_text(payload))
+            else:
+                self.log("Broker unreachable, spooled temp:", temp)
+            return
 
-        # Alarm if outside safe range
-        if temperature > MAX_TEMP:
-            client.publish(ALARM_TOPIC, f"⚠️ High Temperature! ({round(temperature,2)}°C)")
-        elif temperature < MIN_TEMP:
-            client.publish(ALARM_TOPIC, f"⚠️ Low Temperature! ({round(temperature,2)}°C)")
+        if not self.batch:
+            self.batch_start = now_ms
+        self.batch.append((now_ms, temp))
+        if len(self.batch) >= self.batch_size or now_ms - self.batch_start >= self.batch_ms:
+            if self.send(client, self.temp_topic + codec.BATCH_SUFFIX, codec.encode_batch("temp", self.batch), self.batch):
+                self.log(f"Sent temp batch: {len(self.batch)} samples, last {temp}")
+            else:
+                self.log(f"Broker unreachable, spooled {len(self.batch)} samples")
+            self.batch = []
 
-        time.sleep(SAMPLE_INTERVAL)
+def main():
+    ap = argparse.ArgumentParser(description="Simulated aquarium temperature sensor")
+    ap.add_argument("--interval", type=float, default=SAMPLE_INTERVAL, help="seconds between samples")
+    ap.add_argument("--batch", type=int, default=BATCH_SIZE, help="samples per batch (0 = no batching)")
+    ap.add_argument("--batch-ms", type=float, default=BATCH_MS, help="max batch age in milliseconds")
+    ap.add_argument("--tank", default="", help="tank id (default: plain aquarium/... topics)")
+    ap.add_argument("--spool", default=SPOOL_DIR, help="keep readings here while the broker is down ('' = off)")
+    args = ap.parse_args()
+    sensor = TempSensor(args.tank, args.interval, args.batch, args.batch_ms)
+
+    name = "temp" + (f"-{args.tank}" if args.tank else "")
+    profiler = Profiler(name)  # $profile/<name> starts a profiling session
+
+    def on_connect(c, userdata, flags, rc):
+        # (Re)subscribe on every connect, so reconnects keep receiving lamp status
+        for t in sensor.topics:
+            c.subscribe(t)
+        profiler.attach(c)
+
+    client = make_client()
+    client.on_message = sensor.on_message
+    client.on_connect = on_connect
+    if args.spool:
+        sensor.out = SpoolingPublisher(client, Spool(name, args.spool), sensor.temp_topic, "temp")
+        sensor.out.connect(BROKER, PORT, 60)
+    else:
+        client.connect(BROKER, PORT, 60)
+    client.loop_start()
+
+    next_sample = time.monotonic()
+    while True:
+        sensor.tick(client)
+        next_sample += sensor.interval
+        time.sleep(max(0, next_sample - time.monotonic()))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,47 @@
+from alarms import AlarmEngine
+from tanks import Fleet
+
+class Client:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, topic, payload):
+        self.published.append((topic, payload))
+
+def engine(**kw):
+    return AlarmEngine(remind_interval=300, hysteresis=0.5, **kw), Client(), Fleet().get("t1")
+
+def test_hysteresis_raises_once_and_clears_only_past_the_band():
+    alarms, client, tank = engine()
+    for ts, temp in enumerate((29.0, 30.5, 31.0, 29.8, 30.2, 29.4)):
+        alarms.check(client, tank, "temp", temp, ts * 1000)
+    assert [text for _, text in client.published] == ["⚠️ High Temperature! (30.5°C)",
+                                                      "✅ Temperature back to normal (29.4°C)"]
+    st = alarms.state("t1", "high_temp")
+    assert not st.active and st.raised == 1 and st.suppressed == 3
+
+def test_active_alarm_is_reminded_after_the_interval():
+    alarms, client, tank = engine()
+    alarms.check(client, tank, "temp", 31, 0)
+    alarms.check(client, tank, "temp", 31, 299_000)
+    alarms.check(client, tank, "temp", 31, 300_000)
+    assert len(client.published) == 2
+    assert client.published[1][1].startswith("⚠️ High Temperature! (31°C) since ")
+
+def test_own_echo_is_not_logged_but_a_foreign_copy_is():
+    logged = []
+    alarms, client, tank = engine(log=lambda topic, text: logged.append(text))
+    alarms.check(client, tank, "temp", 31, 0)
+    topic, text = client.published[0]
+    assert topic == "aquarium/t1/alarm" and logged == [text]
+    assert not alarms.accept(topic, text, 10)  # our echo
+    assert alarms.accept(topic, text, 20)      # same text again: someone else's
+    assert alarms.echoes == 1
+
+def test_repeats_from_other_publishers_are_deduplicated_per_window():
+    alarms = AlarmEngine(dedup_window=60)
+    assert alarms.accept("aquarium/alarm", "⚠️ Filter clogged", 0)
+    assert not alarms.accept("aquarium/alarm", "⚠️ Filter clogged", 59_999)
+    assert alarms.accept("aquarium/t2/alarm", "⚠️ Filter clogged", 59_999)  # other topic
+    assert alarms.accept("aquarium/alarm", "⚠️ Filter clogged", 60_000)
+    assert alarms.deduped == 1
@@ -0,0 +1,44 @@
+import os
+import archive, db_schema, retention
+
+DAY = db_schema.DAY_MS
+
+def test_round_trip_keeps_values_nulls_and_payloads(tmp_path):
+    path = str(tmp_path / "samples_20250101-x.aqz")
+    blocks = [("aquarium/temp", [(1000, 22.13, None), (2000, 22.15, None), (2500, 21.9, None)]),
+              ("aquarium/pump/status", [(1500, None, '{"state": "ON"}'), (3000, 0.123456, None)])]
+    assert archive.write(path, blocks) == 5
+    assert list(archive.read(path)) == blocks
+    assert not os.path.exists(path + ".tmp")
+    assert list(archive.read(path, {"aquarium/temp"})) == blocks[:1]
+
+def test_rewrite_merges_rows_already_archived(tmp_path):
+    path = str(tmp_path / "samples_20250101-x.aqz")
+    archive.write(path, [("a", [(1, 1.0, None), (2, 2.0, None)])])
+    archive.write(path, [("a", [(2, 2.0, None), (3, 3.0, None)])])  # row 1 was already deleted
+    assert list(archive.read(path)) == [("a", [(1, 1.0, None), (2, 2.0, None), (3, 3.0, None)])]
+
+def test_prune_archives_then_removes_expired_topics(tmp_path, monkeypatch):
+    db = str(tmp_path / "iot.db")
+    now = 100 * DAY + 3600_000
+    conn = db_schema.connect(db)
+    topics = db_schema.TopicIds(conn)
+    temp, alarm = topics.get("aquarium/temp"), topics.get("aquarium/alarm")
+    old, recent = 40 * DAY, 95 * DAY  # days 40 (past 30 days) and 95
+    rows = [(old + i, temp, 20 + i / 100, None) for i in range(12)]
+    rows += [(old + 5, alarm, None, "⚠️ High Temperature!"), (recent, temp, 21.0, None)]
+    db_schema.PartitionWriter(conn).insert(rows)
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(retention, "DELETE_CHUNK", 5)  # several chunks
+    stats = retention.prune(db, str(tmp_path / "archive"), retention.DEFAULT_RETENTION, now, verbose=False)
+    assert stats["rows_archived"] == stats["rows_deleted"] == 12
+    assert stats["partitions_dropped"] == 0
+
+    conn = db_schema.connect(db)
+    left = {t: conn.execute(f"SELECT count(*) FROM {t}").fetchone()[0] for _, t in db_schema.partitions(conn)}
+    conn.close()
+    assert sorted(left.values()) == [1, 1]  # the alarm (365 days) and the recent reading stay
+    (_, path), = archive.files(str(tmp_path / "archive"))
+    assert [len(rows) for _, rows in archive.read(path)] == [12]
@@ -0,0 +1,38 @@
+import json
+import pytest
+import codec
+
+@pytest.mark.parametrize("binary", [False, True])
+def test_round_trip(binary):
+    assert codec.decode(codec.encode_temp(22.13, binary)) == {"temp": 22.13}
+    assert codec.decode(codec.encode_level(50, binary)) == {"level": 50}
+    assert codec.decode(codec.encode_status("MANUAL", "ON", binary)) == {"mode": "MANUAL", "state": "ON"}
+    samples = [(1_700_000_000_000, 21.5), (1_700_000_000_250, 21.75)]
+    assert [tuple(s) for s in codec.decode(codec.encode_batch("temp", samples, binary))["temp"]] == samples
+
+def test_binary_is_smaller_and_to_text_gives_json():
+    payload = codec.encode_temp(-3.5, binary=True)
+    assert payload[0] == codec.VERSION and len(payload) == 4
+    assert json.loads(codec.to_text(payload)) == {"temp": -3.5}
+
+@pytest.mark.parametrize("payload, message", [
+    (b"\x02\x01\x00\x00", "unsupported payload version 2"),
+    (b"ON", "Not a JSON or binary payload"),
+    (b"\x01\x09\x00", "Unknown binary payload kind 9"),
+    (b"\x01\x01", "Malformed binary payload"),
+])
+def test_rejects_unknown_payloads(payload, message):
+    with pytest.raises(ValueError, match=message):
+        codec.decode(payload)
+
+def test_format_per_topic_suffix():
+    assert codec.parse_formats("binary") == {"temp": True, "water_level": True, "status": True}
+    assert codec.parse_formats("json, temp=binary") == {"temp": True, "water_level": False, "status": False}
+    assert codec.parse_formats("binary,status=json")["status"] is False
+    with pytest.raises(ValueError, match="ph=binary"):
+        codec.parse_formats("ph=binary")
+
+def test_to_text_never_raises():
+    assert codec.to_text(b"\xff\xfeON") == "\\xff\\xfeON"
+    assert codec.to_text(b"\x01\x09\xff") == "\x01\t\\xff"  # malformed binary, not UTF-8
+    assert codec.to_text(b'{"level": 50}', {"level": 50}) == '{"level": 50}'
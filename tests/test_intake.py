@@ -0,0 +1,62 @@
+import threading
+import intake
+from intake import Intake
+from replay import Message
+
+class Handler:
+    """Records payloads; the first call blocks until release(), so the queue fills up."""
+    def __init__(self):
+        self.handled = []
+        self.entered = threading.Event()
+        self.gate = threading.Event()
+
+    def __call__(self, client, userdata, msg):
+        self.entered.set()
+        self.gate.wait(5)
+        self.handled.append(msg.payload)
+
+def stalled_intake(policy, queue_size=4, **kw):
+    h = Handler()
+    q = Intake(h, lambda topic: topic.split("/")[1], workers=1, queue_size=queue_size, policy=policy, **kw)
+    q.on_message(None, None, Message("aquarium/t1/temp", 0))
+    assert h.entered.wait(5)  # the worker is now stuck on message 0
+    return q, h
+
+def test_drop_oldest_keeps_the_newest_in_order():
+    q, h = stalled_intake("drop_oldest")
+    for i in range(1, 11):
+        q.on_message(None, None, Message("aquarium/t1/temp", i))
+    h.gate.set()
+    q.stop()
+    assert h.handled == [0, 7, 8, 9, 10]
+    assert q.stats()["dropped"] == 6 and q.stats()["blocked"] == 0
+
+def test_block_waits_then_drops_when_the_worker_is_stalled(monkeypatch):
+    monkeypatch.setattr(intake, "BLOCK_TIMEOUT", 0.05)
+    q, h = stalled_intake("block")
+    for i in range(1, 7):
+        q.on_message(None, None, Message("aquarium/t1/temp", i))
+    stats = q.stats()
+    assert stats["blocked"] == 1  # one timed-out wait, then no more waiting while stalled
+    assert stats["dropped"] == 2
+    h.gate.set()
+    q.stop()
+    assert h.handled == [0, 3, 4, 5, 6]
+
+def test_sample_thins_readings_but_lets_other_messages_in():
+    q, h = stalled_intake("sample", queue_size=8, sampled=lambda topic: topic.endswith("temp"))
+    for i in range(1, 13):
+        q.on_message(None, None, Message("aquarium/t1/temp", i))
+    q.on_message(None, None, Message("aquarium/t1/pump/status", "ON"))
+    stats = q.stats()
+    h.gate.set()
+    q.stop()
+    assert stats["sampled"] > 0 and stats["dropped"] == 0
+    assert h.handled[-1] == "ON" and h.handled == sorted(h.handled[:-1]) + ["ON"]
+
+def test_unkeyed_topics_run_inline():
+    seen = []
+    q = Intake(lambda c, u, msg: seen.append(threading.current_thread()), lambda topic: None, workers=1)
+    q.on_message(None, None, Message("other/topic", b""))
+    q.stop()
+    assert seen == [threading.current_thread()]
@@ -0,0 +1,54 @@
+import sqlite3
+import db_schema, log_writer
+from log_writer import LogWriter
+
+def rows(path):
+    conn = sqlite3.connect(path)
+    n = sum(conn.execute(f"SELECT count(*) FROM {t}").fetchone()[0] for _, t in db_schema.partitions(conn))
+    conn.close()
+    return n
+
+def test_rows_are_committed(tmp_path):
+    path = str(tmp_path / "iot.db")
+    w = LogWriter(path, flush_interval=0.01)
+    for i in range(10):
+        w.log(1_700_000_000_000 + i, "aquarium/t1/temp", "22.5")
+    w.log_many("aquarium/t1/water_level", [(1_700_000_000_000 + i, 50) for i in range(5)])
+    w.close()
+    assert rows(path) == 15
+    assert w.stats()["written"] == 15 and w.stats()["errors"] == 0
+
+def test_failed_commit_is_retried_and_thread_survives(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_writer, "RETRY_DELAY", 0.01)
+    real = db_schema.PartitionWriter.insert
+    fails = [1]
+    def insert(self, batch):
+        if fails[0]:
+            fails[0] -= 1
+            raise sqlite3.OperationalError("database is locked")
+        real(self, batch)
+    monkeypatch.setattr(db_schema.PartitionWriter, "insert", insert)
+    path = str(tmp_path / "iot.db")
+    w = LogWriter(path, flush_interval=0.01)
+    w.log(1_700_000_000_000, "aquarium/temp", "22.5")
+    w.close()
+    assert rows(path) == 1
+    assert w.stats()["errors"] == 1 and w.stats()["failed"] == 0
+
+def test_batch_dropped_after_retries_then_writing_goes_on(tmp_path, monkeypatch):
+    monkeypatch.setattr(log_writer, "RETRY_DELAY", 0.01)
+    real = db_schema.PartitionWriter.insert
+    fails = [log_writer.FLUSH_RETRIES]
+    def insert(self, batch):
+        if fails[0]:
+            fails[0] -= 1
+            raise sqlite3.OperationalError("disk I/O error")
+        real(self, batch)
+    monkeypatch.setattr(db_schema.PartitionWriter, "insert", insert)
+    path = str(tmp_path / "iot.db")
+    w = LogWriter(path, batch_size=2, flush_interval=10)
+    w.log(1_700_000_000_000, "aquarium/temp", "1")
+    w.log(1_700_000_000_001, "aquarium/temp", "2")  # this batch fails every attempt
+    w.log(1_700_000_000_002, "aquarium/temp", "3")
+    w.close()
+    assert w.stats()["failed"] == 2 and rows(path) == 1
@@ -0,0 +1,19 @@
+import mqtt_bus
+
+def test_full_queue_drops_new_messages_and_counts_them():
+    bus = mqtt_bus.Bus()
+    sub = mqtt_bus.Client("slow", bus=bus, max_queued=3)
+    got = []
+    sub.on_message = lambda c, u, msg: got.append(msg.payload)
+    sub.connect()
+    sub.subscribe("a/#")
+    pub = mqtt_bus.Client("pub", bus=bus)
+    pub.connect()
+    for i in range(5):
+        pub.publish("a/b", str(i))
+    assert sub.dropped == 2
+    sub.loop(0)
+    assert got == [b"0", b"1", b"2"]
+    pub.publish("a/b", "5")  # room again once the loop has run
+    sub.loop(0)
+    assert got[-1] == b"5" and sub.dropped == 2
@@ -0,0 +1,27 @@
+import json
+import pytest
+import profiler
+from mqtt_bus import Message
+
+class Client:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, topic, payload):
+        self.published.append((topic, json.loads(payload)))
+
+@pytest.mark.parametrize("seconds", ['"soon"', "NaN", "-5", "0", "[1]"])
+def test_bad_seconds_answers_with_an_error(tmp_path, seconds):
+    p = profiler.Profiler("t", out_dir=str(tmp_path))
+    client = Client()
+    p.on_message(client, None, Message("$profile/t", f'{{"cmd": "start", "seconds": {seconds}}}'.encode()))
+    assert p.started is None
+    (topic, reply), = client.published
+    assert topic == "$profile/t/done" and "error" in reply
+
+def test_seconds_are_clamped(tmp_path, monkeypatch):
+    begun = []
+    p = profiler.Profiler("t", out_dir=str(tmp_path))
+    monkeypatch.setattr(p, "begin", lambda client, seconds, *rest: begun.append(seconds))
+    p.on_message(Client(), None, Message("$profile/t", b'{"cmd": "start", "seconds": 1e9}'))
+    assert begun == [profiler.MAX_SECONDS]
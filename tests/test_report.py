@@ -0,0 +1,15 @@
+from log_viewer import alarm_kind, alarm_state
+
+def test_engine_alarm_texts_are_alarms():
+    assert alarm_state(alarm_kind("⚠️ High Temperature! (31.2°C)")) == "raised"
+    assert alarm_state(alarm_kind("⚠️ High Temperature! (31.2°C) since 2025-09-16 10:00:00")) == "raised"
+    assert alarm_state(alarm_kind("✅ Temperature back to normal (29.4°C)")) == "cleared"
+    assert alarm_state(alarm_kind("⚠️ Water level dropping fast, leak? (-2.1%/min)")) == "raised"
+
+def test_generic_rule_alarms():
+    assert alarm_state(alarm_kind("⚠️ ph_low (6.1)")) == "raised"
+    assert alarm_state(alarm_kind("✅ ph_low cleared (6.8)")) == "cleared"
+
+def test_notices_are_not_alarms():
+    for text in ("✅ Fish fed!", "⚠️ Pump ON (Low water 25%)", "✅ Pump OFF (Water restored 81%)"):
+        assert alarm_state(alarm_kind(text)) is None
@@ -0,0 +1,33 @@
+from ring_buffer import RingBuffer, History
+
+def times(buf):
+    return [buf._at(k) for k in range(buf.size)]
+
+def test_late_samples_are_inserted_in_order():
+    buf = RingBuffer(5)
+    for ts in (1, 2, 4, 3, 6, 5):
+        buf.append(ts, ts * 10)
+    assert times(buf) == [2, 3, 4, 5, 6]
+    assert buf.last() == (6, 60)
+
+def test_sample_older_than_a_full_buffer_is_counted():
+    buf = RingBuffer(3)
+    for ts in (5, 6, 7, 1):
+        buf.append(ts, 0)
+    assert times(buf) == [5, 6, 7]
+    assert buf.late == 1
+
+def test_history_covers_the_window_beyond_the_raw_samples():
+    h = History(100, 3600, 1)
+    now = 100_000
+    h.extend([(now - 3600 + i, i % 50) for i in range(3600)])  # 1 Hz for an hour
+    lo, hi, before = h.decimate(now - 3600, now, 60)
+    assert all(v is not None for v in lo)  # raw tier alone holds only the last 100 s
+    assert min(lo) == 0 and max(hi) == 49
+
+def test_history_buckets_accept_any_order():
+    h = History(4, 60, 1)
+    for ts, v in ((50, 1), (10, 7), (30, -2), (55, 3), (56, 4), (57, 5), (58, 6)):
+        h.append(ts, v)
+    lo, hi, _ = h.decimate(0, 60, 6)
+    assert (lo[1], lo[3]) == (7, -2)
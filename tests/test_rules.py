@@ -0,0 +1,55 @@
+import json
+import pytest
+from rules import RuleSet, DEFAULT_RULES, rules_path
+
+def test_default_table_shared_by_tanks_without_overrides():
+    rs = RuleSet()
+    assert rs.table("t1") is rs.default
+    assert [r.name for r in rs.table("t1")["temp"]][:2] == ["high_temp", "low_temp"]
+
+def test_value_override_replaces_only_that_rule():
+    rs = RuleSet(None, {"reef": {"high_temp": 28}})
+    temp = {r.name: r for r in rs.table("reef")["temp"]}
+    assert temp["high_temp"].value == 28 and temp["high_temp"].test(28.5)
+    assert temp["low_temp"] is {r.name: r for r in rs.default["temp"]}["low_temp"]
+    assert {r.name: r for r in rs.table("other")["temp"]}["high_temp"].value == 30
+
+def test_full_rule_override_can_move_topic_and_add_rules():
+    rs = RuleSet(None, {"reef": {"low_water": {"topic": "temp", "op": "<", "value": 5, "action": "pump_on"},
+                                 "ph_low": {"topic": "ph", "op": "<", "value": 6.5}}})
+    t = rs.table("reef")
+    assert "low_water" not in [r.name for r in t["water_level"]]
+    assert "low_water" in [r.name for r in t["temp"]]
+    assert t["ph"][0].test(6.0) and not t["ph"][0].test(7.0)
+
+def test_unknown_override_name_fails_the_load():
+    with pytest.raises(ValueError, match="reef.*hihg_temp"):
+        RuleSet(None, {"reef": {"hihg_temp": 28}})
+
+def test_bad_override_spec_fails_the_load():
+    with pytest.raises(ValueError, match="reef"):
+        RuleSet(None, {"reef": {"high_temp": {"topic": "temp", "op": "~", "value": 1}}})
+    with pytest.raises(ValueError, match="reef"):
+        RuleSet(None, {"reef": {"new_rule": {"topic": "temp"}}})
+
+def test_load_legacy_tanks_json_keys(tmp_path):
+    path = tmp_path / "tanks.json"
+    path.write_text(json.dumps({"defaults": {"max_temp": 27}, "tanks": {"t1": {"min_temp": 18}}}))
+    rs = RuleSet.load(str(path))
+    assert {r.name: r.value for r in rs.default["temp"]}["high_temp"] == 27
+    assert {r.name: r.value for r in rs.table("t1")["temp"]}["low_temp"] == 18
+
+def test_rules_path_falls_back_to_tanks_json(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert rules_path() == "rules.json"
+    (tmp_path / "tanks.json").write_text("{}")
+    assert rules_path() == "tanks.json"
+    assert rules_path("mine.json") == "mine.json"
+    (tmp_path / "rules.json").write_text("{}")
+    assert rules_path() == "rules.json"
+
+def test_hysteresis_clear():
+    rs = RuleSet()
+    high = {r.name: r for r in rs.default["temp"]}["high_temp"]
+    assert high.test(30.2) and not high.clear(29.8, 0.5) and high.clear(29.5, 0.5)
+    assert len(DEFAULT_RULES) == len(rs)
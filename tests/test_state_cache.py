@@ -0,0 +1,18 @@
+import json
+import codec
+from state_cache import LastValues
+
+def test_batch_stored_under_reading_topic_from_decoded_value(monkeypatch, tmp_path):
+    cache = LastValues(str(tmp_path / "state.json"))
+    payload = codec.encode_batch("temp", [(1000, 21.5), (2000, 22.25)], binary=True)
+    decoded = codec.decode(payload)
+    monkeypatch.setattr(codec, "decode", lambda p: 1 / 0)  # must not decode again
+    cache.put("aquarium/t1/temp/batch", payload, decoded)
+    assert cache.values["aquarium/t1/temp"] == (2000, json.dumps({"temp": 22.25}))
+
+def test_binary_and_garbage_payloads(tmp_path):
+    cache = LastValues(str(tmp_path / "state.json"))
+    cache.put("aquarium/pump/status", codec.encode_status("AUTO", "ON", binary=True))
+    assert json.loads(cache.get("aquarium/pump/status")) == {"mode": "AUTO", "state": "ON"}
+    cache.put("aquarium/feed", b"\xff")
+    assert cache.get("aquarium/feed") == "\\xff"
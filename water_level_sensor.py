@@ -1,59 +1,137 @@
-import paho.mqtt.client as mqtt
-import time, json
-
-BROKER = "broker.hivemq.com"
-PORT = 1883
-LEVEL_TOPIC = "aquarium/water_level"
-PUMP_STATUS_TOPIC = "aquarium/pump/status"
-PUMP_CMD_TOPIC = "aquarium/pump"
-
-current_level = 50
-pump_on = False
-pump_mode = "AUTO"
-
-def on_message(client, userdata, msg):
-    global pump_on, pump_mode
-    if msg.topic == PUMP_STATUS_TOPIC:
-        try:
-            status = json.loads(msg.payload.decode())  # ✅ decode JSON
-            pump_on = status.get("state", "OFF") == "ON"
-            pump_mode = status.get("mode", "AUTO")
-            print(f"Pump status received: state={status.get('state')} mode={status.get('mode')}")
-        except Exception as e:
-            print("Error parsing pump status:", e)
+import time, argparse
+import codec
+from mqtt_config import BROKER, PORT, make_client
+from spool import Spool, SpoolingPublisher, SPOOL_DIR
+from profiler import Profiler
+from tanks import tank_topic
 
+# Sampling interval (the +2 / -1 steps below are per 5 s tick)
+SAMPLE_INTERVAL = 5
 
-def main():
-    global current_level
+# Batch mode (off by default): publish [(ts, level), ...] to the level topic + "/batch"
+# every BATCH_SIZE samples or BATCH_MS milliseconds, whichever comes first
+BATCH_SIZE = 0
+BATCH_MS = 1000
 
-    client = mqtt.Client()
-    client.on_message = on_message
-    client.connect(BROKER, PORT, 60)
-    client.subscribe(PUMP_STATUS_TOPIC)
+class WaterLevelSensor:
+    """Simulated water level sensor for one tank ("" = the default aquarium/... topics)."""
 
-    while True:
-        client.loop(timeout=0.1)
+    def __init__(self, tank_id="", interval=SAMPLE_INTERVAL, batch=BATCH_SIZE, batch_ms=BATCH_MS, verbose=True):
+        self.level_topic = tank_topic(tank_id, "water_level")
+        self.pump_status_topic = tank_topic(tank_id, "pump/status")
+        self.pump_cmd_topic = tank_topic(tank_id, "pump")
+        self.topics = [self.pump_status_topic]
+        self.interval = interval
+        # Keep the same fill/drain speed at any rate (integer steps at the default rate)
+        self.scale = 1 if interval == SAMPLE_INTERVAL else interval / SAMPLE_INTERVAL
+        self.batch_size = batch
+        self.batch_ms = batch_ms
+        self.verbose = verbose
+
+        self.current_level = 50
+        self.pump_on = False
+        self.pump_mode = "AUTO"
+        self.stop_sent = False
+        self.batch = []
+        self.batch_start = None
+        self.out = None  # SpoolingPublisher when readings should survive broker outages
+
+    def send(self, client, topic, payload, samples):
+        if self.out:
+            return self.out.publish(topic, payload, samples)
+        client.publish(topic, payload)
+        return True
 
+    def log(self, *args):
+        if self.verbose:
+            print(*args)
+
+    def start(self, client):
+        pass
+
+    def on_message(self, client, userdata, msg):
+        if msg.topic == self.pump_status_topic:
+            try:
+                status = codec.decode(msg.payload)  # ✅ JSON or binary
+                self.pump_on = status.get("state", "OFF") == "ON"
+                self.pump_mode = status.get("mode", "AUTO")
+                self.log(f"Pump status received: state={status.get('state')} mode={status.get('mode')}")
+            except Exception as e:
+                print("Error parsing pump status:", e)
+
+    def tick(self, client):
         # Simulate water level
-        if pump_on:
-            current_level += 2
+        if self.pump_on:
+            self.current_level += 2 * self.scale
         else:
-            current_level -= 1
+            self.current_level -= 1 * self.scale
+            self.stop_sent = False
 
         # Clamp range
-        if current_level >= 100:
-            current_level = 100
-            if pump_on:
+        if self.current_level >= 100:
+            self.current_level = 100
+            if self.pump_on and not self.stop_sent:
                 # Auto stop pump at full
-                client.publish(PUMP_CMD_TOPIC, "OFF")
-                print("💧 Water full → Auto stopping pump")
-        elif current_level < 0:
-            current_level = 0
-
-        payload = json.dumps({"level": current_level})
-        client.publish(LEVEL_TOPIC, payload)
-        print("Sent water level:", payload)
-        time.sleep(5)
+                client.publish(self.pump_cmd_topic, "OFF")
+                self.stop_sent = True  # ask once until the pump reports OFF
+                self.log("💧 Water full → Auto stopping pump")
+        elif self.current_level < 0:
+            self.current_level = 0
+        level = self.current_level if self.scale == 1 else round(self.current_level, 2)
+
+        now_ms = int(time.time() * 1000)
+        if not self.batch_size:
+            payload = codec.encode_level(level)
+            if self.send(client, self.level_topic, payload, [(now_ms, level)]):
+                self.log("Sent water level:", codec.to_text(payload))
+            else:
+                self.log("Broker unreachable, spooled water level:", level)
+            return
+
+        if not self.batch:
+            self.batch_start = now_ms
+        self.batch.append((now_ms, level))
+        if len(self.batch) >= self.batch_size or now_ms - self.batch_start >= self.batch_ms:
+            if self.send(client, self.level_topic + codec.BATCH_SUFFIX, codec.encode_batch("level", self.batch), self.batch):
+                self.log(f"Sent water level batch: {len(self.batch)} samples, last {level}")
+            else:
+                self.log(f"Broker unreachable, spooled {len(self.batch)} samples")
+            self.batch = []
+
+def main():
+    ap = argparse.ArgumentParser(description="Simulated aquarium water level sensor")
+    ap.add_argument("--interval", type=float, default=SAMPLE_INTERVAL, help="seconds between samples")
+    ap.add_argument("--batch", type=int, default=BATCH_SIZE, help="samples per batch (0 = no batching)")
+    ap.add_argument("--batch-ms", type=float, default=BATCH_MS, help="max batch age in milliseconds")
+    ap.add_argument("--tank", default="", help="tank id (default: plain aquarium/... topics)")
+    ap.add_argument("--spool", default=SPOOL_DIR, help="keep readings here while the broker is down ('' = off)")
+    args = ap.parse_args()
+    sensor = WaterLevelSensor(args.tank, args.interval, args.batch, args.batch_ms)
+
+    name = "water_level" + (f"-{args.tank}" if args.tank else "")
+    profiler = Profiler(name)  # $profile/<name> starts a profiling session
+
+    def on_connect(c, userdata, flags, rc):
+        # (Re)subscribe on every connect, so reconnects keep receiving pump status
+        for t in sensor.topics:
+            c.subscribe(t)
+        profiler.attach(c)
+
+    client = make_client()
+    client.on_message = sensor.on_message
+    client.on_connect = on_connect
+    if args.spool:
+        sensor.out = SpoolingPublisher(client, Spool(name, args.spool), sensor.level_topic, "level")
+        sensor.out.connect(BROKER, PORT, 60)
+    else:
+        client.connect(BROKER, PORT, 60)
+    client.loop_start()
+
+    next_sample = time.monotonic()
+    while True:
+        sensor.tick(client)
+        next_sample += sensor.interval
+        time.sleep(max(0, next_sample - time.monotonic()))
 
 if __name__ == "__main__":
     main()